@@ -1,6 +1,8 @@
 import streamlit as st
 from streamlit_option_menu import option_menu
 
+import metrics
+
 st.set_page_config(layout="wide")
 
 with st.sidebar:
@@ -9,11 +11,17 @@ with st.sidebar:
 
     selected = option_menu(
         "", 
-        ["📈 Dashboard", "📄 Données", "🛡️ Détection d'anomalies"],
-        icons=["📈", "📄", "🛡️"],
+        ["📈 Dashboard", "📄 Données", "🛡️ Détection d'anomalies", "📦 Tâches"],
+        icons=["📈", "📄", "🛡️", "📦"],
         menu_icon="none",
     )
 
+    # Filtre commun à toutes les pages : IP sources portant au moins une des étiquettes choisies
+    import cidr_tags
+    st.multiselect("🏷️ Étiquettes des IP sources", cidr_tags.get_tagger().tags, key="ip_tags")
+
+    diagnostics = st.toggle("🩺 Diagnostics", value=False)
+
 if selected == "📈 Dashboard":
     import dashboard
     dashboard.show_dashboard()
@@ -23,6 +31,9 @@ elif selected == "📄 Données":
 elif selected == "🛡️ Détection d'anomalies":
     import model
     model.show_model()
+elif selected == "📦 Tâches":
+    import jobs
+    jobs.show_jobs()
 
 # elif selected == "Analyse":
 #     import analyse
@@ -34,3 +45,11 @@ elif selected == "🛡️ Détection d'anomalies":
 #     import edina
 #     edina.show_edina()
 
+# Panneau de diagnostic affiché après la page, pour inclure les mesures de cette exécution
+if diagnostics:
+    with st.sidebar:
+        metrics.show_diagnostics_panel()
+
+# Préchargement en arrière-plan des modules des autres pages, une fois la page affichée
+import warmup
+warmup.start()
@@ -0,0 +1,148 @@
+"""
+Micro-benchmarks des fonctions d'accès et de traitement des données, sur des logs synthétiques
+servis par un substitut en mémoire d'Elasticsearch (`fake_es.FakeElasticsearch`).
+
+Chaque exécution est enregistrée (version git, volume, durées) dans `benchmark_results.jsonl`,
+et comparée à la dernière exécution de même volume pour repérer les régressions.
+
+Exemple :
+    python benchmark.py --events 1000000 --repeat 3
+"""
+import argparse
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+from datetime import datetime, timezone
+
+import synthetic_logs
+from fake_es import FakeElasticsearch
+
+RESULTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)), "benchmark_results.jsonl")
+REGRESSION_THRESHOLD = 0.20  # Ralentissement relatif signalé comme régression
+
+
+def _unwrap(func):
+    """Contourne le cache Streamlit (`st.cache_data`) pour mesurer la fonction elle-même."""
+    return getattr(func, "__wrapped__", func)
+
+
+def git_version():
+    try:
+        return subprocess.check_output(
+            ["git", "describe", "--always", "--dirty"], cwd=os.path.dirname(os.path.abspath(__file__)),
+            stderr=subprocess.DEVNULL, text=True,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "inconnue"
+
+
+def install_backend(es):
+    """Branche le substitut d'Elasticsearch à la place du client réel dans les modules de l'application."""
+    import metrics
+    import utils
+
+    utils.set_es(metrics.InstrumentedElasticsearch(es))
+
+
+def build_cases(n_events, load_docs):
+    """Construit la liste des cas mesurés : (nom, fonction sans argument)."""
+    import utils
+    import dashboard
+    import explore_data
+    import model
+
+    per_ip = utils.permit_deny_by_ip()
+    top_ip = per_ip.sort_values("COUNT").iloc[-1]["IP_Source"]
+    features = [
+        "COUNT", "PERMIT", "DENY", "PERMIT_TCP", "PERMIT_UDP",
+        "Nb_Port_Dest", "Nb_Port_Src", "Port_Dest_Well_Known",
+        "Port_Dest_Registered", "Port_Dest_Dynamic_Private",
+    ]
+    permit_max = int(per_ip["PERMIT"].max())
+
+    return [
+        ("permit_deny_by_ip", utils.permit_deny_by_ip),
+        ("get_one_ip_logs", lambda: utils.get_one_ip_logs(top_ip)),
+        ("load_data_scroll", lambda: _unwrap(explore_data.load_data_scroll)(max_docs=min(load_docs, n_events))),
+        ("apply_filters", lambda: dashboard.apply_filters(per_ip, (0, permit_max), ["TCP"], "Well Known (0-1023)")),
+        ("filter_university_ips", lambda: _unwrap(dashboard.filter_university_ips)(per_ip, dashboard.SubnetRollup(per_ip))),
+        ("compute_clusters", lambda: _unwrap(model.compute_clusters)(per_ip, features)),
+    ]
+
+
+def run(n_events, repeat=3, load_docs=100_000, seed=42):
+    """
+    Exécute la suite de benchmarks.
+
+    Returns:
+        dict: L'enregistrement de l'exécution (également ajouté à `RESULTS_FILE`).
+    """
+    start = time.perf_counter()
+    documents = synthetic_logs.SyntheticLogGenerator(seed=seed).documents(n_events)
+    print(f"📦 {n_events:,} événements générés en {time.perf_counter() - start:.1f} s")
+    install_backend(FakeElasticsearch(documents))
+
+    results = {}
+    for name, case in build_cases(n_events, load_docs):
+        case()  # Échauffement (hors mesure) : imports, caches du substitut
+        timings = []
+        for _ in range(repeat):
+            t0 = time.perf_counter()
+            case()
+            timings.append(time.perf_counter() - t0)
+        results[name] = {"min": min(timings), "median": statistics.median(timings)}
+        print(f"⏱️ {name:<24} min {min(timings):8.3f} s   médiane {statistics.median(timings):8.3f} s")
+
+    record = {
+        "date": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "version": git_version(),
+        "python": platform.python_version(),
+        "events": n_events,
+        "repeat": repeat,
+        "seed": seed,
+        "results": results,
+    }
+    compare(record, load_results())
+    with open(RESULTS_FILE, "a") as f:
+        f.write(json.dumps(record) + "\n")
+    return record
+
+
+def load_results(path=RESULTS_FILE):
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def compare(record, history, threshold=REGRESSION_THRESHOLD):
+    """Compare une exécution à la précédente de même volume et signale les régressions."""
+    previous = [r for r in history if r["events"] == record["events"] and r["seed"] == record["seed"]]
+    if not previous:
+        print("ℹ️ Aucune exécution précédente de même volume pour comparaison.")
+        return {}
+    reference = previous[-1]
+    changes = {}
+    print(f"🔁 Comparaison avec la version {reference['version']} ({reference['date']})")
+    for name, timing in record["results"].items():
+        if name not in reference["results"]:
+            continue
+        before = reference["results"][name]["min"]
+        change = (timing["min"] - before) / before if before else 0.0
+        changes[name] = change
+        flag = "❌ régression" if change > threshold else ("✅ amélioration" if change < -threshold else "")
+        print(f"   {name:<24} {before:8.3f} s -> {timing['min']:8.3f} s ({change:+.0%}) {flag}")
+    return changes
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmarks des fonctions de données.")
+    parser.add_argument("--events", type=int, default=1_000_000, help="Nombre d'événements synthétiques")
+    parser.add_argument("--repeat", type=int, default=3, help="Nombre de mesures par cas")
+    parser.add_argument("--load-docs", type=int, default=100_000, help="max_docs pour load_data_scroll")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    run(args.events, args.repeat, args.load_docs, args.seed)
@@ -0,0 +1,143 @@
+"""
+Index bitmap en mémoire d'un jeu de logs chargé, pour le filtrage interactif.
+
+Construit une seule fois par jeu de données :
+- colonnes à faible cardinalité (protocole, action...) : un bitset compacté (`np.packbits`) par valeur ;
+- colonnes à forte cardinalité (IP, ports) : listes de lignes par valeur (codes triés + décalages).
+
+Une sélection est un bitset compacté (n / 8 octets) ; un changement de filtre se réduit à quelques
+OU / ET bit à bit, et les valeurs encore disponibles d'une colonne (options en cascade) se lisent
+sur les codes des lignes retenues.
+"""
+import numpy as np
+import pandas as pd
+
+from events import ip_to_uint32
+
+BITMAP_COLUMNS = ["proto", "action"]
+POSTING_COLUMNS = ["portsrc", "portdst", "ipsrc", "ipdst"]
+IP_COLUMNS = {"ipsrc", "ipdst"}
+MAX_POSTINGS = 64  # Au-delà, sélection par passe sur les codes plutôt que par listes de lignes
+
+# Nombre de bits à 1 de chaque octet
+POPCOUNT = np.array([bin(i).count("1") for i in range(256)], dtype=np.uint8)
+
+
+class BitmapIndex:
+    """Index bitmap / listes de lignes des colonnes d'un DataFrame (lignes dans l'ordre du DataFrame)."""
+
+    def __init__(self, df, bitmap_columns=BITMAP_COLUMNS, posting_columns=POSTING_COLUMNS):
+        self.n_rows = len(df)
+        self._codes = {}
+        self._uniques = {}
+        self._bitmaps = {}
+        self._postings = {}
+        for column in list(bitmap_columns) + list(posting_columns):
+            if column not in df.columns:
+                continue
+            codes, uniques = self._factorize(df[column], column in IP_COLUMNS)
+            self._codes[column], self._uniques[column] = codes, uniques
+            if column in bitmap_columns:
+                self._bitmaps[column] = np.stack([np.packbits(codes == k) for k in range(len(uniques))]) \
+                    if len(uniques) else np.zeros((0, self.n_bytes), dtype=np.uint8)
+            else:
+                # Lignes regroupées par valeur : rows[offsets[k]:offsets[k + 1]] pour la valeur k
+                rows = np.argsort(codes, kind="stable").astype(np.int64)
+                counts = np.bincount(codes[codes >= 0], minlength=len(uniques))
+                n_missing = int((codes < 0).sum())
+                self._postings[column] = (rows[n_missing:], np.r_[0, np.cumsum(counts)])
+
+    @staticmethod
+    def _factorize(values, is_ip):
+        """Codes (-1 pour les valeurs manquantes) et valeurs distinctes dans l'ordre naturel."""
+        codes, uniques = pd.factorize(values, sort=True)
+        if is_ip and len(uniques):
+            # Ordre numérique des adresses et non lexicographique
+            order = np.argsort(ip_to_uint32(np.asarray(uniques, dtype=object)), kind="stable")
+            rank = np.empty(len(order), dtype=np.int64)
+            rank[order] = np.arange(len(order))
+            codes = np.where(codes >= 0, rank[codes], -1)
+            uniques = uniques[order]
+        return codes.astype(np.int64), np.asarray(uniques)
+
+    @property
+    def n_bytes(self):
+        return (self.n_rows + 7) // 8
+
+    # ------------------------------------------------------------------ Bitsets
+
+    def all(self):
+        """Bitset de toutes les lignes."""
+        return np.packbits(np.ones(self.n_rows, dtype=bool))
+
+    def pack(self, mask):
+        """Bitset d'un masque booléen (par exemple `filters.Filter.mask`)."""
+        return np.packbits(np.asarray(mask, dtype=bool))
+
+    def range(self, start, stop):
+        """Bitset des lignes contiguës [start, stop) (par exemple une tranche de `time_index.TimeIndex`)."""
+        mask = np.zeros(self.n_rows, dtype=bool)
+        mask[start:stop] = True
+        return np.packbits(mask)
+
+    def bounds(self, bits):
+        """Première et dernière ligne du bitset (None si vide)."""
+        nonzero = np.flatnonzero(bits)
+        if not len(nonzero):
+            return None
+        first = np.unpackbits(bits[nonzero[0]:nonzero[0] + 1]).argmax()
+        last = 7 - np.unpackbits(bits[nonzero[-1]:nonzero[-1] + 1])[::-1].argmax()
+        return int(nonzero[0] * 8 + first), int(nonzero[-1] * 8 + last)
+
+    def mask(self, bits):
+        """Masque booléen des lignes d'un bitset."""
+        return np.unpackbits(bits, count=self.n_rows).view(bool)
+
+    def count(self, bits):
+        """Nombre de lignes d'un bitset."""
+        return int(POPCOUNT[bits].sum(dtype=np.int64))
+
+    # ------------------------------------------------------------------ Sélections
+
+    def uniques(self, column):
+        """Valeurs distinctes de la colonne (ordre naturel ; numérique pour les IP)."""
+        return self._uniques[column]
+
+    def _value_codes(self, column, values):
+        uniques = self._uniques[column]
+        if pd.api.types.is_numeric_dtype(uniques.dtype):
+            values = pd.to_numeric(pd.Series(list(values), dtype="object"), errors="coerce").dropna()
+        codes = pd.Index(uniques).get_indexer(list(values))
+        return codes[codes >= 0]
+
+    def select_codes(self, column, codes):
+        """Bitset des lignes dont la valeur a l'un des codes donnés (OU des bitsets ou des listes de lignes)."""
+        codes = np.asarray(codes, dtype=np.int64)
+        if column in self._bitmaps:
+            if not len(codes):
+                return np.zeros(self.n_bytes, dtype=np.uint8)
+            return np.bitwise_or.reduce(self._bitmaps[column][codes], axis=0)
+        if len(codes) > MAX_POSTINGS:
+            # Beaucoup de valeurs : une passe sur les codes coûte moins que la réunion des listes
+            keep = np.zeros(len(self._uniques[column]) + 1, dtype=bool)
+            keep[codes] = True
+            return np.packbits(keep[self._codes[column]])  # code -1 -> dernier élément (False)
+        rows, offsets = self._postings[column]
+        mask = np.zeros(self.n_rows, dtype=bool)
+        for code in codes.tolist():
+            mask[rows[offsets[code]:offsets[code + 1]]] = True
+        return np.packbits(mask)
+
+    def select(self, column, values):
+        """Bitset des lignes dont la valeur de `column` est dans `values`."""
+        return self.select_codes(column, self._value_codes(column, values))
+
+    def select_where(self, column, keep):
+        """Bitset des lignes dont la valeur vérifie un prédicat évalué sur `uniques(column)` (tableau booléen)."""
+        return self.select_codes(column, np.flatnonzero(keep))
+
+    def distinct(self, column, bits):
+        """Valeurs de `column` présentes dans les lignes du bitset (ordre naturel)."""
+        codes = self._codes[column][self.mask(bits)]
+        present = np.bincount(codes[codes >= 0], minlength=len(self._uniques[column])) > 0
+        return self._uniques[column][present]
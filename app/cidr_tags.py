@@ -0,0 +1,158 @@
+"""
+Étiquetage d'adresses IP par listes de préfixes CIDR (réseaux internes, listes de blocage, inventaires).
+
+Chaque étiquette est compilée en un tableau trié d'intervalles uint32 disjoints (préfixes fusionnés) ;
+l'appartenance d'une colonne d'IP se teste par recherche dichotomique vectorisée, en O(log n) par
+adresse quel que soit le nombre de préfixes.
+
+Les listes sont lues dans `TAGS_DIR` : un fichier par étiquette (`<étiquette>.txt`, un préfixe par
+ligne, `#` pour les commentaires) ou un CSV `cidr,tag` regroupant plusieurs étiquettes.
+"""
+import glob
+import os
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from events import ip_to_uint32
+
+TAGS_DIR = os.environ.get("TAGS_DIR", os.path.join(os.path.dirname(os.path.abspath(__file__)), "tags"))
+
+# Réseaux de l'université (étiquette toujours disponible)
+UNIVERSITY_TAG = "université"
+UNIVERSITY_NETWORKS = ["103.0.0.0/8", "10.70.0.0/16", "159.84.0.0/16", "192.168.0.0/16"]
+
+
+def prefixes_to_intervals(prefixes):
+    """
+    Convertit des préfixes CIDR (ou IP seules) en intervalles [début, fin] uint32 triés et disjoints.
+    Les lignes invalides sont ignorées.
+    """
+    prefixes = pd.Series(prefixes, dtype="object").dropna().astype(str).str.strip()
+    parts = prefixes.str.split("/", n=1, expand=True).reindex(columns=[0, 1])
+    base = ip_to_uint32(parts[0]).astype(np.int64)
+    length = pd.to_numeric(parts[1], errors="coerce").fillna(32).to_numpy(dtype=np.int64)
+    valid = ((base != 0) | (parts[0] == "0.0.0.0").to_numpy()) & (length >= 0) & (length <= 32)
+    base, length = base[valid], length[valid]
+
+    size = np.left_shift(np.int64(1), 32 - length)
+    starts = base & ~(size - 1)
+    ends = starts + size - 1
+    return merge_intervals(starts, ends)
+
+
+def merge_intervals(starts, ends):
+    """Fusionne des intervalles qui se chevauchent ou se touchent (résultat trié)."""
+    if len(starts) == 0:
+        return np.array([], dtype=np.int64), np.array([], dtype=np.int64)
+    order = np.argsort(starts, kind="stable")
+    starts, ends = starts[order], ends[order]
+    reach = np.maximum.accumulate(ends)
+    new = np.r_[True, starts[1:] > reach[:-1] + 1]
+    group_starts = np.flatnonzero(new)
+    return starts[group_starts], np.maximum.reduceat(ends, group_starts)
+
+
+def read_prefix_file(path):
+    """Lit un fichier de préfixes : dictionnaire {étiquette: [préfixes]}."""
+    name = os.path.splitext(os.path.basename(path))[0]
+    with open(path) as f:
+        lines = [line.split("#", 1)[0].strip() for line in f]
+    lines = [line for line in lines if line and line.lower() not in ("cidr", "cidr,tag")]
+    if path.endswith(".csv"):
+        rows = pd.DataFrame([line.split(",", 1) for line in lines]).reindex(columns=[0, 1])
+        rows[1] = rows[1].fillna(name).str.strip()
+        return {tag: group[0].tolist() for tag, group in rows.groupby(1)}
+    return {name: lines}
+
+
+class CidrTagger:
+    """Ensemble d'étiquettes, chacune compilée en intervalles uint32 disjoints triés."""
+
+    def __init__(self, prefixes_by_tag=None):
+        self._starts = {}
+        self._ends = {}
+        for tag, prefixes in (prefixes_by_tag or {}).items():
+            self.add(tag, prefixes)
+
+    def add(self, tag, prefixes):
+        """Ajoute des préfixes à une étiquette (fusionnés avec ceux déjà présents)."""
+        starts, ends = prefixes_to_intervals(prefixes)
+        if tag in self._starts:
+            starts, ends = merge_intervals(np.r_[self._starts[tag], starts], np.r_[self._ends[tag], ends])
+        self._starts[tag], self._ends[tag] = starts, ends
+
+    @classmethod
+    def from_directory(cls, path=TAGS_DIR):
+        """Étiquette université, plus toutes les listes trouvées dans `path`."""
+        tagger = cls({UNIVERSITY_TAG: UNIVERSITY_NETWORKS})
+        for file in sorted(glob.glob(os.path.join(path, "*.txt")) + glob.glob(os.path.join(path, "*.csv"))):
+            for tag, prefixes in read_prefix_file(file).items():
+                tagger.add(tag, prefixes)
+        return tagger
+
+    @property
+    def tags(self):
+        return list(self._starts)
+
+    def size(self, tag):
+        """Nombre d'intervalles disjoints de l'étiquette."""
+        return len(self._starts[tag])
+
+    def intervals(self, tag):
+        """Intervalles [début, fin] uint32 triés et disjoints de l'étiquette."""
+        return self._starts[tag], self._ends[tag]
+
+    def match(self, ips, tag):
+        """
+        Appartenance de chaque IP à l'étiquette.
+
+        Args:
+            ips (np.ndarray): IP en uint32 (voir `events.ip_to_uint32`).
+        """
+        ips = np.asarray(ips, dtype=np.int64)
+        starts, ends = self._starts[tag], self._ends[tag]
+        index = np.searchsorted(starts, ips, side="right") - 1
+        return (index >= 0) & (ips <= ends[np.maximum(index, 0)] if len(ends) else False)
+
+    def tag(self, ips, tags=None):
+        """Tableau booléen (une colonne par étiquette) pour une colonne d'IP uint32."""
+        return pd.DataFrame({tag: self.match(ips, tag) for tag in (tags or self.tags)})
+
+    def labels(self, ips, tags=None):
+        """Étiquettes de chaque IP, séparées par des virgules (chaîne vide si aucune)."""
+        flags = self.tag(ips, tags)
+        if not len(flags.columns):
+            return np.full(len(ips), "", dtype=object)
+        # Une chaîne par combinaison d'étiquettes distincte, et non par ligne
+        names = np.array(flags.columns, dtype=object)
+        combos, uniques = pd.factorize(flags.to_numpy() @ (1 << np.arange(len(names), dtype=np.int64)))
+        text = np.array([",".join(names[(u >> np.arange(len(names))) & 1 == 1]) for u in uniques], dtype=object)
+        return text[combos]
+
+
+@st.cache_resource
+def get_tagger():
+    # Listes chargées une seule fois par processus serveur
+    return CidrTagger.from_directory()
+
+
+def tag_values_mask(values, tags):
+    """Appartenance de chaque IP (texte) à au moins une des étiquettes `tags`."""
+    tagger = get_tagger()
+    ips = ip_to_uint32(values)
+    keep = np.zeros(len(ips), dtype=bool)
+    for tag in tags:
+        if tag in tagger.tags:
+            keep |= tagger.match(ips, tag)
+    return keep
+
+
+def apply_tag_filter(df, column, tags):
+    """Garde les lignes dont l'IP de `column` (texte) porte au moins une des étiquettes `tags`."""
+    if not tags or df.empty:
+        return df
+    codes, uniques = pd.factorize(df[column])
+    keep = tag_values_mask(uniques, tags)
+    return df[np.append(keep, False)[codes]]
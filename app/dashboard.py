@@ -1,38 +1,47 @@
 import streamlit as st
-from utils import permit_deny_by_ip, get_one_ip_logs
+from utils import COMPARE_MAX_IPS, BackgroundCatchUp, compare_ips, get_ips_logs, permit_deny_by_ip, get_one_ip_logs
 import plotly.express as px
 import plotly.graph_objects as go  # Pour les graphiques temporels
-import ipaddress
+import io
+from datetime import datetime, time
+import numpy as np
 import pandas as pd
 
+import filters
+import metrics
+from cidr_tags import UNIVERSITY_TAG, apply_tag_filter, get_tagger
+from time_index import sort_by_time
+from rules import RuleIndex, load_rule_ids
+from rule_simulation import load_ruleset
+from interfaces import ACTIONS, InterfaceMatrix, fetch_cube
+from ip_profiles import SORT_COLUMNS, ProfileStore
+from subnets import PREFIXES, SubnetRollup
+import jobs
 
-@st.cache_data
-def filter_university_ips(df):
+IP_PAGE_SIZE = 50  # IP par page dans la liste de l'analyse détaillée
+
+
+@st.cache_resource(max_entries=16)
+@metrics.timed("dashboard.subnet_rollup")
+def get_subnet_rollup(key, _df):
+    # Agrégats /8, /16, /24 construits une fois par table filtrée (voir subnets) et gardés tels quels en
+    # mémoire : `key` (filtres appliqués) identifie la table, qui n'est ni hachée ni copiée à chaque appel
+    return SubnetRollup(_df)
+
+@metrics.timed("dashboard.filter_university_ips")
+def filter_university_ips(df, rollup):
     """Filter IPs belonging to university networks and sort them"""
-    university_networks = [
-        ipaddress.ip_network("103.0.0.0/8"),
-        ipaddress.ip_network("10.70.0.0/16"),
-        ipaddress.ip_network("159.84.0.0/16"),
-        ipaddress.ip_network("192.168.0.0/16")
-    ]
-    
-    def is_university_ip(ip):
-        try:
-            ip_obj = ipaddress.ip_address(ip)
-            return any(ip_obj in network for network in university_networks)
-        except ValueError:
-            return False
-    
-    # Filter university IPs
-    df['is_university'] = df['IP_Source'].apply(is_university_ip)
-    university_df = df[df['is_university']].copy()
+    # Plages des réseaux de l'université lues sur les IP triées du rollup (voir subnets), sans parcours des lignes
+    rows = rollup.rows_in(*get_tagger().intervals(UNIVERSITY_TAG))
+    university_df = df.iloc[np.sort(rows)].copy()
+    university_df['is_university'] = True
     
     return university_df.sort_values('PERMIT', ascending=False)
 
 
 
 # Fonction pour récupérer les données de PERMIT et DENY par IP (mise en cache)
-@st.cache_data
+@metrics.cache_data("dashboard.get_permit_deny_by_ip")
 def get_permit_deny_by_ip():
     """
     Récupère les données de PERMIT et DENY par IP depuis une source externe.
@@ -61,34 +70,588 @@ def get_top_ports(df, n=10):
 #     """Retourne les top ports Well Known."""
 #     return df.nlargest(n, 'Port_Dest_Well_Known')[['Port_Dest_Well_Known', 'PERMIT']]
 
+@st.cache_resource
+def get_rule_index():
+    # Un seul index des règles partagé, complété au fil des nouveaux logs
+    return RuleIndex()
+
+@metrics.cache_data("dashboard.rule_index", ttl=300, max_entries=4)
+def load_rule_index(version):
+    # `version` (lots déjà intégrés en arrière-plan) : le résumé suit l'avancée de la lecture
+    index = get_rule_index()
+    return index.summary(), index.trend()
+
+@st.cache_resource
+def get_flow_graph():
+    # Graphe des flux partagé (scipy importé seulement à la première utilisation)
+    from flow_graph import FlowGraph
+    return FlowGraph()
+
+def show_ip_neighbourhood(ip):
+    """Voisinage de l'IP dans le graphe des flux : destinations contactées, sources reçues, sous-graphe."""
+    from flow_graph import to_node_link
+    st.subheader("🕸️ Voisinage de l'IP")
+    graph = get_flow_graph()
+    fan_out = graph.neighbors(ip, "out")
+    fan_in = graph.neighbors(ip, "in")
+
+    col_out, col_in = st.columns(2)
+    with col_out:
+        st.metric("📤 Destinations distinctes", f"{len(fan_out):,}")
+        st.dataframe(fan_out.head(20), use_container_width=True, hide_index=True)
+    with col_in:
+        st.metric("📥 Sources distinctes", f"{len(fan_in):,}")
+        st.dataframe(fan_in.head(20), use_container_width=True, hide_index=True)
+
+    if not fan_out.empty:
+        destination = st.selectbox("🎯 Ports utilisés vers", fan_out["IP"].head(50), key="flow_destination")
+        ports = graph.edge_ports(ip, destination).head(10)
+        fig_ports = px.bar(x=ports.index.astype(str), y=ports.values,
+                           labels={"x": "Port de destination", "y": "Événements"},
+                           title=f"Ports de {ip} vers {destination}")
+        st.plotly_chart(fig_ports, use_container_width=True)
+
+    hops = st.radio("Profondeur du sous-graphe", [1, 2], horizontal=True, key="flow_hops")
+    edges = graph.subgraph([ip], hops=hops, max_edges=500)
+    st.download_button(
+        label="🕸️ Exporter le sous-graphe (JSON nœuds / liens)",
+        data=to_node_link(edges),
+        file_name=f"sous_graphe_{ip}.json",
+        mime="application/json"
+    )
+
+@st.cache_resource
+def get_profile_store():
+    # Profils par IP source partagés, complétés au fil des nouveaux logs
+    return ProfileStore()
+
+@st.cache_resource
+def get_accumulators():
+    # Lecture de l'historique puis des nouveaux logs par les trois accumulateurs dans un thread du
+    # serveur : les onglets lisent l'état déjà construit sans attendre
+    store = get_profile_store()
+    return BackgroundCatchUp("dashboard.accumulators", [get_rule_index(), get_flow_graph(), store],
+                             after=store.merge).start()
+
+def show_catch_up_status():
+    """Avancement de la lecture des logs par les index (règles, graphe des flux, profils)."""
+    accumulators = get_accumulators()
+    if accumulators.error:
+        st.warning(f"⚠️ Dernière lecture des logs en échec : {accumulators.error}")
+    if accumulators.ready:
+        st.caption(accumulators.describe())
+    else:
+        st.info(accumulators.describe())
+
+@st.cache_data
+def load_cluster_labels(path):
+    # Étiquettes de la dernière tâche de clustering terminée (voir jobs)
+    return pd.read_csv(path, usecols=["IP_Source", "Cluster_str"]).set_index("IP_Source")["Cluster_str"]
+
+@metrics.cache_data("dashboard.get_one_ip_logs", ttl=300)
+def get_cached_ip_logs(ip):
+    return get_one_ip_logs(ip)
+
+@metrics.cache_data("dashboard.compare_ips", ttl=300)
+def get_cached_comparison(ips, start, end):
+    return compare_ips(list(ips), start, end)
+
+@metrics.cache_data("dashboard.get_ips_logs", ttl=300)
+def get_cached_ips_logs(ips, start, end):
+    return get_ips_logs(list(ips), start, end)
+
+@st.cache_data
+def load_job_table(path):
+    return pd.read_csv(path)
+
+def show_rule_simulation():
+    """Simulation d'un jeu de règles proposé : flux dont le verdict changerait."""
+    with st.expander("🧪 Simulation d'un jeu de règles", expanded=False):
+        st.caption("CSV ordonné : name, action (PERMIT/DENY), proto, src, dst (CIDR, `*`), portdst (ports, plages, `*`).")
+        uploaded = st.file_uploader("Jeu de règles proposé", type=["csv"])
+        col1, col2 = st.columns(2)
+        with col1:
+            default_action = st.radio("Politique par défaut", ["DENY", "PERMIT"], horizontal=True)
+        with col2:
+            max_docs = st.number_input("Nombre maximal de logs rejoués (0 = tous)", min_value=0, value=0, step=1000000)
+        if uploaded is None:
+            return
+        rules_csv = uploaded.getvalue().decode("utf-8")
+        try:
+            load_ruleset(io.StringIO(rules_csv), default_action)  # Validation immédiate, avant la tâche de fond
+        except (ValueError, KeyError) as e:
+            st.error(f"Jeu de règles invalide : {e}")
+            return
+
+        # Rejeu de l'historique dans un processus de travail (voir jobs) : la page reste utilisable
+        params = {"rules_csv": rules_csv, "default_action": default_action, "max_docs": int(max_docs) or None}
+        jobs.submit_button("▶️ Lancer la simulation", "rule_simulation", params, key="rule_simulation_submit")
+        queue = jobs.get_queue()
+        state = queue.get(jobs.job_id("rule_simulation", params))
+        if state is None:
+            return
+        if state["status"] in jobs.ACTIVE:
+            st.progress(state.get("progress") or 0.0, text=state.get("message") or "")
+            st.button("🔄 Actualiser", key="rule_simulation_refresh")
+            return
+        if state["status"] == "failed":
+            st.error(state.get("error", "Échec"))
+            return
+        job = state["id"]
+        by_rule = load_job_table(queue.artifact_path(job, "by_rule.csv"))
+        by_idregle = load_job_table(queue.artifact_path(job, "by_idregle.csv"))
+        samples = load_job_table(queue.artifact_path(job, "samples.csv")) if state["artifacts"].get("samples.csv") else pd.DataFrame()
+        n_events = int(by_rule["Événements"].sum())
+        changed = by_rule["Changements"].sum()
+        st.metric("Flux dont le verdict change", f"{changed:,}", f"{100 * changed / max(n_events, 1):.2f} % de {n_events:,}")
+        col_rule, col_idregle = st.columns(2)
+        with col_rule:
+            st.write("**Par règle proposée**")
+            st.dataframe(by_rule, use_container_width=True, hide_index=True)
+        with col_idregle:
+            st.write("**Par règle d'origine (idregle)**")
+            st.dataframe(by_idregle, use_container_width=True, hide_index=True)
+        st.write("**Exemples de flux modifiés**")
+        st.dataframe(samples, use_container_width=True, hide_index=True)
+
+def show_rules_tab():
+    """Règles de pare-feu : trafic par règle, règles inutilisées, tendance et principales sources."""
+    st.subheader("📜 Règles de pare-feu")
+    show_catch_up_status()
+    summary, trend = load_rule_index(get_accumulators().version)
+    if summary.empty:
+        st.info("Aucune règle déclenchée.")
+        return
+
+    col1, col2 = st.columns([1, 1])
+    with col1:
+        idle_days = st.number_input("⏳ Inactive depuis (jours)", min_value=1, max_value=30, value=7)
+    known_rules = load_rule_ids()
+    unused = get_rule_index().unused(known_rules, idle_seconds=idle_days * 86400)
+
+    k1, k2, k3 = st.columns(3)
+    k1.metric("Règles déclenchées", len(summary))
+    k2.metric("Règles inutilisées", len(unused))
+    k3.metric(f"Part de la règle {summary['idregle'].iloc[0]}", f"{summary['Part (%)'].iloc[0]:.1f} %")
+
+    col_top, col_unused = st.columns([2, 1])
+    with col_top:
+        top = summary.head(15).astype({"idregle": str})
+        fig_rules = px.bar(top, x="idregle", y=["PERMIT", "DENY"], title="Règles les plus sollicitées",
+                           color_discrete_map={"PERMIT": "#4A90E2", "DENY": "#D0021B"})
+        fig_rules.update_layout(xaxis_type="category", yaxis_title="Déclenchements")
+        st.plotly_chart(fig_rules, use_container_width=True)
+    with col_unused:
+        st.write("**Règles jamais déclenchées ou inactives**")
+        if not known_rules:
+            st.caption("Aucun fichier de règles (RULES_FILE) : seules les règles inactives sont listées.")
+        st.dataframe(unused, use_container_width=True, hide_index=True)
+
+    selected_rules = st.multiselect("📈 Tendance des règles", summary["idregle"].tolist(),
+                                    default=summary["idregle"].head(5).tolist())
+    if selected_rules and not trend.empty:
+        fig_trend = px.line(trend[selected_rules], title="Déclenchements par heure")
+        fig_trend.update_layout(xaxis_title="Heure", yaxis_title="Déclenchements", legend_title="Règle")
+        st.plotly_chart(fig_trend, use_container_width=True)
+
+    rule = st.selectbox("🔎 Principales sources de la règle", summary["idregle"].tolist())
+    st.dataframe(get_rule_index().top_sources(rule), use_container_width=True, hide_index=True)
+    st.dataframe(summary, use_container_width=True, hide_index=True)
+
+    show_rule_simulation()
+
+@metrics.cache_data("dashboard.interface_matrix", ttl=300)
+def load_interface_matrix():
+    # Une seule agrégation composite ; les lectures par couple d'interfaces se font ensuite en mémoire
+    return InterfaceMatrix(fetch_cube())
+
+def show_interfaces_tab():
+    """Trafic entre interfaces : carte de chaleur entrée x sortie et détail d'un couple."""
+    st.subheader("🔀 Trafic entre interfaces")
+    with st.spinner("Chargement de la matrice des interfaces..."):
+        matrix = load_interface_matrix()
+    if matrix.empty:
+        st.info("Aucun trafic entre interfaces.")
+        return
+
+    col_action, col_proto, col_view = st.columns(3)
+    with col_action:
+        actions = st.multiselect("Action", ACTIONS, default=ACTIONS, key="interfaces_actions")
+    with col_proto:
+        protocols = st.multiselect("Protocole", list(matrix.protocols), default=list(matrix.protocols),
+                                   key="interfaces_protocols")
+    with col_view:
+        view = st.radio("Valeur", ["Événements", "Part de DENY"], horizontal=True, key="interfaces_view")
+
+    if view == "Événements":
+        values = matrix.matrix(actions, protocols)
+        fig_matrix = px.imshow(values, text_auto=True, color_continuous_scale="Blues",
+                               labels={"x": "Interface de sortie", "y": "Interface d'entrée", "color": "Événements"})
+    else:
+        values = matrix.deny_ratio()
+        fig_matrix = px.imshow(values, text_auto=".0%", color_continuous_scale="Reds", zmin=0, zmax=1,
+                               labels={"x": "Interface de sortie", "y": "Interface d'entrée", "color": "DENY"})
+    fig_matrix.update_layout(title="Matrice entrée x sortie")
+    st.plotly_chart(fig_matrix, use_container_width=True)
+
+    # Détail d'un couple d'interfaces
+    col_in, col_out = st.columns(2)
+    with col_in:
+        interface_in = st.selectbox("📥 Interface d'entrée", list(matrix.interfaces), key="interfaces_in")
+    with col_out:
+        interface_out = st.selectbox("📤 Interface de sortie", list(matrix.interfaces), index=min(1, len(matrix.interfaces) - 1),
+                                     key="interfaces_out")
+    col_breakdown, col_timeline = st.columns([1, 2])
+    with col_breakdown:
+        st.write(f"**{interface_in} → {interface_out}**")
+        st.dataframe(matrix.breakdown(interface_in, interface_out), use_container_width=True)
+    with col_timeline:
+        timeline = matrix.timeline(interface_in, interface_out)
+        if timeline.empty:
+            st.info("Aucun trafic pour ce couple d'interfaces.")
+        else:
+            fig_timeline = px.line(timeline, title=f"Trafic {interface_in} → {interface_out} par heure",
+                                   color_discrete_map={"PERMIT": "#4A90E2", "DENY": "#D0021B"})
+            fig_timeline.update_layout(xaxis_title="Heure", yaxis_title="Événements", legend_title="Action")
+            st.plotly_chart(fig_timeline, use_container_width=True)
+
 # Fonction pour appliquer les filtres
+@metrics.timed("dashboard.apply_filters")
 def apply_filters(df, range_permit,   protocol, port_range):
     """
     Applique les filtres sélectionnés par l'utilisateur sur le DataFrame.
     """
     # Filtre par nombre de PERMIT
-    filtered_df = df[(df['PERMIT'].between(range_permit[0], range_permit[1]))].copy()
-    
-    # Filtre par protocole
-    if "TCP" in protocol and "UDP" in protocol:
-        pass  # Aucun filtre nécessaire, on garde tout
-    else:
-        if "TCP" in protocol:
-            filtered_df = filtered_df[filtered_df['PERMIT_TCP'] > 0]
-        if "UDP" in protocol:
-            filtered_df = filtered_df[filtered_df['PERMIT_UDP'] > 0]
-    
+    clauses = [filters.Between('PERMIT', range_permit[0], range_permit[1])]
+
+    # Filtre par protocole (aucun filtre si TCP et UDP sont tous deux sélectionnés)
+    if "TCP" in protocol and "UDP" not in protocol:
+        clauses.append(filters.Between('PERMIT_TCP', low=1))
+    if "UDP" in protocol and "TCP" not in protocol:
+        clauses.append(filters.Between('PERMIT_UDP', low=1))
+
     # Filtre par plage de ports
-    if port_range == "Well Known (0-1023)":
-        filtered_df = filtered_df[filtered_df['Nb_Port_Dest'].between(0, 1023)]
-    elif port_range == "Registered (1024-49151)":
-        filtered_df = filtered_df[filtered_df['Nb_Port_Dest'].between(1024, 49151)]
-    elif port_range == "Dynamic/Private (49152-65535)":
-        filtered_df = filtered_df[filtered_df['Nb_Port_Dest'].between(49152, 65535)]
-    
-    return filtered_df
+    port_ranges = {
+        "Well Known (0-1023)": (0, 1023),
+        "Registered (1024-49151)": (1024, 49151),
+        "Dynamic/Private (49152-65535)": (49152, 65535),
+    }
+    if port_range in port_ranges:
+        clauses.append(filters.Between('Nb_Port_Dest', *port_ranges[port_range]))
+
+    # Un seul masque, une seule indexation du DataFrame
+    return filters.apply(df, filters.And(*clauses))
 
 # Fonction principale pour afficher le dashboard
+def show_ip_tab(filtered_df):
+    """Analyse détaillée par IP, lue dans les profils précalculés (une recherche par IP)."""
+    st.subheader("🖥️ Analyse détaillée par IP")
+    show_catch_up_status()
+    profiles = get_profile_store()
+    labels_path = jobs.get_queue().latest_artifact("clustering", "clusters.csv")
+    if labels_path is not None:
+        profiles.set_labels(load_cluster_labels(labels_path), source=labels_path)
+
+    # Liste des IP triée et paginée sur les profils (sans nouvelle agrégation)
+    col_sort, col_order, col_page = st.columns([2, 1, 1])
+    with col_sort:
+        sort_by = st.selectbox("↕️ Trier les IP par", SORT_COLUMNS, key="ip_sort")
+    with col_order:
+        descending = st.toggle("Décroissant", value=True, key="ip_descending")
+    ips = filtered_df["IP_Source"]
+    _, total = profiles.page(sort_by, descending, 0, 0, ips=ips)
+    n_pages = max(1, -(-total // IP_PAGE_SIZE))
+    with col_page:
+        page = st.number_input(f"Page (sur {n_pages})", min_value=1, max_value=n_pages, value=1, key="ip_page")
+    listing, _ = profiles.page(sort_by, descending, page - 1, IP_PAGE_SIZE, ips=ips)
+    with st.expander(f"📋 Liste des IP ({total:,} profils)"):
+        st.dataframe(listing, use_container_width=True, hide_index=True)
+    if listing.empty:
+        st.info("Aucun profil pour les IP filtrées.")
+        return
+
+    selected_ip = st.selectbox("🔎 Sélectionnez une IP", listing["IP_Source"])
+    profile = profiles.profile(selected_ip)
+    if profile["cluster"] is not None:
+        st.caption(f"Cluster : {profile['cluster']}")
+
+    # Metrics display
+    col1, col2, col3, col4 = st.columns(4)
+    with col1:
+        st.markdown(f"""
+        <div class="kpi-card-ip">
+            <div class="kpi-value">{profile['COUNT']:,}</div>
+            <p>🔢 Total Requêtes</p>
+        </div>
+    """, unsafe_allow_html=True)
+    with col2:
+        st.markdown(f"""
+        <div class="kpi-card-ip">
+            <div class="kpi-value">{profile['PERMIT']:,}</div>
+            <p>🔓 Total PERMIT</p>
+        </div>
+    """, unsafe_allow_html=True)
+    with col3:
+        st.markdown(f"""
+        <div class="kpi-card-ip">
+            <div class="kpi-value">{profile['DENY']:,}</div>
+            <p>🔒 Total DENY</p>
+        </div>
+    """, unsafe_allow_html=True)
+    with col4:
+        st.markdown(f"""
+        <div class="kpi-card-ip">
+            <div class="kpi-value">{len(profile['regles']):,}</div>
+            <p>🔧 Total Règles</p>
+        </div>
+    """, unsafe_allow_html=True)
+
+    # Date filter and plot
+    date_col, plot_col = st.columns([1, 3])
+
+    with date_col:
+        min_date = profile["Premier"].date()
+        max_date = profile["Dernier"].date()
+
+        date_debut = st.date_input(
+            "🗓️ Date de début",
+            value=min_date,
+            min_value=min_date,
+            max_value=max_date
+        )
+        date_fin = st.date_input(
+            "🗓️ Date de fin",
+            value=max_date,
+            min_value=min_date,
+            max_value=max_date
+        )
+
+        # Show date range stats
+        st.info(f"🕒 Période: {(date_fin - date_debut).days + 1} jours")
+
+    with plot_col:
+        # Activité journalière du profil, restreinte à la période
+        daily_stats = profile["activite"].loc[pd.Timestamp(date_debut):pd.Timestamp(date_fin)]
+
+        # Plot time series
+        fig_time = go.Figure()
+
+        if daily_stats['PERMIT'].any():
+            fig_time.add_trace(go.Scatter(
+                x=daily_stats.index,
+                y=daily_stats['PERMIT'],
+                name='PERMIT',
+                line=dict(color='green')
+            ))
+
+        if daily_stats['DENY'].any():
+            fig_time.add_trace(go.Scatter(
+                x=daily_stats.index,
+                y=daily_stats['DENY'],
+                name='DENY',
+                line=dict(color='red')
+            ))
+
+        fig_time.update_layout(
+            title=f"📈 Activité journalière pour {selected_ip}",
+            xaxis_title="Date",
+            yaxis_title="Nombre d'événements",
+            hovermode='x unified',
+            showlegend=True,
+            height=400
+        )
+
+        st.plotly_chart(fig_time, use_container_width=True)
+
+    plot_port_destinations , plot_port_sources, plot_proto = st.columns(3)
+    with plot_port_destinations:
+        # Top 5 port destinations
+        top_ports_dest = profile["top_portdst"]
+        fig_ports_dest = px.pie(
+            top_ports_dest,
+            names=top_ports_dest.index,
+            values=top_ports_dest.values,
+            title="Top 5 - Ports de destination"
+        )
+        st.plotly_chart(fig_ports_dest, use_container_width=True)
+
+    with plot_port_sources:
+        # Top 5 port sources
+        top_ports_src = profile["top_portsrc"]
+        fig_ports_src = px.pie(
+            top_ports_src,
+            names=top_ports_src.index,
+            values=top_ports_src.values,
+            title="Top 5 - Ports sources"
+        )
+        st.plotly_chart(fig_ports_src, use_container_width=True)
+
+    with plot_proto:
+        # Protocol distribution
+        proto_dist = profile["protocoles"]
+        fig_proto = px.pie(
+            proto_dist,
+            names=proto_dist.index,
+            values=proto_dist.values,
+            title="Distribution des protocoles"
+        )
+        st.plotly_chart(fig_proto, use_container_width=True)
+
+    with st.expander("🔧 Règles déclenchées"):
+        st.dataframe(profile["regles"].reset_index(), use_container_width=True, hide_index=True)
+
+    show_ip_neighbourhood(selected_ip)
+
+    # 📂 Boutons de téléchargement : logs bruts récupérés seulement à la demande
+    st.subheader("⬇️ Télécharger les logs filtrés")
+    if not st.toggle("📥 Récupérer les logs bruts de l'IP sur la période", key="ip_raw_logs"):
+        return
+
+    ip_data = get_cached_ip_logs(selected_ip)
+
+    # Trier par horodatage et indexer le temps (voir time_index), jour de fin inclus
+    ip_data, ip_times = sort_by_time(ip_data)
+    window = ip_times.window(date_debut, datetime.combine(date_fin, time.max))
+    filtered_ip_data = ip_data.iloc[window]
+
+    # Télécharger les données en CSV
+    st.download_button(
+        label="📄 Télécharger CSV", 
+        data=filtered_ip_data.to_csv(index=False), 
+        file_name="logs_filtrés.csv", 
+        mime="text/csv"
+    )
+
+    # Télécharger les données en JSON
+    st.download_button(
+        label="📂 Télécharger JSON", 
+        data=filtered_ip_data.to_json(orient="records"), 
+        file_name="logs_filtrés.json", 
+        mime="application/json"
+    )
+
+
+def show_compare_tab(filtered_df):
+    """Comparaison côte à côte de quelques IP : agrégats en une requête, logs bruts récupérés en parallèle."""
+    st.subheader("⚖️ Comparaison d'IP")
+    candidates = filtered_df.sort_values("COUNT", ascending=False)["IP_Source"]
+    selected = st.multiselect(
+        f"🔎 IP à comparer ({COMPARE_MAX_IPS} au plus)",
+        candidates,
+        default=list(candidates.head(3)),
+        max_selections=COMPARE_MAX_IPS,
+        key="compare_ips",
+    )
+    if not selected:
+        st.info("Sélectionnez au moins une IP.")
+        return
+
+    # Dates bornées à la période des données (profils des IP déjà construits)
+    first, last = get_profile_store().time_range()
+    bounds = {} if first is None else {"min_value": first.date(), "max_value": last.date()}
+    col_start, col_end = st.columns(2)
+    with col_start:
+        date_debut = st.date_input("🗓️ Date de début", value=None, key="compare_start", **bounds)
+    with col_end:
+        date_fin = st.date_input("🗓️ Date de fin", value=None, key="compare_end", **bounds)
+    if date_debut is not None and date_fin is not None and date_debut > date_fin:
+        st.warning("La date de début doit précéder la date de fin.")
+        return
+
+    ips = tuple(selected)
+    comparison = get_cached_comparison(ips, date_debut, date_fin)
+    st.dataframe(
+        comparison,
+        use_container_width=True,
+        hide_index=True,
+        column_config={"Part_DENY": st.column_config.ProgressColumn("Part DENY", min_value=0, max_value=1)},
+    )
+
+    fig_actions = px.bar(
+        comparison.melt(id_vars="IP_Source", value_vars=["PERMIT", "DENY"], var_name="Action", value_name="Événements"),
+        x="IP_Source",
+        y="Événements",
+        color="Action",
+        barmode="group",
+        color_discrete_map={"PERMIT": "green", "DENY": "red"},
+        title="🔓 PERMIT / 🔒 DENY par IP",
+    )
+    st.plotly_chart(fig_actions, use_container_width=True)
+
+    # Logs bruts de toutes les IP (une pagination par IP, en parallèle), seulement à la demande
+    if not st.toggle("📥 Récupérer les logs bruts des IP", key="compare_raw_logs"):
+        return
+    logs = get_cached_ips_logs(ips, date_debut, date_fin)
+    if logs.empty:
+        st.info("Aucun log pour ces IP sur la période.")
+        return
+
+    # Comptes journaliers de chaque IP lus sur les bornes des partitions de son index temporel (voir time_index)
+    daily = (
+        pd.concat(
+            {ip: sort_by_time(frame)[1].counts()["count"] for ip, frame in logs.groupby(level="IP_Source", sort=False)},
+            names=["IP_Source", "timestamp"],
+        )
+        .rename("Événements")
+        .reset_index()
+    )
+    fig_time = px.line(
+        daily,
+        x="timestamp",
+        y="Événements",
+        color="IP_Source",
+        title="📈 Activité journalière par IP",
+        labels={"timestamp": "Date"},
+    )
+    fig_time.update_layout(hovermode="x unified", height=400)
+    st.plotly_chart(fig_time, use_container_width=True)
+
+    st.download_button(
+        label="📄 Télécharger CSV",
+        data=logs.reset_index(level="rang", drop=True).reset_index().to_csv(index=False),
+        file_name="logs_comparaison.csv",
+        mime="text/csv",
+        key="compare_csv",
+    )
+
+
+def show_subnets_tab(rollup):
+    """Vue par sous-réseau : /8, puis /16 et /24 du sous-réseau choisi, puis ses IP."""
+    st.subheader("🌐 Sous-réseaux")
+    if not len(rollup):
+        st.info("Aucune IP pour les filtres sélectionnés.")
+        return
+    sort_by = st.radio("↕️ Trier par", ["COUNT", "DENY", "Part_DENY", "Nb_IP"], horizontal=True, key="subnets_sort")
+
+    # Chaque niveau se lit sur les agrégats du précédent (plage de clés), sans nouveau parcours des IP
+    level = rollup.level(PREFIXES[0]).sort_values(sort_by, ascending=False)
+    path = []
+    for length in PREFIXES:
+        st.write(f"**/{length}**" + (f" de {path[-1]}" if path else "") + f" ({len(level):,} sous-réseaux)")
+        col_table, col_plot = st.columns([2, 3])
+        with col_table:
+            st.dataframe(level, use_container_width=True, hide_index=True, height=250,
+                         column_config={"Part_DENY": st.column_config.ProgressColumn("Part DENY", min_value=0, max_value=1)})
+        with col_plot:
+            top = level.head(15)
+            fig_level = px.bar(top, x="Sous_reseau", y=["PERMIT", "DENY"], barmode="stack",
+                               color_discrete_map={"PERMIT": "green", "DENY": "red"},
+                               labels={"value": "Événements", "variable": "Action", "Sous_reseau": ""},
+                               title=f"Top 15 - /{length}")
+            fig_level.update_layout(xaxis_tickangle=45, height=300)
+            st.plotly_chart(fig_level, use_container_width=True)
+        subnet = st.selectbox(f"🔎 Détailler un /{length}", level["Sous_reseau"], key=f"subnets_{length}")
+        if subnet is None:
+            return
+        path.append(subnet)
+        level = rollup.children(subnet)
+        if length != PREFIXES[-1]:
+            level = level.sort_values(sort_by, ascending=False)
+
+    st.write(f"**IP de {path[-1]}** ({len(level):,})")
+    st.dataframe(level.sort_values("COUNT", ascending=False), use_container_width=True, hide_index=True)
+
+
 def show_dashboard():
     """
     Affiche le dashboard de sécurité réseau avec des filtres, des métriques et des visualisations.
@@ -178,6 +741,7 @@ def show_dashboard():
     st.markdown('<div class="title">🕸️ Analyse et Visualisation des flux réseaux</div>', unsafe_allow_html=True)
     # Récupérer les données
     df = get_permit_deny_by_ip()
+    df = apply_tag_filter(df, "IP_Source", st.session_state.get("ip_tags"))
     
     if df.empty:
         st.warning("Aucune donnée disponible. Veuillez vérifier la source des données.")
@@ -205,9 +769,19 @@ def show_dashboard():
     
     # Appliquer les filtres
     filtered_df = apply_filters(df, range_permit, protocol, port_range)
+    # Clé de la table filtrée : la table par IP est en cache, les filtres suffisent à la désigner
+    table_key = (tuple(sorted(st.session_state.get("ip_tags") or [])), tuple(range_permit), tuple(protocol),
+                 port_range, len(df), len(filtered_df))
+    rollup = get_subnet_rollup(table_key, filtered_df)
+
+    watch = metrics.Stopwatch("dashboard")
+
+    # Lecture des logs par les index lancée dès l'ouverture du dashboard, quel que soit l'onglet
+    get_accumulators()
 
     # Onglets pour organiser le contenu
-    tab1, tab2 = st.tabs(["📉 Statistiques", "🖥️ Analyse détaillée par IP"])
+    tab1, tab2, tab5, tab6, tab3, tab4 = st.tabs(["📉 Statistiques", "🖥️ Analyse détaillée par IP", "⚖️ Comparaison d'IP",
+                                                  "🌐 Sous-réseaux", "📜 Règles", "🔀 Interfaces"])
 
     with tab1:
         st.subheader("📉 Statistiques")
@@ -277,7 +851,7 @@ def show_dashboard():
         # Update the visualization code in show_edina()
         with col11:
             # Get university IPs data
-            uni_df = filter_university_ips(filtered_df)
+            uni_df = filter_university_ips(filtered_df, rollup)
             
             # Create visualization for university IPs
             fig_uni = px.bar(
@@ -309,169 +883,24 @@ def show_dashboard():
                              color_discrete_sequence=['lightblue'])
             st.plotly_chart(fig_ports, use_container_width=True)
 
-                
-                
+    watch.lap("statistiques")
+
     with tab2:
-        st.subheader("🖥️ Analyse détaillée par IP")
-        selected_ip = st.selectbox("🔎 Sélectionnez une IP", filtered_df["IP_Source"].unique())
-        
-        # Get IP data with caching
-        @st.cache_data(ttl=300)
-        def get_cached_ip_logs(ip):
-            return get_one_ip_logs(ip)
-        
-        ip_data = get_cached_ip_logs(selected_ip)
-        
-        # Convert timestamp to datetime if not already
-        ip_data['timestamp'] = pd.to_datetime(ip_data['timestamp'])
-        
-        # Metrics display
-        col1, col2, col3, col4 = st.columns(4)
-        with col1:
-            st.markdown(f"""
-            <div class="kpi-card-ip">
-                <div class="kpi-value">{ip_data.shape[0]:,}</div>
-                <p>🔢 Total Requêtes</p>
-            </div>
-        """, unsafe_allow_html=True)
-        with col2:
-            permit_count = ip_data['action'].value_counts().get('PERMIT', 0)
-            st.markdown(f"""
-            <div class="kpi-card-ip">
-                <div class="kpi-value">{permit_count:,}</div>
-                <p>🔓 Total PERMIT</p>
-            </div>
-        """, unsafe_allow_html=True)
-        with col3:
-            deny_count = ip_data['action'].value_counts().get('DENY', 0)
-            st.markdown(f"""
-            <div class="kpi-card-ip">
-                <div class="kpi-value">{deny_count:,}</div>
-                <p>🔒 Total DENY</p>
-            </div>
-        """, unsafe_allow_html=True)
-        with col4:
-            rules_count = ip_data['idregle'].nunique()
-            st.markdown(f"""
-            <div class="kpi-card-ip">
-                <div class="kpi-value">{rules_count:,}</div>
-                <p>🔧 Total Règles</p>
-            </div>
-        """, unsafe_allow_html=True)
-        
-        # Date filter and plot
-        date_col, plot_col = st.columns([1, 3])
-        
-        with date_col:
-            min_date = ip_data['timestamp'].min().date()
-            max_date = ip_data['timestamp'].max().date()
-            
-            date_debut = st.date_input(
-                "🗓️ Date de début",
-                value=min_date,
-                min_value=min_date,
-                max_value=max_date
-            )
-            date_fin = st.date_input(
-                "🗓️ Date de fin",
-                value=max_date,
-                min_value=min_date,
-                max_value=max_date
-            )
-            
-            # Show date range stats
-            st.info(f"🕒 Période: {(date_fin - date_debut).days + 1} jours")
-        
-        with plot_col:
-            # Filter data by date
-            mask = (ip_data['timestamp'].dt.date >= date_debut) & \
-                (ip_data['timestamp'].dt.date <= date_fin)
-            filtered_ip_data = ip_data[mask]
-            
-            # Create time series
-            daily_stats = filtered_ip_data.groupby(
-                [filtered_ip_data['timestamp'].dt.date, 'action']
-            ).size().unstack(fill_value=0)
-            
-            # Plot time series
-            fig_time = go.Figure()
-            
-            if 'PERMIT' in daily_stats.columns:
-                fig_time.add_trace(go.Scatter(
-                    x=daily_stats.index,
-                    y=daily_stats['PERMIT'],
-                    name='PERMIT',
-                    line=dict(color='green')
-                ))
-                
-            if 'DENY' in daily_stats.columns:
-                fig_time.add_trace(go.Scatter(
-                    x=daily_stats.index,
-                    y=daily_stats['DENY'],
-                    name='DENY',
-                    line=dict(color='red')
-                ))
-            
-            fig_time.update_layout(
-                title=f"📈 Activité journalière pour {selected_ip}",
-                xaxis_title="Date",
-                yaxis_title="Nombre d'événements",
-                hovermode='x unified',
-                showlegend=True,
-                height=400
-            )
-            
-            st.plotly_chart(fig_time, use_container_width=True)
-        
-        plot_port_destinations , plot_port_sources, plot_proto = st.columns(3)
-        with plot_port_destinations:
-            # Top 5 port destinations
-            top_ports_dest = ip_data['portdst'].value_counts().head(5)
-            fig_ports_dest = px.pie(
-                top_ports_dest,
-                names=top_ports_dest.index,
-                values=top_ports_dest.values,
-                title="Top 5 - Ports de destination"
-            )
-            st.plotly_chart(fig_ports_dest, use_container_width=True)
-    
-        with plot_port_sources:
-            # Top 5 port sources
-            top_ports_src = ip_data['portsrc'].value_counts().head(5)
-            fig_ports_src = px.pie(
-                top_ports_src,
-                names=top_ports_src.index,
-                values=top_ports_src.values,
-                title="Top 5 - Ports sources"
-            )
-            st.plotly_chart(fig_ports_src, use_container_width=True)
-        
-        with plot_proto:
-            # Protocol distribution
-            proto_dist = ip_data['proto'].value_counts()
-            fig_proto = px.pie(
-                proto_dist,
-                names=proto_dist.index,
-                values=proto_dist.values,
-                title="Distribution des protocoles"
-            )
-            st.plotly_chart(fig_proto, use_container_width=True)
+        show_ip_tab(filtered_df)
+    watch.lap("analyse_ip")
 
-        # 📂 Boutons de téléchargement
-        st.subheader("⬇️ Télécharger les logs filtrés")
+    with tab5:
+        show_compare_tab(filtered_df)
+    watch.lap("comparaison_ip")
 
-        # Télécharger les données en CSV
-        st.download_button(
-            label="📄 Télécharger CSV", 
-            data=filtered_ip_data.to_csv(index=False), 
-            file_name="logs_filtrés.csv", 
-            mime="text/csv"
-        )
+    with tab6:
+        show_subnets_tab(rollup)
+    watch.lap("sous_réseaux")
 
-        # Télécharger les données en JSON
-        st.download_button(
-            label="📂 Télécharger JSON", 
-            data=filtered_ip_data.to_json(orient="records"), 
-            file_name="logs_filtrés.json", 
-            mime="application/json"
-        )
+    with tab3:
+        show_rules_tab()
+    watch.lap("règles")
+
+    with tab4:
+        show_interfaces_tab()
+    watch.lap("interfaces")
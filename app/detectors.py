@@ -0,0 +1,109 @@
+import time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.ensemble import IsolationForest
+
+from model_selection import make_scaler
+
+DETECTORS = ["kmeans", "isolation_forest", "robust_z"]
+DETECTOR_LABELS = {
+    "kmeans": "KMeans (distance au centroïde)",
+    "isolation_forest": "Isolation Forest",
+    "robust_z": "Z-score robuste",
+}
+
+_shm = None  # Segment de mémoire partagée ouvert par le processus de travail
+_X = None  # Vue NumPy (sans copie) sur la matrice partagée
+
+
+def _attach(name, shape, dtype):
+    """Initialise un processus de travail : rattachement à la matrice en mémoire partagée."""
+    global _shm, _X
+    _shm = shared_memory.SharedMemory(name=name)
+    _X = np.ndarray(shape, dtype=dtype, buffer=_shm.buf)
+
+
+def kmeans_score(X, k=2, random_state=42):
+    """Distance de chaque point au centroïde de son cluster."""
+    kmeans = KMeans(n_clusters=k, random_state=random_state, n_init=10).fit(X)
+    return kmeans.transform(X).min(axis=1)
+
+
+def isolation_forest_score(X, random_state=42):
+    """Score d'anomalie de l'Isolation Forest (plus il est élevé, plus le point est isolé)."""
+    forest = IsolationForest(n_estimators=200, random_state=random_state, n_jobs=1).fit(X)
+    return -forest.score_samples(X)
+
+
+def robust_z_score(X):
+    """Plus grand z-score robuste (médiane / MAD) parmi les caractéristiques, calculé en une passe vectorisée."""
+    median = np.median(X, axis=0)
+    deviation = np.abs(X - median)
+    mad = 1.4826 * np.median(deviation, axis=0)
+    # Colonnes très concentrées (MAD nulle) : repli sur l'écart absolu moyen
+    mad = np.where(mad > 0, mad, 1.2533 * deviation.mean(axis=0))
+    return (deviation / np.where(mad > 0, mad, 1)).max(axis=1)
+
+
+def _run(detector, k):
+    start = time.perf_counter()
+    if detector == "kmeans":
+        scores = kmeans_score(_X, k)
+    elif detector == "isolation_forest":
+        scores = isolation_forest_score(_X)
+    elif detector == "robust_z":
+        scores = robust_z_score(_X)
+    else:
+        raise ValueError(f"Détecteur inconnu : {detector}")
+    return detector, scores, time.perf_counter() - start
+
+
+def score_detectors(df, features, scaler="standard", k=2, detectors=DETECTORS):
+    """
+    Applique plusieurs détecteurs d'anomalies en parallèle sur la même matrice normalisée.
+    La matrice est placée une seule fois en mémoire partagée : chaque processus la lit sans copie.
+
+    Args:
+        df (pd.DataFrame): Table par IP (avec `IP_Source`).
+        features (list): Colonnes à utiliser.
+        scaler (str): Normalisation (voir `model_selection.make_scaler`).
+        k (int): Nombre de clusters pour le détecteur KMeans.
+        detectors (list): Détecteurs à exécuter.
+
+    Returns:
+        tuple: (classement des suspects, durées par détecteur en secondes).
+    """
+    X = np.ascontiguousarray(make_scaler(scaler).fit_transform(df[features].fillna(0)), dtype=np.float64)
+
+    shm = shared_memory.SharedMemory(create=True, size=max(X.nbytes, 1))
+    try:
+        np.ndarray(X.shape, dtype=X.dtype, buffer=shm.buf)[:] = X
+        with ProcessPoolExecutor(
+            max_workers=len(detectors), initializer=_attach, initargs=(shm.name, X.shape, X.dtype)
+        ) as pool:
+            results = list(pool.map(_run, detectors, [k] * len(detectors)))
+    finally:
+        shm.close()
+        shm.unlink()
+
+    return rank_suspects(df, {name: scores for name, scores, _ in results}), {
+        name: seconds for name, _, seconds in results
+    }
+
+
+def rank_suspects(df, scores):
+    """
+    Combine les scores des détecteurs en un classement unique.
+    Chaque score est converti en rang centile (insensible aux échelles), puis les rangs sont moyennés.
+    """
+    ranking = pd.DataFrame({"IP_Source": df["IP_Source"].to_numpy()})
+    for name, values in scores.items():
+        ranking[f"Score_{name}"] = values
+        ranking[f"Rang_{name}"] = pd.Series(values).rank(pct=True).to_numpy()
+    rank_cols = [f"Rang_{name}" for name in scores]
+    ranking["Score_combiné"] = ranking[rank_cols].mean(axis=1)
+    return ranking.sort_values("Score_combiné", ascending=False, ignore_index=True)
@@ -0,0 +1,69 @@
+import numpy as np
+import pandas as pd
+
+
+def ip_to_uint32(ips):
+    """
+    Convertit une colonne d'adresses IPv4 (texte) en entiers uint32, de façon vectorisée.
+    La conversion n'est faite qu'une fois par adresse distincte (factorisation préalable).
+    Les valeurs invalides ou manquantes sont converties en 0.
+    """
+    codes, uniques = pd.factorize(pd.Series(ips, dtype="object"))
+    octets = pd.Series(uniques, dtype="object").str.split(".", n=3, expand=True).reindex(columns=range(4))
+    octets = octets.apply(pd.to_numeric, errors="coerce")
+    valid = (octets.notna() & octets.ge(0) & octets.le(255)).all(axis=1).to_numpy()
+    octets = octets.fillna(0).to_numpy(dtype=np.int64)
+    values = (octets[:, 0] << 24) | (octets[:, 1] << 16) | (octets[:, 2] << 8) | octets[:, 3]
+    values = np.append(np.where(valid, values, 0), 0).astype(np.uint32)
+    return values[codes]  # code -1 (valeur manquante) -> dernier élément, soit 0
+
+
+def uint32_to_ip(values):
+    """Convertit des entiers uint32 en adresses IPv4 texte."""
+    values = np.asarray(values, dtype=np.uint32)
+    octets = [(values >> shift) & 0xFF for shift in (24, 16, 8, 0)]
+    return pd.Series(octets[0].astype(str)).str.cat(
+        [pd.Series(o.astype(str)) for o in octets[1:]], sep="."
+    ).to_numpy(dtype=object)
+
+
+def to_event_columns(df):
+    """
+    Transforme des logs bruts (tels que renvoyés par Elasticsearch) en colonnes typées :
+    IP en uint32, ports en uint16, horodatage en secondes epoch int64, action en booléen.
+    Le résultat est trié par horodatage, ce qui permet les group-by triés en aval.
+
+    Args:
+        df (pd.DataFrame): Logs avec au moins `timestamp`, `ipsrc`, `ipdst`, `portdst` et `action`.
+
+    Returns:
+        pd.DataFrame: Colonnes `ts`, `ipsrc`, `ipdst`, `portsrc`, `portdst`, `proto`, `permit`, `idregle`.
+    """
+    if df.empty:
+        return pd.DataFrame({
+            "ts": np.array([], dtype=np.int64),
+            "ipsrc": np.array([], dtype=np.uint32),
+            "ipdst": np.array([], dtype=np.uint32),
+            "portsrc": np.array([], dtype=np.uint16),
+            "portdst": np.array([], dtype=np.uint16),
+            "proto": pd.Categorical([]),
+            "permit": np.array([], dtype=bool),
+            "idregle": np.array([], dtype=np.int32),
+        })
+
+    def column(name, default):
+        return df[name] if name in df.columns else pd.Series(default, index=df.index)
+
+    timestamps = pd.to_datetime(df["timestamp"], errors="coerce")
+    events = pd.DataFrame({
+        "ts": timestamps.to_numpy(dtype="datetime64[s]").astype(np.int64),
+        "ipsrc": ip_to_uint32(df["ipsrc"]),
+        "ipdst": ip_to_uint32(df["ipdst"]),
+        "portsrc": pd.to_numeric(column("portsrc", 0), errors="coerce").fillna(0).to_numpy(dtype=np.uint16),
+        "portdst": pd.to_numeric(df["portdst"], errors="coerce").fillna(0).to_numpy(dtype=np.uint16),
+        "proto": pd.Categorical(column("proto", None)),
+        "permit": (df["action"] == "PERMIT").to_numpy(),
+        "idregle": pd.to_numeric(column("idregle", -1), errors="coerce").fillna(-1).to_numpy(dtype=np.int32),
+    })
+    events = events[timestamps.notna().to_numpy()]
+    return events.sort_values("ts", kind="stable").reset_index(drop=True)
@@ -1,33 +1,32 @@
 import streamlit as st
-from elasticsearch import Elasticsearch
 import pandas as pd
 from datetime import datetime
 from st_aggrid import AgGrid, GridOptionsBuilder
-import ipaddress
 
-# ✅ Connexion à Elasticsearch
-# ES_HOST = "http://localhost:9200"
-ES_HOST = "http://elasticsearch:9200"
+import filters
+import jobs
+import metrics
+from bitmap_index import BitmapIndex
+from cidr_tags import tag_values_mask
+from shared_store import get_store
+from time_index import TimeIndex, sort_by_time
+from utils import get_es
 
 
 INDEX_NAME = "application-logs"
+# Colonnes utilisées par la page : seules celles-ci sont lues (les objets imbriqués ajoutés par Logstash,
+# `host`, `log`, `event`..., ne sont ni transférés ni publiés, voir shared_store)
+COLONNES_A_AFFICHER = ['ipsrc', 'ipdst', 'portsrc', 'portdst', 'proto', 'action', 'timestamp', 'idregle']
 
-# ✅ Fonction pour trier correctement les adresses IP
-def sort_ip_list(ip_list):
-    try:
-        return sorted(ip_list, key=lambda ip: ipaddress.ip_address(ip))
-    except ValueError:
-        return ip_list  # Si erreur, on ne trie pas
-
-# ✅ Fonction pour récupérer les logs avec cache
-@st.cache_data
+# ✅ Fonction pour récupérer les logs (mis en commun entre sessions par `load_indexed_data`)
+@metrics.timed("explore_data.load_data_scroll")
 def load_data_scroll(max_docs=10000, scroll_size=5000):
-    es = Elasticsearch(ES_HOST)
+    es = get_es()
     response = es.search(
         index=INDEX_NAME,
         scroll="2m",
         size=scroll_size,
-        body={"query": {"match_all": {}}}
+        body={"query": {"match_all": {}}, "_source": COLONNES_A_AFFICHER}
     )
 
     scroll_id = response["_scroll_id"]
@@ -41,12 +40,24 @@ def load_data_scroll(max_docs=10000, scroll_size=5000):
         if len(logs) >= max_docs:
             break
     es.clear_scroll(scroll_id=scroll_id)
-    df = pd.DataFrame(logs)
+    df = pd.DataFrame(logs).reindex(columns=COLONNES_A_AFFICHER)
     df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
     df['portsrc'] = pd.to_numeric(df['portsrc'], errors='coerce')
     df['portdst'] = pd.to_numeric(df['portdst'], errors='coerce')
     return df
 
+# ✅ Données triées par horodatage, index bitmap et index temporel, publiés une fois par serveur
+# (vues en lecture seule partagées par toutes les sessions, voir shared_store)
+@metrics.timed("explore_data.load_indexed_data")
+def load_indexed_data(max_docs):
+    df, (index, times) = get_store().get(
+        f"explore_data-{max_docs}",
+        loader=lambda: sort_by_time(load_data_scroll(max_docs=max_docs))[0],
+        derive=lambda df: (BitmapIndex(df), TimeIndex.from_series(df['timestamp'])),
+        slot="explore_data",
+    )
+    return df, index, times
+
 # ✅ Fonction pour réinitialiser tous les filtres
 def reset_filters():
     st.session_state["start_hour"] = 0
@@ -82,6 +93,7 @@ def initialize_session():
 
 def show_data():
     initialize_session()
+    watch = metrics.Stopwatch("explore_data")
 
     # Ajouter du style CSS pour l'ensemble de la page
     st.markdown("""
@@ -133,20 +145,31 @@ def show_data():
     st.session_state["max_logs"] = max_logs
 
     # 🏷️ Charger les données et les mettre en cache
-    df = load_data_scroll(max_docs=max_logs)
+    df, index, times = load_indexed_data(max_logs)
+
+    # Les filtres sont des bitsets de l'index (ET / OU bit à bit) ; la table n'est indexée qu'une fois à la fin
+    bits = index.all()
+    tags = st.session_state.get("ip_tags")
+    if tags:
+        bits &= index.select_where("ipsrc", tag_values_mask(index.uniques("ipsrc"), tags))
+    if not index.count(bits):
+        st.warning("Aucun log ne correspond aux étiquettes sélectionnées.")
+        return
+    watch.lap("chargement", rows=index.count(bits))
 
     st.markdown("<br>", unsafe_allow_html=True)
 
     # ✅ Sélection des colonnes à afficher
-    colonnes_a_afficher = ['ipsrc', 'ipdst', 'portsrc', 'portdst', 'proto', 'action', 'timestamp', 'idregle']
-    df = df[colonnes_a_afficher]
+    df = df[COLONNES_A_AFFICHER]
 
     # 📅 Filtres et affichage des logs
     left_col, right_col = st.columns([1, 2])
 
     with left_col:
         st.markdown("<h6 style='text-align: center;'>Sélectionnez la période</h6>", unsafe_allow_html=True)
-        min_date, max_date = df['timestamp'].min().date(), df['timestamp'].max().date()
+        # Lignes triées par horodatage : première et dernière ligne retenues
+        first, last = index.bounds(bits)
+        min_date, max_date = df['timestamp'].iloc[first].date(), df['timestamp'].iloc[last].date()
 
         col_start_date, col_start_hour, col_start_min = st.columns([2, 1, 1])
         with col_start_date:
@@ -182,7 +205,8 @@ def show_data():
     # ✅ Application du filtre sur la période
     start_datetime = datetime(start_date.year, start_date.month, start_date.day, start_hour, start_minute)
     end_datetime = datetime(end_date.year, end_date.month, end_date.day, end_hour, end_minute, 59)
-    df = df[(df['timestamp'] >= start_datetime) & (df['timestamp'] <= end_datetime)]
+    window = times.window(start_datetime, end_datetime)  # Recherche dichotomique, O(log n)
+    bits &= index.range(window.start, window.stop)
 
     st.markdown("<br>", unsafe_allow_html=True)
 
@@ -193,33 +217,33 @@ def show_data():
         # ✅ Application des filtres avancés
         col1, col2 = st.columns(2)
         with col1:
-            protocol_options = df['proto'].dropna().unique()
+            protocol_options = index.distinct('proto', bits)
             selected_protocols = st.multiselect(
                 "🌐 Protocole", protocol_options, default=st.session_state["selected_protocols"]
             )
             st.session_state["selected_protocols"] = selected_protocols
             if selected_protocols:
-                df = df[df['proto'].isin(selected_protocols)]
+                bits &= index.select('proto', selected_protocols)
 
         with col2:
-            action_options = df['action'].dropna().unique()
+            action_options = index.distinct('action', bits)
             selected_actions = st.multiselect(
                 "🔄 Action", action_options, default=st.session_state["selected_actions"]
             )
             st.session_state["selected_actions"] = selected_actions
             if selected_actions:
-                df = df[df['action'].isin(selected_actions)]
+                bits &= index.select('action', selected_actions)
 
         col3, col4 = st.columns(2)
         with col3:
-            portsrc_options = sorted(df['portsrc'].dropna().unique())
+            portsrc_options = index.distinct('portsrc', bits).tolist()
             selected_portsrc = st.multiselect(
                 "🎛️ Ports Source", ["Tout sélectionner"] + portsrc_options, default=st.session_state["selected_portsrc"]
             )
             st.session_state["selected_portsrc"] = selected_portsrc
             if "Tout sélectionner" in selected_portsrc or not selected_portsrc:
                 selected_portsrc = portsrc_options  # Si sélection vide ou "Tout sélectionner", prendre tout
-            df = df[df['portsrc'].isin(selected_portsrc)]
+            bits &= index.select('portsrc', selected_portsrc)
 
         # with col4:
         #     # ✅ Ajout du filtre par plage de ports (RFC 6056)
@@ -236,35 +260,35 @@ def show_data():
         #         df = df[(df['portdst'] >= 49152) & (df['portdst'] <= 65535)]
         with col4:
             # ✅ Filtre par ports individuels
-            portdst_options = sorted(df['portdst'].dropna().unique())
+            portdst_options = index.distinct('portdst', bits).tolist()
             selected_portdst = st.multiselect(
                 "🎛️ Ports Destination", ["Tout sélectionner"] + portdst_options, default=st.session_state["selected_portdst"]
             )
             st.session_state["selected_portdst"] = selected_portdst
             if "Tout sélectionner" in selected_portdst or not selected_portdst:
                 selected_portdst = portdst_options  # Si sélection vide ou "Tout sélectionner", prendre tout
-            df = df[df['portdst'].isin(selected_portdst)]
+            bits &= index.select('portdst', selected_portdst)
 
         col6, col7 = st.columns(2)
         with col6:
-            ipsrc_options = sort_ip_list(df['ipsrc'].dropna().unique())
+            ipsrc_options = index.distinct('ipsrc', bits).tolist()  # Déjà dans l'ordre des adresses
             selected_ipsrc = st.multiselect(
                 "🌍 IP Source", ["Tout sélectionner"] + ipsrc_options, default=st.session_state["selected_ipsrc"]
             )
             st.session_state["selected_ipsrc"] = selected_ipsrc
             if "Tout sélectionner" in selected_ipsrc or not selected_ipsrc:
                 selected_ipsrc = ipsrc_options  # Si sélection vide ou "Tout sélectionner", prendre tout
-            df = df[df['ipsrc'].isin(selected_ipsrc)]
+            bits &= index.select('ipsrc', selected_ipsrc)
 
         with col7:
-            ipdst_options = sort_ip_list(df['ipdst'].dropna().unique())
+            ipdst_options = index.distinct('ipdst', bits).tolist()
             selected_ipdst = st.multiselect(
                 "🌎 IP Destination", ["Tout sélectionner"] + ipdst_options, default=st.session_state["selected_ipdst"]
             )
             st.session_state["selected_ipdst"] = selected_ipdst
             if "Tout sélectionner" in selected_ipdst or not selected_ipdst:
                 selected_ipdst = ipdst_options  # Si sélection vide ou "Tout sélectionner", prendre tout
-            df = df[df['ipdst'].isin(selected_ipdst)]
+            bits &= index.select('ipdst', selected_ipdst)
 
 
 
@@ -272,6 +296,9 @@ def show_data():
     st.markdown("<br>", unsafe_allow_html=True)
 
 
+    df = df[index.mask(bits)]
+    watch.lap("filtres", rows=len(df))
+
     # 📋 Affichage du tableau avec AgGrid
     st.subheader("📋 Tableau des Logs")
 
@@ -281,6 +308,7 @@ def show_data():
     grid_options = gb.build()
 
     AgGrid(df, gridOptions=grid_options, enable_enterprise_modules=True)
+    watch.lap("aggrid", rows=len(df))
 
 
 
@@ -294,6 +322,19 @@ def show_data():
     st.download_button(
         label="📂 Télécharger JSON", data=df.to_json(orient="records"), file_name="logs_filtrés.json", mime="application/json"
     )
+    watch.lap("export", rows=len(df))
+
+    # 📦 Même sélection sur tout l'index (et non sur les logs chargés), exportée par une tâche de fond
+    clauses = [filters.TimeRange(start_datetime, end_datetime)]
+    for column in ["protocols", "actions", "portsrc", "portdst", "ipsrc", "ipdst"]:
+        values = st.session_state[f"selected_{column}"]
+        if values and "Tout sélectionner" not in values:
+            clauses.append(filters.OneOf({"protocols": "proto", "actions": "action"}.get(column, column), values))
+    params = {"query": filters.And(*clauses).to_query(), "start": start_datetime, "end": end_datetime}
+    if st.session_state.get("ip_tags"):
+        params["tags"] = sorted(st.session_state["ip_tags"])
+    jobs.submit_button("📦 Exporter la sélection sur tout l'index (tâche de fond)", "export_logs", params,
+                       key="explore_export_job")
 
 if __name__ == "__main__":
     show_data()
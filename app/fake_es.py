@@ -0,0 +1,443 @@
+"""
+Substitut en mémoire d'Elasticsearch pour les benchmarks et les tests de charge.
+
+Seul le sous-ensemble du DSL utilisé par l'application est pris en charge :
+- requêtes : match_all, term, terms, prefix, range, exists, bool (must / filter / should / must_not) ;
+- pagination : size, sort (dont `_doc` et `_shard_doc`), search_after sur plusieurs clés, scroll,
+  point in time (`open_point_in_time` / `close_point_in_time`, sans instantané) ;
+- agrégations : composite (sources terms et date_histogram), terms, filter, filters, cardinality, value_count, min, max, sum, avg, date_histogram.
+Les champs `xxx.keyword` sont lus dans la colonne `xxx` ; comme dans Elasticsearch, un `range` sur un
+champ keyword compare des chaînes de caractères.
+
+Avec `daily_indices=True`, les documents sont répartis en index journaliers (`<index>-AAAA.MM.JJ`)
+derrière l'alias `index_name` : `search(index=...)` accepte l'alias, des noms séparés par des virgules et
+des motifs `*`, `indices.get_alias` liste les index, et `_shards.total` compte les index parcourus.
+"""
+import bisect
+import fnmatch
+import itertools
+import json
+import threading
+import time
+from collections import Counter
+
+import numpy as np
+import pandas as pd
+
+INTERVALS = {"minute": "1min", "hour": "1h", "day": "1D", "week": "7D", "1m": "1min", "1h": "1h", "1d": "1D"}
+
+
+def _naive_utc(value):
+    """Horodatage comparable à la colonne `@timestamp` (UTC, sans fuseau)."""
+    timestamp = pd.Timestamp(value)
+    return timestamp.tz_convert("UTC").tz_localize(None) if timestamp.tzinfo else timestamp
+
+
+class FakeElasticsearch:
+    """Client minimal compatible avec les appels `search`, `scroll` et `clear_scroll` de l'application."""
+
+    def __init__(self, documents, index_name="application-logs", daily_indices=False):
+        self.docs = documents.reset_index(drop=True)
+        self.index_name = index_name
+        self.calls = Counter()  # Nombre d'appels par méthode
+        self.indices = _FakeIndices(self)
+        self._partitions = None
+        if daily_indices:
+            days = pd.to_datetime(self.docs["@timestamp"]).dt.strftime(f"{index_name}-%Y.%m.%d")
+            self._partitions = days.to_numpy(dtype=object)
+        self._index_masks = {}
+        self._scrolls = {}
+        self._scroll_ids = itertools.count()
+        self._pits = {}  # Identifiant -> index désigné à l'ouverture
+        self._pit_ids = itertools.count()
+        self._group_cache = {}
+        self._lock = threading.Lock()
+
+    def partition_names(self):
+        """Index journaliers (vide si les documents ne sont pas partitionnés)."""
+        return sorted(set(self._partitions)) if self._partitions is not None else []
+
+    def _index_mask(self, index):
+        """Masque des documents des index désignés (None : tous) et nombre d'index parcourus."""
+        if self._partitions is None:
+            return None, 1
+        names = self.partition_names()
+        if index in (None, "", "_all", self.index_name):
+            return None, len(names)
+        with self._lock:
+            cached = self._index_masks.get(index)
+        if cached is None:
+            selected = set()
+            for pattern in str(index).split(","):
+                matches = [name for name in names if fnmatch.fnmatchcase(name, pattern)]
+                if not matches and "*" not in pattern and pattern != self.index_name:
+                    raise LookupError(f"index_not_found_exception: no such index [{pattern}]")
+                selected.update(names if pattern == self.index_name else matches)
+            cached = (np.isin(self._partitions, list(selected)), len(selected))
+            with self._lock:
+                self._index_masks[index] = cached
+        return cached
+
+    # ------------------------------------------------------------------ API publique
+
+    def search(self, index=None, body=None, size=None, scroll=None, sort=None, query=None,
+               aggs=None, source=None, search_after=None, **kwargs):
+        start = time.perf_counter()
+        with self._lock:
+            self.calls["search"] += 1
+        body = dict(body or {})
+        for key, value in (("size", size), ("sort", sort), ("query", query), ("aggs", aggs),
+                           ("_source", source), ("search_after", search_after)):
+            if value is not None:
+                body[key] = value
+
+        pit = body.get("pit")
+        if pit is not None:
+            # Comme Elasticsearch : l'index est celui du point in time
+            index = self._pits[pit["id"]]
+        in_index, n_indices = self._index_mask(index)
+        docs = self.docs if in_index is None else self.docs[in_index]
+        query_start = time.perf_counter_ns()
+        frame = docs[self._mask(body.get("query", {"match_all": {}}), docs)]
+        query_time = time.perf_counter_ns() - query_start
+        frame = self._sort(frame, body.get("sort"))
+        if body.get("search_after") is not None:
+            frame = self._after(frame, body.get("sort"), body["search_after"])
+
+        size = body.get("size", 10)
+        response = {
+            "took": 0,
+            "timed_out": False,
+            "_shards": {"total": n_indices, "successful": n_indices, "skipped": 0, "failed": 0},
+            "hits": {
+                "total": {"value": len(frame), "relation": "eq"},
+                "hits": self._hits(frame.iloc[:size], body),
+            },
+        }
+        if pit is not None:
+            response["pit_id"] = pit["id"]
+        if "aggs" in body or "aggregations" in body:
+            aggs_body = body.get("aggs") or body.get("aggregations")
+            cache_key = json.dumps([index if in_index is not None else None, body.get("query")], sort_keys=True)
+            response["aggregations"] = self._aggregate(aggs_body, frame, cache_key)
+        if body.get("profile") or kwargs.get("profile"):
+            response["profile"] = self._profile(body, frame, query_time)
+        if scroll:
+            scroll_id = str(next(self._scroll_ids))
+            self._scrolls[scroll_id] = (frame, size, size, body)
+            response["_scroll_id"] = scroll_id
+        response["took"] = int((time.perf_counter() - start) * 1000)
+        return response
+
+    def _profile(self, body, frame, query_time):
+        """Profil simplifié au format d'Elasticsearch : un shard, temps de la requête et de chaque agrégation."""
+        aggregations = []
+        for name, spec in (body.get("aggs") or body.get("aggregations") or {}).items():
+            start = time.perf_counter_ns()
+            self._aggregate_one(spec, frame, f"profile/{name}")
+            kind = next((k for k in spec if k not in ("aggs", "aggregations")), "unknown")
+            aggregations.append({"type": kind, "description": name, "time_in_nanos": time.perf_counter_ns() - start})
+        query = body.get("query", {"match_all": {}})
+        return {"shards": [{
+            "id": "[fake][application-logs][0]",
+            "searches": [{
+                "query": [{"type": next(iter(query)), "description": json.dumps(query), "time_in_nanos": query_time}],
+                "rewrite_time": 0,
+                "collector": [{"name": "SimpleTopScoreDocCollector", "reason": "search_top_hits", "time_in_nanos": 0}],
+            }],
+            "aggregations": aggregations,
+        }]}
+
+    def scroll(self, scroll_id=None, scroll=None, body=None, **kwargs):
+        with self._lock:
+            self.calls["scroll"] += 1
+        scroll_id = scroll_id or (body or {}).get("scroll_id")
+        frame, offset, size, body = self._scrolls[scroll_id]
+        self._scrolls[scroll_id] = (frame, offset + size, size, body)
+        return {
+            "_scroll_id": scroll_id,
+            "took": 0,
+            "hits": {
+                "total": {"value": len(frame), "relation": "eq"},
+                "hits": self._hits(frame.iloc[offset:offset + size], body),
+            },
+        }
+
+    def open_point_in_time(self, index=None, keep_alive=None, **kwargs):
+        with self._lock:
+            self.calls["open_point_in_time"] += 1
+            pit_id = f"pit-{next(self._pit_ids)}"
+            self._pits[pit_id] = index
+        return {"id": pit_id}
+
+    def close_point_in_time(self, id=None, body=None, **kwargs):
+        with self._lock:
+            self.calls["close_point_in_time"] += 1
+            freed = self._pits.pop(id or (body or {}).get("id"), False) is not False
+        return {"succeeded": True, "num_freed": int(freed)}
+
+    def clear_scroll(self, scroll_id=None, **kwargs):
+        with self._lock:
+            self.calls["clear_scroll"] += 1
+        self._scrolls.pop(scroll_id, None)
+        return {"succeeded": True}
+
+    # ------------------------------------------------------------------ Requêtes
+
+    def _column(self, frame, field):
+        return frame[field[:-len(".keyword")] if field.endswith(".keyword") else field]
+
+    def _mask(self, query, frame):
+        if not query or "match_all" in query:
+            return np.ones(len(frame), dtype=bool)
+        if "term" in query:
+            field, value = next(iter(query["term"].items()))
+            value = value["value"] if isinstance(value, dict) else value
+            return (self._column(frame, field).astype(str) == str(value)).to_numpy()
+        if "terms" in query:
+            field, values = next(iter(query["terms"].items()))
+            return self._column(frame, field).astype(str).isin([str(v) for v in values]).to_numpy()
+        if "prefix" in query:
+            field, value = next(iter(query["prefix"].items()))
+            value = value["value"] if isinstance(value, dict) else value
+            return self._column(frame, field).astype(str).str.startswith(str(value)).to_numpy()
+        if "exists" in query:
+            return self._column(frame, query["exists"]["field"]).notna().to_numpy()
+        if "range" in query:
+            field, bounds = next(iter(query["range"].items()))
+            return self._range_mask(self._column(frame, field), field, bounds)
+        if "bool" in query:
+            clauses = query["bool"]
+            mask = np.ones(len(frame), dtype=bool)
+            for clause in self._as_list(clauses.get("must")) + self._as_list(clauses.get("filter")):
+                mask &= self._mask(clause, frame)
+            for clause in self._as_list(clauses.get("must_not")):
+                mask &= ~self._mask(clause, frame)
+            should = self._as_list(clauses.get("should"))
+            if should:
+                any_should = np.zeros(len(frame), dtype=bool)
+                for clause in should:
+                    any_should |= self._mask(clause, frame)
+                mask &= any_should
+            return mask
+        raise NotImplementedError(f"Requête non prise en charge : {list(query)}")
+
+    @staticmethod
+    def _as_list(value):
+        if value is None:
+            return []
+        return value if isinstance(value, list) else [value]
+
+    def _range_mask(self, column, field, bounds):
+        if pd.api.types.is_datetime64_any_dtype(column):
+            convert = _naive_utc
+        elif field.endswith(".keyword"):
+            column, convert = column.astype(str), str
+        else:
+            column, convert = pd.to_numeric(column, errors="coerce"), float
+        mask = np.ones(len(column), dtype=bool)
+        for op, value in bounds.items():
+            if op not in ("gt", "gte", "lt", "lte"):
+                continue
+            value = convert(value)
+            if op == "gt":
+                mask &= (column > value).to_numpy()
+            elif op == "gte":
+                mask &= (column >= value).to_numpy()
+            elif op == "lt":
+                mask &= (column < value).to_numpy()
+            else:
+                mask &= (column <= value).to_numpy()
+        return mask
+
+    def _sort_fields(self, sort):
+        fields = []
+        for item in self._as_list(sort):
+            if isinstance(item, str):
+                fields.append((item, True))
+            else:
+                field, order = next(iter(item.items()))
+                order = order.get("order", "asc") if isinstance(order, dict) else order
+                fields.append((field, order == "asc"))
+        # `_doc` : ordre d'indexation, déjà celui des documents
+        return [(field, ascending) for field, ascending in fields if field != "_doc"]
+
+    def _sort(self, frame, sort):
+        # `_shard_doc` : ordre des documents, conservé par le tri stable
+        fields = [(field, ascending) for field, ascending in self._sort_fields(sort) if field != "_shard_doc"]
+        if not fields:
+            return frame
+        columns = [self._column(frame, f).name for f, _ in fields]
+        return frame.sort_values(columns, ascending=[asc for _, asc in fields], kind="stable")
+
+    def _sort_column(self, frame, field):
+        """Valeurs de tri d'un champ (dates en millisecondes epoch, `_shard_doc` : position du document)."""
+        if field == "_shard_doc":
+            return pd.Series(frame.index, index=frame.index)
+        column = self._column(frame, field)
+        if pd.api.types.is_datetime64_any_dtype(column):
+            column = column.astype("datetime64[ms]").astype(np.int64)
+        return column
+
+    def _sort_values(self, frame, sort):
+        values = [self._sort_column(frame, field).tolist() for field, _ in self._sort_fields(sort)]
+        return [list(v) for v in zip(*values)]
+
+    def _after(self, frame, sort, after):
+        # Ordre lexicographique sur toutes les clés de tri, comme Elasticsearch
+        keep = np.zeros(len(frame), dtype=bool)
+        tied = np.ones(len(frame), dtype=bool)
+        for (field, ascending), value in zip(self._sort_fields(sort), after):
+            column = self._sort_column(frame, field).to_numpy()
+            keep |= tied & ((column > value) if ascending else (column < value))
+            tied &= column == value
+        return frame[keep]
+
+    def _hits(self, frame, body):
+        fields = body.get("_source")
+        page = frame if not isinstance(fields, list) else frame[[c for c in fields if c in frame.columns]]
+        page = page.copy()
+        for col in page.columns:
+            if pd.api.types.is_datetime64_any_dtype(page[col]):
+                page[col] = page[col].dt.strftime("%Y-%m-%dT%H:%M:%S.000Z")
+        records = page.to_dict("records")
+        sort_values = self._sort_values(frame, body.get("sort")) if self._sort_fields(body.get("sort")) else [None] * len(frame)
+        return [
+            {"_index": self.index_name, "_id": str(i), "_source": record, "sort": sort_value}
+            for i, record, sort_value in zip(frame.index, records, sort_values)
+        ]
+
+    # ------------------------------------------------------------------ Agrégations
+
+    def _aggregate(self, aggs, frame, cache_key=""):
+        return {name: self._aggregate_one(spec, frame, f"{cache_key}/{name}") for name, spec in aggs.items()}
+
+    def _aggregate_one(self, spec, frame, cache_key):
+        sub = spec.get("aggs") or spec.get("aggregations") or {}
+        if "composite" in spec:
+            return self._composite(spec["composite"], sub, frame, cache_key)
+        if "terms" in spec:
+            params = spec["terms"]
+            counts = self._column(frame, params["field"]).value_counts().head(params.get("size", 10))
+            buckets = []
+            for key, count in counts.items():
+                bucket = {"key": key, "doc_count": int(count)}
+                if sub:
+                    group = frame[(self._column(frame, params["field"]) == key).to_numpy()]
+                    bucket.update(self._aggregate(sub, group, f"{cache_key}/{key}"))
+                buckets.append(bucket)
+            return {"buckets": buckets, "sum_other_doc_count": int(len(frame) - counts.sum())}
+        if "filter" in spec:
+            group = frame[self._mask(spec["filter"], frame)]
+            return {"doc_count": len(group), **self._aggregate(sub, group, cache_key)}
+        if "filters" in spec:
+            buckets = {}
+            for name, query in spec["filters"]["filters"].items():
+                group = frame[self._mask(query, frame)]
+                buckets[name] = {"doc_count": len(group), **self._aggregate(sub, group, f"{cache_key}/{name}")}
+            return {"buckets": buckets}
+        if "date_histogram" in spec:
+            params = spec["date_histogram"]
+            interval = params.get("fixed_interval") or params.get("calendar_interval") or params.get("interval")
+            keys = self._column(frame, params["field"]).dt.floor(INTERVALS.get(interval, interval))
+            buckets = []
+            for key, group in frame.groupby(keys.to_numpy(), sort=True):
+                bucket = {
+                    "key": int(pd.Timestamp(key).value // 1_000_000),
+                    "key_as_string": pd.Timestamp(key).isoformat(),
+                    "doc_count": len(group),
+                }
+                bucket.update(self._aggregate(sub, group, f"{cache_key}/{key}"))
+                buckets.append(bucket)
+            return {"buckets": buckets}
+        for metric in ("cardinality", "value_count", "min", "max", "sum", "avg"):
+            if metric in spec:
+                return {"value": self._metric(metric, self._column(frame, spec[metric]["field"]))}
+        raise NotImplementedError(f"Agrégation non prise en charge : {list(spec)}")
+
+    @staticmethod
+    def _metric(metric, column):
+        if metric == "cardinality":
+            return int(column.nunique())
+        if metric == "value_count":
+            return int(column.notna().sum())
+        if pd.api.types.is_datetime64_any_dtype(column) and metric in ("min", "max"):
+            # Comme Elasticsearch : millisecondes epoch
+            result = getattr(column, metric)()
+            return None if pd.isna(result) else float(pd.Timestamp(result).value // 1_000_000)
+        values = pd.to_numeric(column, errors="coerce")
+        result = getattr(values, {"avg": "mean"}.get(metric, metric))()
+        return None if pd.isna(result) else float(result)
+
+    def _composite(self, params, sub, frame, cache_key):
+        """
+        Agrégation composite paginée. Les groupes et leurs sous-agrégations simples (filter, cardinality...)
+        sont calculés une seule fois de façon vectorisée, puis servis page par page.
+        """
+        names = [next(iter(source)) for source in params["sources"]]
+        sources = [next(iter(source.values())) for source in params["sources"]]
+        key = (cache_key, json.dumps(sources, sort_keys=True), json.dumps(sub, sort_keys=True), len(frame))
+        with self._lock:
+            cached = self._group_cache.get(key)
+        if cached is None:
+            table = self._composite_table(names, sources, sub, frame)
+            cached = (table, list(zip(*(table[name] for name in names))))
+            with self._lock:
+                self._group_cache[key] = cached
+        table, keys = cached
+
+        start = 0
+        if params.get("after"):
+            start = bisect.bisect_right(keys, tuple(params["after"][name] for name in names))
+        page = table.iloc[start:start + params.get("size", 10)]
+
+        buckets = []
+        for row in page.to_dict("records"):
+            bucket = {"key": {name: row[name] for name in names}, "doc_count": int(row["doc_count"])}
+            for name, spec in sub.items():
+                if "filter" in spec:
+                    bucket[name] = {"doc_count": int(row[name])}
+                else:
+                    bucket[name] = {"value": row[name]}
+            buckets.append(bucket)
+        result = {"buckets": buckets}
+        if buckets:
+            result["after_key"] = buckets[-1]["key"]
+        return result
+
+    def _source_column(self, frame, source):
+        """Clés d'une source composite : `terms`, ou `date_histogram` (millisecondes epoch)."""
+        if "date_histogram" in source:
+            params = source["date_histogram"]
+            interval = params.get("fixed_interval") or params.get("calendar_interval") or params.get("interval")
+            floored = self._column(frame, params["field"]).dt.floor(INTERVALS.get(interval, interval))
+            return floored.to_numpy(dtype="datetime64[ms]").astype(np.int64)
+        return self._column(frame, source["terms"]["field"]).to_numpy()
+
+    def _composite_table(self, names, sources, sub, frame):
+        keys = pd.DataFrame({name: self._source_column(frame, source) for name, source in zip(names, sources)})
+        grouped_index = keys.groupby(names, sort=True)
+        table = grouped_index.size().rename("doc_count").to_frame()
+        for name, spec in sub.items():
+            if "filter" in spec:
+                mask = pd.Series(self._mask(spec["filter"], frame).astype(np.int64))
+                table[name] = mask.groupby([keys[n] for n in names], sort=True).sum()
+            elif "cardinality" in spec:
+                values = self._column(frame, spec["cardinality"]["field"]).reset_index(drop=True)
+                table[name] = values.groupby([keys[n] for n in names], sort=True).nunique()
+            else:
+                raise NotImplementedError(f"Sous-agrégation composite non prise en charge : {list(spec)}")
+        return table.reset_index()
+
+
+class _FakeIndices:
+    """Sous-ensemble de l'API `indices` : liste des index derrière l'alias."""
+
+    def __init__(self, es):
+        self._es = es
+
+    def get_alias(self, name=None, index=None, **kwargs):
+        names = self._es.partition_names()
+        if name != self._es.index_name or not names:
+            raise LookupError(f"alias [{name}] missing")
+        return {partition: {"aliases": {name: {}}} for partition in names}
@@ -0,0 +1,233 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from events import uint32_to_ip
+from utils import EventConsumer
+
+WINDOW_SECONDS = 60  # Taille des fenêtres temporelles (1 minute)
+
+# Caractéristiques temporelles ajoutées aux features du clustering
+TEMPORAL_FEATURES = [
+    "Events_Per_Min_Mean", "Events_Per_Min_Max", "Burstiness",
+    "Dst_Per_Window_Mean", "Dst_Per_Window_Max", "Active_Windows",
+    "Active_Hours", "Hour_Spread",
+]
+
+
+def window_stats(ipsrc, window, ipdst):
+    """
+    Calcule, pour chaque couple (IP source, fenêtre), le nombre d'événements et
+    le nombre d'IP destination distinctes, par tri lexicographique (sans boucle Python).
+
+    Args:
+        ipsrc (np.ndarray): IP sources en uint32.
+        window (np.ndarray): Numéro de fenêtre (int64) de chaque événement.
+        ipdst (np.ndarray): IP destinations en uint32.
+
+    Returns:
+        pd.DataFrame: Colonnes `ipsrc`, `window`, `n_events`, `n_dst`, triées par (ipsrc, window).
+    """
+    if len(ipsrc) == 0:
+        return pd.DataFrame({
+            "ipsrc": np.array([], dtype=np.uint32),
+            "window": np.array([], dtype=np.int64),
+            "n_events": np.array([], dtype=np.int64),
+            "n_dst": np.array([], dtype=np.int64),
+        })
+
+    order = np.lexsort((ipdst, window, ipsrc))
+    ip_s, w_s, d_s = ipsrc[order], window[order], ipdst[order]
+
+    new_group = np.empty(len(order), dtype=bool)
+    new_group[0] = True
+    new_group[1:] = (ip_s[1:] != ip_s[:-1]) | (w_s[1:] != w_s[:-1])
+    new_triple = new_group.copy()
+    new_triple[1:] |= d_s[1:] != d_s[:-1]
+
+    group_id = np.cumsum(new_group) - 1
+    starts = np.flatnonzero(new_group)
+    return pd.DataFrame({
+        "ipsrc": ip_s[starts],
+        "window": w_s[starts],
+        "n_events": np.bincount(group_id),
+        "n_dst": np.bincount(group_id, weights=new_triple).astype(np.int64),
+    })
+
+
+def window_pairs(ipsrc, window, ipdst):
+    """
+    Forme fusionnable de `window_stats` : comptes d'événements par (IP source, fenêtre) et couples
+    distincts (IP source, fenêtre, IP destination). Deux lots d'une même fenêtre se fusionnent
+    exactement (somme des comptes, union des couples), là où des nombres de destinations distinctes
+    ne s'additionnent pas.
+
+    Returns:
+        tuple: (DataFrame `ipsrc`, `window`, `n_events` ; DataFrame `ipsrc`, `window`, `ipdst`), triés.
+    """
+    order = np.lexsort((ipdst, window, ipsrc))
+    ip_s, w_s, d_s = ipsrc[order], window[order], ipdst[order]
+    new_group = np.r_[True, (ip_s[1:] != ip_s[:-1]) | (w_s[1:] != w_s[:-1])] if len(order) else np.zeros(0, dtype=bool)
+    new_triple = new_group.copy()
+    new_triple[1:] |= d_s[1:] != d_s[:-1]
+    starts = np.flatnonzero(new_group)
+    counts = pd.DataFrame({
+        "ipsrc": ip_s[starts],
+        "window": w_s[starts],
+        "n_events": np.diff(np.r_[starts, len(order)]).astype(np.int64),
+    })
+    pairs = pd.DataFrame({"ipsrc": ip_s[new_triple], "window": w_s[new_triple], "ipdst": d_s[new_triple]})
+    return counts, pairs
+
+
+class FeatureAccumulator(EventConsumer):
+    """
+    Moteur de caractéristiques comportementales par IP, alimenté de façon incrémentale.
+
+    Les événements arrivent par lots triés dans le temps. Les fenêtres terminées sont
+    agrégées une fois pour toutes ; seuls les événements de la dernière fenêtre (encore
+    ouverte) sont conservés pour être fusionnés avec le lot suivant. Une fenêtre déjà close
+    peut recevoir des événements en retard : ses destinations sont gardées sous forme de
+    couples distincts (voir `window_pairs`) pour que la fusion ne les compte pas deux fois.
+    """
+
+    FIELDS = ["timestamp", "ipsrc", "ipdst", "portdst", "action"]
+
+    def __init__(self, window_seconds=WINDOW_SECONDS):
+        self.window_seconds = window_seconds
+        self.last_ts = None  # Dernier horodatage (epoch s) intégré
+        self._closed = []  # (comptes, couples) des fenêtres terminées, voir `window_pairs`
+        self._pending = pd.DataFrame(columns=["ipsrc", "window", "ipdst"])  # Événements de la fenêtre ouverte
+        self._hours = pd.DataFrame(columns=range(24), dtype=np.int64)  # Histogramme horaire par IP
+        self._lock = threading.Lock()
+
+    def update(self, events):
+        """
+        Intègre un lot d'événements typés (voir `events.to_event_columns`).
+        """
+        if events.empty:
+            return
+
+        with self._lock:
+            batch = pd.DataFrame({
+                "ipsrc": events["ipsrc"].to_numpy(),
+                "window": events["ts"].to_numpy() // self.window_seconds,
+                "ipdst": events["ipdst"].to_numpy(),
+            })
+            batch = pd.concat([self._pending, batch], ignore_index=True) if len(self._pending) else batch
+
+            last_window = batch["window"].max()
+            is_open = (batch["window"] == last_window).to_numpy()
+            closed = batch[~is_open]
+            self._pending = batch[is_open]
+            if len(closed):
+                self._closed.append(window_pairs(
+                    closed["ipsrc"].to_numpy(np.uint32),
+                    closed["window"].to_numpy(np.int64),
+                    closed["ipdst"].to_numpy(np.uint32),
+                ))
+            if len(self._closed) > 32:
+                self._closed = [self._compact(self._closed)]
+
+            # Histogramme des heures d'activité (UTC)
+            hours = (events["ts"].to_numpy() // 3600) % 24
+            codes, uniques = pd.factorize(events["ipsrc"].to_numpy())
+            batch_hours = pd.DataFrame(
+                np.bincount(codes * 24 + hours, minlength=len(uniques) * 24).reshape(-1, 24),
+                index=uniques,
+            )
+            self._hours = self._hours.add(batch_hours, fill_value=0)
+
+            ts_max = int(events["ts"].max())
+            self.last_ts = ts_max if self.last_ts is None else max(self.last_ts, ts_max)
+
+    @staticmethod
+    def _compact(frames):
+        """
+        Fusionne des (comptes, couples) : somme des comptes et union des couples par (IP source,
+        fenêtre) ; les doublons de fenêtre proviennent d'événements en retard.
+        """
+        if len(frames) == 1:
+            return frames[0]
+        counts = pd.concat([c for c, _ in frames], ignore_index=True)
+        ipsrc, window = counts["ipsrc"].to_numpy(), counts["window"].to_numpy()
+        order = np.lexsort((window, ipsrc))
+        ipsrc, window = ipsrc[order], window[order]
+        starts = np.flatnonzero(np.r_[True, (ipsrc[1:] != ipsrc[:-1]) | (window[1:] != window[:-1])])
+        counts = pd.DataFrame({
+            "ipsrc": ipsrc[starts],
+            "window": window[starts],
+            "n_events": np.add.reduceat(counts["n_events"].to_numpy()[order], starts),
+        })
+        pairs = pd.concat([p for _, p in frames], ignore_index=True)
+        order = np.lexsort((pairs["ipdst"].to_numpy(), pairs["window"].to_numpy(), pairs["ipsrc"].to_numpy()))
+        pairs = pairs.iloc[order]
+        keys = pairs.to_numpy()
+        distinct = np.r_[True, (keys[1:] != keys[:-1]).any(axis=1)]
+        return counts, pairs[distinct].reset_index(drop=True)
+
+    def window_table(self):
+        """Retourne les statistiques de toutes les fenêtres, y compris la fenêtre ouverte."""
+        with self._lock:
+            frames = list(self._closed)
+            if len(self._pending):
+                frames.append(window_pairs(
+                    self._pending["ipsrc"].to_numpy(np.uint32),
+                    self._pending["window"].to_numpy(np.int64),
+                    self._pending["ipdst"].to_numpy(np.uint32),
+                ))
+            hours = self._hours.copy()
+        if not frames:
+            return window_stats(*(np.array([], dtype=t) for t in (np.uint32, np.int64, np.uint32))), hours
+        counts, pairs = self._compact(frames)
+        # Couples triés par (IP source, fenêtre) comme les comptes : un groupe de couples par ligne
+        ipsrc, window = pairs["ipsrc"].to_numpy(), pairs["window"].to_numpy()
+        starts = np.flatnonzero(np.r_[True, (ipsrc[1:] != ipsrc[:-1]) | (window[1:] != window[:-1])])
+        counts["n_dst"] = np.diff(np.r_[starts, len(ipsrc)]).astype(np.int64)
+        return counts, hours
+
+    def features(self):
+        """
+        Calcule les caractéristiques temporelles par IP source.
+
+        Returns:
+            pd.DataFrame: Une ligne par IP (index `IP_Source`), colonnes `TEMPORAL_FEATURES`.
+        """
+        windows, hours = self.window_table()
+        if windows.empty:
+            return pd.DataFrame(columns=TEMPORAL_FEATURES, index=pd.Index([], name="IP_Source"))
+
+        # La table des fenêtres est triée par IP : agrégations par segments avec reduceat
+        ipsrc = windows["ipsrc"].to_numpy()
+        n_events = windows["n_events"].to_numpy(dtype=float)
+        n_dst = windows["n_dst"].to_numpy(dtype=float)
+        starts = np.flatnonzero(np.r_[True, ipsrc[1:] != ipsrc[:-1]])
+        active = np.diff(np.r_[starts, len(ipsrc)])
+
+        scale = 60 / self.window_seconds
+        mean = np.add.reduceat(n_events, starts) / active
+        variance = np.add.reduceat(n_events ** 2, starts) / active - mean ** 2
+        std = np.sqrt(np.maximum(variance, 0))
+
+        features = pd.DataFrame({
+            "Events_Per_Min_Mean": mean * scale,
+            "Events_Per_Min_Max": np.maximum.reduceat(n_events, starts) * scale,
+            "Dst_Per_Window_Mean": np.add.reduceat(n_dst, starts) / active,
+            "Dst_Per_Window_Max": np.maximum.reduceat(n_dst, starts),
+            "Active_Windows": active,
+            # Burstiness (Goh & Barabási) : (σ - μ) / (σ + μ) sur les comptes par fenêtre active
+            "Burstiness": (std - mean) / (std + mean),
+        }, index=ipsrc[starts])
+
+        # Étalement horaire : écart-type circulaire des heures d'activité
+        hours = hours.reindex(features.index, fill_value=0)
+        counts = hours.to_numpy(dtype=float)
+        angles = 2 * np.pi * np.arange(24) / 24
+        total = counts.sum(axis=1)
+        resultant = np.hypot(counts @ np.cos(angles), counts @ np.sin(angles)) / np.maximum(total, 1)
+        features["Active_Hours"] = (counts > 0).sum(axis=1)
+        features["Hour_Spread"] = np.sqrt(-2 * np.log(np.clip(resultant, 1e-12, 1)))
+
+        features.index = pd.Index(uint32_to_ip(features.index.to_numpy()), name="IP_Source")
+        return features[TEMPORAL_FEATURES]
@@ -0,0 +1,245 @@
+"""
+Expressions de filtre communes aux pages : un seul arbre, deux cibles.
+
+Un filtre se construit à partir de nœuds (`TimeRange`, `OneOf`, `Between`, `Cidr`) combinés par
+`And` / `Or` / `Not` (ou `&`, `|`, `~`). Il se compile :
+- en un masque NumPy unique (`mask(df)`) : chaque feuille écrit dans le même tableau booléen
+  (opérations en place), la table n'est indexée qu'une fois à la fin (`apply`) ; un masque existant
+  peut être restreint clause par clause (`mask(df, out=masque)`) ;
+- en requête bool Elasticsearch (`to_query()`) pour une exécution côté serveur.
+
+Les noms de colonnes sont ceux des logs (`timestamp`, `proto`, `portdst`...) ; le champ Elasticsearch
+correspondant est `@timestamp` pour l'horodatage et `<colonne>.keyword` pour les autres.
+"""
+import numpy as np
+import pandas as pd
+
+from cidr_tags import prefixes_to_intervals
+from events import ip_to_uint32
+
+ES_FIELDS = {"timestamp": "@timestamp", "@timestamp": "@timestamp"}
+MAX_EXPANDED_TERMS = 65536  # Limite par défaut de `terms` dans Elasticsearch
+
+
+def es_field(column):
+    """Champ Elasticsearch d'une colonne de logs."""
+    return ES_FIELDS.get(column, f"{column}.keyword")
+
+
+class Filter:
+    """Nœud de l'arbre de filtre."""
+
+    def mask(self, df, out=None):
+        """
+        Masque booléen (np.ndarray) des lignes retenues.
+
+        Args:
+            out (np.ndarray, optional): Masque existant, restreint en place (conjonction).
+        """
+        if out is None:
+            out = np.ones(len(df), dtype=bool)
+        self._and_into(df, out)
+        return out
+
+    def _and_into(self, df, out):
+        # Par défaut : calcul du masque du nœud puis conjonction en place
+        out &= self._mask(df)
+
+    def _mask(self, df):
+        raise NotImplementedError
+
+    def to_query(self):
+        """Requête Elasticsearch équivalente."""
+        raise NotImplementedError
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class All(Filter):
+    """Filtre neutre (toutes les lignes)."""
+
+    def _and_into(self, df, out):
+        pass
+
+    def _mask(self, df):
+        return np.ones(len(df), dtype=bool)
+
+    def to_query(self):
+        return {"match_all": {}}
+
+
+class TimeRange(Filter):
+    """Horodatage entre `start` et `end` (bornes incluses, None = non bornée)."""
+
+    def __init__(self, start=None, end=None, column="timestamp"):
+        self.start = None if start is None else pd.Timestamp(start)
+        self.end = None if end is None else pd.Timestamp(end)
+        self.column = column
+
+    def _mask(self, df):
+        values = df[self.column]
+        if not pd.api.types.is_datetime64_any_dtype(values):
+            values = pd.to_datetime(values, errors="coerce")
+        values = values.to_numpy()
+        mask = ~pd.isna(values)
+        if self.start is not None:
+            mask &= values >= np.datetime64(self.start)
+        if self.end is not None:
+            mask &= values <= np.datetime64(self.end)
+        return mask
+
+    def to_query(self):
+        bounds = {}
+        if self.start is not None:
+            bounds["gte"] = self.start.isoformat()
+        if self.end is not None:
+            bounds["lte"] = self.end.isoformat()
+        return {"range": {es_field(self.column): bounds}}
+
+
+class OneOf(Filter):
+    """Valeur de la colonne dans un ensemble (protocole, action, interface, ports, IP...)."""
+
+    def __init__(self, column, values):
+        self.column = column
+        self.values = list(values)
+
+    def _mask(self, df):
+        values = df[self.column]
+        if pd.api.types.is_numeric_dtype(values):
+            wanted = pd.to_numeric(pd.Series(self.values, dtype="object"), errors="coerce").dropna()
+            return np.isin(values.to_numpy(), wanted.to_numpy())
+        return values.astype(str).isin([str(v) for v in self.values]).to_numpy()
+
+    def to_query(self):
+        return {"terms": {es_field(self.column): [str(v) for v in self.values]}}
+
+
+class Between(Filter):
+    """Valeur numérique entre `low` et `high` (bornes incluses, None = non bornée)."""
+
+    def __init__(self, column, low=None, high=None):
+        self.column = column
+        self.low, self.high = low, high
+
+    def _mask(self, df):
+        values = pd.to_numeric(df[self.column], errors="coerce").to_numpy(dtype=np.float64)
+        mask = ~np.isnan(values)
+        if self.low is not None:
+            mask &= values >= self.low
+        if self.high is not None:
+            mask &= values <= self.high
+        return mask
+
+    def to_query(self):
+        field = es_field(self.column)
+        if field.endswith(".keyword") and self.low is not None and self.high is not None \
+                and self.high - self.low < MAX_EXPANDED_TERMS:
+            # Un `range` sur un champ keyword compare des chaînes : plage entière énumérée
+            return {"terms": {field: [str(v) for v in range(int(self.low), int(self.high) + 1)]}}
+        bounds = {}
+        if self.low is not None:
+            bounds["gte"] = self.low
+        if self.high is not None:
+            bounds["lte"] = self.high
+        return {"range": {field: bounds}}
+
+
+class Cidr(Filter):
+    """
+    IP de la colonne dans l'un des préfixes CIDR, ou dans des intervalles uint32 déjà compilés
+    (`intervals`, par exemple ceux d'une étiquette, voir `cidr_tags.CidrTagger.intervals`).
+    """
+
+    def __init__(self, column, prefixes=(), intervals=None):
+        self.column = column
+        self.prefixes = list(prefixes)
+        self.starts, self.ends = intervals if intervals is not None else prefixes_to_intervals(self.prefixes)
+
+    def _mask(self, df):
+        codes, uniques = pd.factorize(df[self.column])
+        ips = ip_to_uint32(uniques).astype(np.int64)
+        index = np.searchsorted(self.starts, ips, side="right") - 1
+        keep = (index >= 0) & (ips <= self.ends[np.maximum(index, 0)]) if len(self.ends) else np.zeros(len(ips), bool)
+        return np.append(keep, False)[codes]
+
+    def to_query(self):
+        # Champ keyword : blocs alignés sur un octet -> requêtes `prefix` ("10.70."), adresses isolées
+        # regroupées dans une seule requête `terms`
+        field = es_field(self.column)
+        clauses, addresses = [], []
+        for start, end in zip(self.starts.tolist(), self.ends.tolist()):
+            if start == 0 and end == (1 << 32) - 1:
+                return {"match_all": {}}
+            # Découpage glouton en blocs alignés sur un octet (/8, /16, /24 ou adresse seule)
+            base = start
+            while base <= end:
+                step = next(s for s in (1 << 24, 1 << 16, 1 << 8, 1) if base % s == 0 and base + s - 1 <= end)
+                octets = [str((base >> shift) & 0xFF) for shift in (24, 16, 8, 0)]
+                if step == 1:
+                    addresses.append(".".join(octets))
+                else:
+                    kept = {1 << 24: 1, 1 << 16: 2, 1 << 8: 3}[step]
+                    clauses.append({"prefix": {field: ".".join(octets[:kept]) + "."}})
+                base += step
+        for chunk in range(0, len(addresses), MAX_EXPANDED_TERMS):
+            clauses.append({"terms": {field: addresses[chunk:chunk + MAX_EXPANDED_TERMS]}})
+        if not clauses:
+            return {"bool": {"must_not": [{"match_all": {}}]}}
+        return {"bool": {"should": clauses, "minimum_should_match": 1}}
+
+
+class And(Filter):
+    def __init__(self, *filters):
+        self.filters = [f for f in filters if f is not None and not isinstance(f, All)]
+
+    def _and_into(self, df, out):
+        for f in self.filters:
+            f._and_into(df, out)
+
+    def _mask(self, df):
+        return self.mask(df)
+
+    def to_query(self):
+        if not self.filters:
+            return {"match_all": {}}
+        return {"bool": {"filter": [f.to_query() for f in self.filters]}}
+
+
+class Or(Filter):
+    def __init__(self, *filters):
+        self.filters = [f for f in filters if f is not None]
+
+    def _mask(self, df):
+        out = np.zeros(len(df), dtype=bool)
+        for f in self.filters:
+            out |= f.mask(df)
+        return out
+
+    def to_query(self):
+        return {"bool": {"should": [f.to_query() for f in self.filters], "minimum_should_match": 1}}
+
+
+class Not(Filter):
+    def __init__(self, inner):
+        self.inner = inner
+
+    def _mask(self, df):
+        return ~self.inner.mask(df)
+
+    def to_query(self):
+        return {"bool": {"must_not": [self.inner.to_query()]}}
+
+
+def apply(df, flt):
+    """Lignes de `df` retenues par le filtre (une seule indexation de la table)."""
+    if flt is None or isinstance(flt, All) or (isinstance(flt, And) and not flt.filters):
+        return df
+    return df[flt.mask(df)]
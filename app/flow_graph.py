@@ -0,0 +1,246 @@
+"""
+Graphe des flux IP source -> IP destination, en matrices creuses (scipy.sparse), alimenté par lots.
+
+Les IP sont encodées en entiers (identifiants de nœuds attribués à la première apparition,
+table de correspondance triée pour la recherche dichotomique). Les comptes de chaque arête (total et
+PERMIT, DENY = total - PERMIT) sont stockés en CSR (voisinage sortant : « quelles destinations cette IP a-t-elle contactées »)
+et en CSC (voisinage entrant : « quelles sources ont contacté ce serveur ») ; les ports de chaque
+arête dans une troisième matrice, de colonnes `destination * 65536 + port`.
+Les lots intégrés sont accumulés puis fusionnés à la première requête.
+"""
+import ipaddress
+import json
+import threading
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from events import uint32_to_ip
+from utils import EventConsumer
+
+N_PORTS = 1 << 16
+EDGE_COLUMNS = ["Source", "Destination", "PERMIT", "DENY", "Total"]
+
+
+class FlowGraph(EventConsumer):
+    """Graphe orienté pondéré des flux, avec requêtes de voisinage, de degré et d'arêtes principales."""
+
+    FIELDS = ["timestamp", "ipsrc", "ipdst", "portdst", "action"]
+
+    def __init__(self):
+        self.last_ts = None
+        self._keys = np.zeros(0, dtype=np.uint32)  # IP triées
+        self._key_ids = np.zeros(0, dtype=np.int64)  # Identifiant de nœud de chaque IP triée
+        self._ips = np.zeros(0, dtype=np.uint32)  # IP de chaque identifiant
+        self._pending = []  # Lots en attente : (src, dst, port, permit)
+        self._total = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self._permit = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self._ports = sparse.csr_matrix((0, 0), dtype=np.int64)
+        self._total_csc = self._total.tocsc()
+        self._permit_csc = self._permit.tocsc()
+        self._lock = threading.RLock()
+
+    # ------------------------------------------------------------------ Encodage des IP
+
+    @property
+    def n_nodes(self):
+        return len(self._ips)
+
+    def _encode(self, ips):
+        """Identifiants de nœuds des IP, en créant ceux des IP inconnues."""
+        uniques, inverse = np.unique(ips, return_inverse=True)
+        new = np.setdiff1d(uniques, self._keys, assume_unique=True)
+        if len(new):
+            new_ids = np.arange(self.n_nodes, self.n_nodes + len(new))
+            self._ips = np.r_[self._ips, new].astype(np.uint32)
+            keys = np.r_[self._keys, new]
+            ids = np.r_[self._key_ids, new_ids]
+            order = np.argsort(keys, kind="stable")
+            self._keys, self._key_ids = keys[order].astype(np.uint32), ids[order]
+        return self._key_ids[np.searchsorted(self._keys, uniques)][inverse]
+
+    def node_id(self, ip):
+        """Identifiant de nœud d'une IP (texte ou entier), ou None si elle n'apparaît pas dans le graphe."""
+        try:
+            value = int(ipaddress.IPv4Address(ip))
+        except ValueError:
+            return None
+        index = np.searchsorted(self._keys, value)
+        if index < len(self._keys) and self._keys[index] == value:
+            return int(self._key_ids[index])
+        return None
+
+    # ------------------------------------------------------------------ Alimentation
+
+    def update(self, events):
+        """Intègre un lot d'événements typés (voir `events.to_event_columns`)."""
+        if events.empty:
+            return
+        with self._lock:
+            src = self._encode(events["ipsrc"].to_numpy())
+            dst = self._encode(events["ipdst"].to_numpy())
+            self._pending.append((src, dst, events["portdst"].to_numpy(np.int64), events["permit"].to_numpy()))
+            ts_max = int(events["ts"].max())
+            self.last_ts = ts_max if self.last_ts is None else max(self.last_ts, ts_max)
+
+    @staticmethod
+    def _add(matrix, rows, cols, shape):
+        """Somme d'une matrice CSR (agrandie à `shape`) et d'un lot d'arêtes, indices triés."""
+        matrix = matrix.copy()
+        matrix.resize(shape)
+        result = matrix + sparse.csr_matrix((np.ones(len(rows), dtype=np.int64), (rows, cols)), shape=shape)
+        result.sort_indices()
+        return result
+
+    def _materialize(self):
+        """Fusionne les lots en attente dans les matrices CSR / CSC (sous verrou)."""
+        if not self._pending:
+            return
+        src, dst, port, permit = (np.concatenate(parts) for parts in zip(*self._pending))
+        self._pending = []
+        n = self.n_nodes
+        self._total = self._add(self._total, src, dst, (n, n))
+        self._permit = self._add(self._permit, src[permit], dst[permit], (n, n))
+        self._ports = self._add(self._ports, src, dst * N_PORTS + port, (n, n * N_PORTS))
+        self._total_csc = self._total.tocsc()
+        self._permit_csc = self._permit.tocsc()
+        self._total_csc.sort_indices()
+        self._permit_csc.sort_indices()
+
+    def matrices(self):
+        """Matrices (total, permit) en CSR puis en CSC, fusionnées si nécessaire."""
+        with self._lock:
+            self._materialize()
+            return self._total, self._permit, self._total_csc, self._permit_csc
+
+    @staticmethod
+    def _slice(matrix, node):
+        """Voisins et comptes d'une ligne (CSR) ou d'une colonne (CSC), sans copie."""
+        start, end = matrix.indptr[node], matrix.indptr[node + 1]
+        return matrix.indices[start:end], matrix.data[start:end]
+
+    @classmethod
+    def _aligned(cls, matrix, node, peers):
+        """Comptes de `matrix` pour les voisins `peers` (triés) de `node`, 0 si absents."""
+        indices, data = cls._slice(matrix, node)
+        position = np.minimum(np.searchsorted(indices, peers), max(len(indices) - 1, 0))
+        if not len(indices):
+            return np.zeros(len(peers), dtype=np.int64)
+        return np.where(indices[position] == peers, data[position], 0)
+
+    def _edge_permits(self, rows, cols):
+        """Comptes PERMIT d'une liste d'arêtes."""
+        permit = self.matrices()[1]
+        return np.asarray(permit[rows, cols]).ravel().astype(np.int64) if len(rows) else np.zeros(0, np.int64)
+
+    def _edges_frame(self, rows, cols, totals):
+        permits = self._edge_permits(rows, cols)
+        return pd.DataFrame({
+            "Source": uint32_to_ip(self._ips[rows]),
+            "Destination": uint32_to_ip(self._ips[cols]),
+            "PERMIT": permits,
+            "DENY": totals - permits,
+            "Total": totals,
+        }, columns=EDGE_COLUMNS)
+
+    # ------------------------------------------------------------------ Requêtes
+
+    def neighbors(self, ip, direction="out", n=None):
+        """
+        Voisinage d'une IP : destinations contactées (`out`) ou sources l'ayant contactée (`in`).
+
+        Returns:
+            pd.DataFrame: Colonnes IP, PERMIT, DENY, Total, triées par total décroissant.
+        """
+        node = self.node_id(ip)
+        columns = ["IP", "PERMIT", "DENY", "Total"]
+        if node is None:
+            return pd.DataFrame(columns=columns)
+        total, permit, total_csc, permit_csc = self.matrices()
+        if direction == "out":
+            peers, counts = self._slice(total, node)
+            permits = self._aligned(permit, node, peers)
+        else:
+            peers, counts = self._slice(total_csc, node)
+            permits = self._aligned(permit_csc, node, peers)
+        order = np.argsort(-counts, kind="stable")[:n]
+        return pd.DataFrame({
+            "IP": uint32_to_ip(self._ips[peers[order]]),
+            "PERMIT": permits[order],
+            "DENY": counts[order] - permits[order],
+            "Total": counts[order],
+        }, columns=columns)
+
+    def degree(self, direction="out"):
+        """
+        Degré (nombre de voisins distincts) de chaque IP.
+
+        Returns:
+            pd.Series: Degré indexé par IP, trié par valeur décroissante.
+        """
+        total, _, total_csc, _ = self.matrices()
+        matrix = total if direction == "out" else total_csc
+        degrees = np.diff(matrix.indptr)
+        return pd.Series(degrees, index=uint32_to_ip(self._ips), name=f"Degré_{direction}").sort_values(ascending=False)
+
+    def top_edges(self, n=20):
+        """Les `n` arêtes les plus chargées."""
+        coo = self.matrices()[0].tocoo()
+        if coo.nnz == 0:
+            return pd.DataFrame(columns=EDGE_COLUMNS)
+        top = np.argpartition(-coo.data, min(n, coo.nnz) - 1)[:n]
+        top = top[np.argsort(-coo.data[top], kind="stable")]
+        return self._edges_frame(coo.row[top], coo.col[top], coo.data[top])
+
+    def edge_ports(self, src_ip, dst_ip):
+        """Ports destination utilisés sur une arête, avec leur nombre d'événements."""
+        src, dst = self.node_id(src_ip), self.node_id(dst_ip)
+        if src is None or dst is None:
+            return pd.Series(dtype=np.int64, name="Événements")
+        with self._lock:
+            self._materialize()
+            indices, data = self._slice(self._ports, src)
+        # Colonnes triées : les ports de l'arête forment une plage contiguë
+        start, end = np.searchsorted(indices, [dst * N_PORTS, (dst + 1) * N_PORTS])
+        ports = pd.Series(data[start:end], index=indices[start:end] - dst * N_PORTS, name="Événements")
+        return ports.sort_values(ascending=False)
+
+    def subgraph(self, ips, hops=1, max_edges=500):
+        """
+        Sous-graphe autour des IP données (voisinages entrant et sortant sur `hops` sauts),
+        limité aux `max_edges` arêtes les plus chargées.
+
+        Returns:
+            pd.DataFrame: Arêtes (Source, Destination, PERMIT, DENY, Total).
+        """
+        total, _, total_csc, _ = self.matrices()
+        nodes = {node for node in (self.node_id(ip) for ip in ips) if node is not None}
+        frontier = set(nodes)
+        for _ in range(hops):
+            reached = set()
+            for node in frontier:
+                reached.update(self._slice(total, node)[0].tolist())
+                reached.update(self._slice(total_csc, node)[0].tolist())
+            frontier = reached - nodes
+            nodes |= reached
+        if not nodes:
+            return pd.DataFrame(columns=EDGE_COLUMNS)
+        index = np.array(sorted(nodes))
+        sub = total[index][:, index].tocoo()
+        top = np.argsort(-sub.data, kind="stable")[:max_edges]
+        return self._edges_frame(index[sub.row[top]], index[sub.col[top]], sub.data[top])
+
+
+def to_node_link(edges):
+    """Sous-graphe au format JSON nœuds / liens (d3, Gephi, networkx.node_link_graph)."""
+    nodes = pd.unique(pd.concat([edges["Source"], edges["Destination"]]))
+    return json.dumps({
+        "directed": True,
+        "nodes": [{"id": ip} for ip in nodes],
+        "links": [
+            {"source": row.Source, "target": row.Destination, "permit": int(row.PERMIT),
+             "deny": int(row.DENY), "weight": int(row.Total)}
+            for row in edges.itertuples(index=False)
+        ],
+    })
@@ -0,0 +1,113 @@
+"""
+Rapport du coût d'import des pages (`python -X importtime`), comparé à un budget.
+
+Chaque page est importée dans un interpréteur neuf (comme après un redémarrage du conteneur),
+plusieurs fois pour ne retenir que la mesure la moins bruitée ; le rapport liste les modules les plus
+coûteux et signale les pages qui dépassent leur budget (code de sortie 1, utilisable en intégration
+continue). Les budgets sont relatifs à la machine : ils sont mis à l'échelle par le coût d'import de
+pandas et Streamlit mesuré au même moment (`BASELINE_MODULES`).
+
+Exemple :
+    python import_budget.py --top 15
+"""
+import argparse
+import os
+import subprocess
+import sys
+
+import pandas as pd
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Budget d'import par point d'entrée, en millisecondes (cumul, interpréteur neuf) pour une machine où
+# l'import de référence coûte `BASELINE_REFERENCE_MS`
+BASELINE_MODULES = ["pandas", "streamlit"]
+BASELINE_REFERENCE_MS = 650
+IMPORT_BUDGET_MS = {
+    "utils": 500,  # Sans Streamlit (voir metrics)
+    "dashboard": 1000,
+    "explore_data": 1000,
+    "model": 1000,
+    "jobs": 1000,
+}
+
+
+def measure(module, python=sys.executable):
+    """
+    Importe `module` (ou plusieurs modules séparés par des virgules) dans un nouvel interpréteur et
+    relève le coût de chaque import.
+
+    Returns:
+        pd.DataFrame: Colonnes module, self_ms, cumulative_ms, depth (profondeur dans l'arbre d'import).
+    """
+    result = subprocess.run(
+        [python, "-X", "importtime", "-c", f"import {module}"],
+        cwd=APP_DIR, capture_output=True, text=True,
+        env={**os.environ, "PERF_LOG_LEVEL": "WARNING"},
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"Import de {module} impossible :\n{result.stderr[-2000:]}")
+    rows = []
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append({
+            "module": name.strip(),
+            "self_ms": int(self_us) / 1000,
+            "cumulative_ms": int(cumulative_us) / 1000,
+            "depth": (len(name) - len(name.lstrip())) // 2,
+        })
+    return pd.DataFrame(rows)
+
+
+def _total_ms(timings, modules):
+    return timings.loc[timings["module"].isin(modules) & (timings["depth"] == 0), "cumulative_ms"].sum()
+
+
+def measure_best(module, repeat=3):
+    """Mesure la plus rapide de `repeat` importations de `module` (la moins perturbée par la machine)."""
+    runs = [measure(module) for _ in range(repeat)]
+    return min(runs, key=lambda timings: _total_ms(timings, module.split(",")))
+
+
+def baseline_scale(repeat=3):
+    """Rapport entre le coût d'import de `BASELINE_MODULES` sur cette machine et sa valeur de référence."""
+    timings = measure_best(",".join(BASELINE_MODULES), repeat)
+    return _total_ms(timings, BASELINE_MODULES) / BASELINE_REFERENCE_MS
+
+
+def report(modules=None, budget=None, top=10, repeat=3):
+    """
+    Mesure chaque point d'entrée et le compare à son budget, mis à l'échelle de la machine.
+
+    Returns:
+        pd.DataFrame: Une ligne par point d'entrée (temps total, budget, dépassement).
+    """
+    budget = budget or IMPORT_BUDGET_MS
+    modules = modules or list(budget)
+    scale = baseline_scale(repeat)
+    print(f"📏 Import de référence ({', '.join(BASELINE_MODULES)}) : ×{scale:.2f} par rapport à {BASELINE_REFERENCE_MS} ms")
+    rows = []
+    for module in modules:
+        timings = measure_best(module, repeat)
+        total = _total_ms(timings, [module])
+        limit = round(budget[module] * scale) if module in budget else None
+        over = limit is not None and total > limit
+        rows.append({"module": module, "import_ms": total, "budget_ms": limit, "dépassement": over})
+
+        print(f"{'❌' if over else '✅'} {module} : {total:.0f} ms (budget {limit} ms)")
+        heaviest = timings[timings["depth"] >= 1].nlargest(top, "self_ms")
+        for _, row in heaviest.iterrows():
+            print(f"     {row['self_ms']:8.1f} ms  (cumul {row['cumulative_ms']:8.1f} ms)  {row['module']}")
+    return pd.DataFrame(rows)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Coût d'import des pages et budget.")
+    parser.add_argument("modules", nargs="*", help="Modules à mesurer (par défaut : ceux du budget)")
+    parser.add_argument("--top", type=int, default=10, help="Nombre de modules les plus coûteux affichés")
+    parser.add_argument("--repeat", type=int, default=3, help="Mesures par module (la plus rapide est retenue)")
+    args = parser.parse_args()
+    result = report(args.modules, top=args.top, repeat=args.repeat)
+    sys.exit(1 if result["dépassement"].any() else 0)
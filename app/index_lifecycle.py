@@ -0,0 +1,167 @@
+"""
+Index journaliers des logs derrière l'alias `application-logs`, avec cycle de vie (ILM).
+
+Logstash écrit chaque événement dans `application-logs-AAAA.MM.JJ` (jour UTC de `@timestamp`) ; le
+modèle d'index appliqué à ces index leur ajoute l'alias `application-logs`, interrogé par l'application,
+et la politique de cycle de vie :
+- après `--warm-after` jours : fusion en un segment (force merge) et passage en lecture seule ;
+- après `--retention-days` jours, seulement si l'option est donnée : suppression.
+
+`utils.index_for_range` s'appuie sur ces noms pour n'interroger que les jours d'une plage de dates.
+
+Le script est idempotent. Avec `--migrate`, un ancien index unique `application-logs` est réparti en
+index journaliers (reindex) puis supprimé pour laisser place à l'alias (Logstash arrêté pendant la migration).
+L'âge ILM d'un jour migré part de sa date, sauf au-delà de la rétention : la migration ne supprime rien
+d'elle-même, l'historique plus ancien est conservé une durée de rétention à partir de la migration.
+
+Exemple :
+    python index_lifecycle.py --migrate
+"""
+import argparse
+import time
+
+import pandas as pd
+
+from utils import INDEX_NAME, PARTITION_FORMAT, get_es
+
+POLICY_NAME = f"{INDEX_NAME}-policy"
+TEMPLATE_NAME = INDEX_NAME
+PATTERN = f"{INDEX_NAME}-*"
+
+# Jour de `@timestamp` (ISO 8601 UTC, "2024-01-31T...") -> index journalier, format de `PARTITION_FORMAT`
+REINDEX_SCRIPT = (
+    f"ctx._index = '{INDEX_NAME}-' + ctx._source['@timestamp'].substring(0, 10).replace('-', '.')"
+)
+
+
+def lifecycle_policy(warm_after=2, retention_days=None):
+    """
+    Politique ILM : fusion et lecture seule des jours passés, suppression au-delà de `retention_days`
+    (aucune suppression si None).
+    """
+    policy = {
+        "phases": {
+            "hot": {"min_age": "0ms", "actions": {"set_priority": {"priority": 100}}},
+            "warm": {
+                "min_age": f"{warm_after}d",
+                "actions": {
+                    "forcemerge": {"max_num_segments": 1},
+                    "readonly": {},
+                    "set_priority": {"priority": 50},
+                },
+            },
+        }
+    }
+    if retention_days is not None:
+        policy["phases"]["delete"] = {"min_age": f"{retention_days}d", "actions": {"delete": {}}}
+    return policy
+
+
+def index_template(with_alias=True):
+    """Modèle des index journaliers : un shard, politique ILM, alias de lecture."""
+    template = {
+        "settings": {
+            "number_of_shards": 1,
+            "number_of_replicas": 0,
+            "index.lifecycle.name": POLICY_NAME,
+        },
+        "mappings": {"properties": {"@timestamp": {"type": "date"}}},
+    }
+    if with_alias:
+        template["aliases"] = {INDEX_NAME: {}}
+    return template
+
+
+def wait_for_cluster(es, timeout):
+    """Attend qu'Elasticsearch réponde (démarrage des conteneurs)."""
+    deadline = time.monotonic() + timeout
+    while True:
+        try:
+            es.cluster.health(wait_for_status="yellow", timeout="5s")
+            return
+        except Exception as e:
+            if time.monotonic() > deadline:
+                raise
+            print(f"⏳ Elasticsearch indisponible ({type(e).__name__}), nouvel essai...")
+            time.sleep(5)
+
+
+def _legacy_index_exists(es):
+    """Vrai si `INDEX_NAME` est encore un index concret (et non l'alias)."""
+    return bool(es.indices.exists(index=INDEX_NAME)) and not bool(es.indices.exists_alias(name=INDEX_NAME))
+
+
+def _set_origination_dates(es, names, retention_days=None):
+    # L'âge ILM d'un jour migré part de sa date, et non de la création de l'index ; un jour déjà hors
+    # rétention garde la date de migration, sans quoi il serait supprimé dès la migration
+    now = pd.Timestamp.now(tz="UTC").tz_localize(None)
+    for name in names:
+        day = pd.to_datetime(name[len(INDEX_NAME) + 1:], format=PARTITION_FORMAT, errors="coerce")
+        if pd.isna(day):
+            continue
+        if retention_days is not None and day <= now - pd.Timedelta(days=retention_days):
+            day = now
+        es.indices.put_settings(index=name, settings={"index.lifecycle.origination_date": int(day.value // 10**6)})
+
+
+def migrate(es, retention_days=None):
+    """Répartit l'ancien index unique en index journaliers, puis le remplace par l'alias."""
+    source_count = es.count(index=INDEX_NAME)["count"]
+    print(f"🔄 Migration de {source_count} documents de {INDEX_NAME} vers les index journaliers...")
+    es.options(request_timeout=3600).reindex(
+        source={"index": INDEX_NAME},
+        dest={"index": f"{INDEX_NAME}-migration", "op_type": "create"},
+        script={"source": REINDEX_SCRIPT, "lang": "painless"},
+        conflicts="proceed",
+        wait_for_completion=True,
+    )
+    es.indices.refresh(index=PATTERN)
+    migrated = es.count(index=PATTERN)["count"]
+    if migrated < source_count:
+        raise RuntimeError(f"Migration incomplète : {migrated} / {source_count} documents, {INDEX_NAME} conservé.")
+    names = sorted(es.indices.get(index=PATTERN))
+    _set_origination_dates(es, names, retention_days)
+    es.indices.delete(index=INDEX_NAME)
+    print(f"✅ {migrated} documents répartis dans {len(names)} index journaliers ; ancien index supprimé.")
+
+
+def setup(warm_after=2, retention_days=None, migrate_legacy=False):
+    """Crée (ou met à jour) la politique ILM, le modèle d'index et l'alias."""
+    es = get_es()
+    es.ilm.put_lifecycle(name=POLICY_NAME, policy=lifecycle_policy(warm_after, retention_days))
+    deletion = f"suppression après {retention_days} j" if retention_days is not None else "sans suppression"
+    print(f"✅ Politique de cycle de vie {POLICY_NAME} : lecture seule après {warm_after} j, {deletion}.")
+
+    legacy = _legacy_index_exists(es)
+    if legacy and migrate_legacy:
+        # Alias absent du modèle le temps du reindex : il porterait le nom de l'index existant
+        es.indices.put_index_template(name=TEMPLATE_NAME, index_patterns=[PATTERN], priority=200,
+                                      template=index_template(with_alias=False))
+        migrate(es, retention_days)
+        legacy = False
+    elif legacy:
+        print(f"⚠️ {INDEX_NAME} est un index unique : relancer avec --migrate pour le répartir par jour.")
+
+    es.indices.put_index_template(name=TEMPLATE_NAME, index_patterns=[PATTERN], priority=200,
+                                  template=index_template(with_alias=not legacy))
+    print(f"✅ Modèle d'index {TEMPLATE_NAME} ({PATTERN}).")
+
+    # Index journaliers créés avant le modèle (ou pendant la migration) : alias et politique
+    names = sorted(es.indices.get(index=PATTERN))
+    if names and not legacy:
+        es.indices.put_alias(index=PATTERN, name=INDEX_NAME)
+        es.indices.put_settings(index=PATTERN, settings={"index.lifecycle.name": POLICY_NAME})
+        print(f"✅ Alias {INDEX_NAME} : {len(names)} index journaliers ({names[0]} → {names[-1]}).")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Index journaliers, alias et cycle de vie des logs.")
+    parser.add_argument("--warm-after", type=int, default=2, help="Jours avant fusion et lecture seule")
+    parser.add_argument("--retention-days", type=int, default=None,
+                        help="Jours de conservation (par défaut, aucune suppression)")
+    parser.add_argument("--migrate", action="store_true", help="Répartir l'ancien index unique par jour")
+    parser.add_argument("--wait", type=float, default=0, help="Attente maximale d'Elasticsearch (s)")
+    args = parser.parse_args()
+    if args.wait:
+        wait_for_cluster(get_es(), args.wait)
+    setup(args.warm_after, args.retention_days, args.migrate)
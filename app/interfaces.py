@@ -0,0 +1,154 @@
+"""
+Matrice de trafic entre interfaces (`interfaceint` -> `interfaceout`).
+
+Le cube (interface d'entrée, interface de sortie, action, protocole, tranche horaire) est obtenu par une
+seule agrégation composite paginée, puis encodé en entiers. La matrice agrégée par action et protocole
+est précalculée en tableau dense ; les cellules d'un couple d'interfaces sont contiguës (tri par couple),
+si bien que le détail d'un segment se lit par recherche dichotomique, sans nouveau parcours des logs.
+"""
+import numpy as np
+import pandas as pd
+
+from metrics import timed
+from utils import NO_INDEX, get_es, index_for_range
+
+BUCKET_INTERVAL = "1h"
+PAGE_SIZE = 10000
+ACTIONS = ["DENY", "PERMIT"]
+
+
+def cube_query(interval=BUCKET_INTERVAL, since=None):
+    """Agrégation composite sur (interfaces, action, protocole, tranche de temps)."""
+    query = {
+        "size": 0,
+        "aggs": {
+            "cube": {
+                "composite": {
+                    "size": PAGE_SIZE,
+                    "sources": [
+                        {"interfaceint": {"terms": {"field": "interfaceint.keyword"}}},
+                        {"interfaceout": {"terms": {"field": "interfaceout.keyword"}}},
+                        {"action": {"terms": {"field": "action.keyword"}}},
+                        {"proto": {"terms": {"field": "proto.keyword"}}},
+                        {"bucket": {"date_histogram": {"field": "@timestamp", "fixed_interval": interval}}},
+                    ],
+                }
+            }
+        },
+    }
+    if since is not None:
+        query["query"] = {"range": {"@timestamp": {"gte": since}}}
+    return query
+
+
+@timed("interfaces.fetch_cube")
+def fetch_cube(interval=BUCKET_INTERVAL, since=None):
+    """
+    Récupère le cube interfaces x action x protocole x temps.
+
+    Returns:
+        pd.DataFrame: Colonnes interfaceint, interfaceout, action, proto, bucket (datetime), count.
+    """
+    query = cube_query(interval, since)
+    index = index_for_range(since)
+    rows = []
+    while index is not NO_INDEX:
+        result = get_es().search(index=index, body=query)
+        aggregation = result["aggregations"]["cube"]
+        buckets = aggregation["buckets"]
+        if not buckets:
+            break
+        rows.extend({**bucket["key"], "count": bucket["doc_count"]} for bucket in buckets)
+        if "after_key" not in aggregation:
+            break
+        query["aggs"]["cube"]["composite"]["after"] = aggregation["after_key"]
+
+    cube = pd.DataFrame(rows, columns=["interfaceint", "interfaceout", "action", "proto", "bucket", "count"])
+    cube["bucket"] = pd.to_datetime(cube["bucket"], unit="ms")
+    print(f"✅ Matrice des interfaces : {len(cube)} cellules récupérées.")
+    return cube
+
+
+class InterfaceMatrix:
+    """Cube de trafic entre interfaces, encodé pour des lectures par couple d'interfaces."""
+
+    def __init__(self, cube):
+        interfaces = pd.Index(sorted(set(cube["interfaceint"]) | set(cube["interfaceout"])))
+        self.interfaces = interfaces
+        self.protocols = pd.Index(sorted(cube["proto"].unique()))
+        self.buckets = pd.DatetimeIndex(sorted(cube["bucket"].unique()))
+
+        src = interfaces.get_indexer(cube["interfaceint"])
+        dst = interfaces.get_indexer(cube["interfaceout"])
+        action = pd.Index(ACTIONS).get_indexer(cube["action"])
+        proto = self.protocols.get_indexer(cube["proto"])
+        bucket = self.buckets.get_indexer(cube["bucket"])
+        counts = cube["count"].to_numpy(dtype=np.int64)
+        keep = action >= 0
+
+        # Matrice dense [entrée, sortie, action, protocole] pour la carte de chaleur
+        n, p = len(interfaces), len(self.protocols)
+        self.totals = np.zeros((n, n, len(ACTIONS), p), dtype=np.int64)
+        np.add.at(self.totals, (src[keep], dst[keep], action[keep], proto[keep]), counts[keep])
+
+        # Cellules triées par couple d'interfaces puis par tranche de temps
+        pair = src * n + dst
+        order = np.lexsort((bucket, pair))
+        self._pair = pair[order]
+        self._action = action[order]
+        self._proto = proto[order]
+        self._bucket = bucket[order]
+        self._counts = counts[order]
+
+    @property
+    def empty(self):
+        return len(self._counts) == 0
+
+    def matrix(self, actions=None, protocols=None):
+        """
+        Nombre d'événements par couple d'interfaces (lignes : entrée, colonnes : sortie).
+
+        Args:
+            actions (list, optional): Actions retenues (PERMIT / DENY), toutes par défaut.
+            protocols (list, optional): Protocoles retenus, tous par défaut.
+        """
+        a = [ACTIONS.index(x) for x in actions] if actions else slice(None)
+        p = self.protocols.get_indexer(protocols) if protocols else slice(None)
+        values = self.totals[:, :, a, :][:, :, :, p].sum(axis=(2, 3))
+        return pd.DataFrame(values, index=self.interfaces.rename("interfaceint"),
+                            columns=self.interfaces.rename("interfaceout"))
+
+    def deny_ratio(self):
+        """Part des DENY par couple d'interfaces (NaN si aucun trafic)."""
+        total = self.totals.sum(axis=(2, 3))
+        deny = self.totals[:, :, ACTIONS.index("DENY"), :].sum(axis=2)
+        with np.errstate(invalid="ignore", divide="ignore"):
+            ratio = deny / total
+        return pd.DataFrame(ratio, index=self.interfaces.rename("interfaceint"),
+                            columns=self.interfaces.rename("interfaceout"))
+
+    def _cells(self, interface_in, interface_out):
+        """Plage des cellules d'un couple d'interfaces (vide si le couple n'existe pas)."""
+        i, o = self.interfaces.get_indexer([interface_in, interface_out])
+        if i < 0 or o < 0:
+            return slice(0, 0)
+        pair = i * len(self.interfaces) + o
+        start, end = np.searchsorted(self._pair, [pair, pair + 1])
+        return slice(start, end)
+
+    def breakdown(self, interface_in, interface_out):
+        """Répartition action x protocole du trafic d'un couple d'interfaces."""
+        i, o = self.interfaces.get_indexer([interface_in, interface_out])
+        if i < 0 or o < 0:
+            return pd.DataFrame(columns=self.protocols)
+        return pd.DataFrame(self.totals[i, o], index=pd.Index(ACTIONS, name="action"), columns=self.protocols)
+
+    def timeline(self, interface_in, interface_out):
+        """Évolution du trafic d'un couple d'interfaces, par tranche de temps et par action."""
+        cells = self._cells(interface_in, interface_out)
+        frame = pd.DataFrame({
+            "bucket": self.buckets[self._bucket[cells]],
+            "action": np.array(ACTIONS)[self._action[cells]],
+            "count": self._counts[cells],
+        })
+        return frame.groupby(["bucket", "action"])["count"].sum().unstack(fill_value=0)
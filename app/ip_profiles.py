@@ -0,0 +1,281 @@
+"""
+Profils par IP source (index centré sur l'entité), alimentés par lots.
+
+Chaque IP source a un profil compact, mis à jour de façon incrémentale à partir des nouveaux événements :
+première et dernière apparition, totaux par action et par protocole (tableaux denses alignés sur les IP
+triées), ports source / destination, règles déclenchées et activité journalière par action (compteurs creux
+de clés `ip << bits | valeur` triées), étiquette de cluster. Ouvrir une IP revient à une recherche
+dichotomique dans chaque table ; la liste des IP se trie et se pagine sur les tableaux denses, sans
+nouvelle agrégation Elasticsearch.
+"""
+import ipaddress
+import threading
+
+import numpy as np
+import pandas as pd
+
+from events import ip_to_uint32, uint32_to_ip
+from utils import EventConsumer
+
+ACTIONS = ["DENY", "PERMIT"]  # Indice = valeur de `permit`
+DAY_SECONDS = 86400
+TOP_N = 5
+PROFILE_FIELDS = ["timestamp", "ipsrc", "ipdst", "proto", "portsrc", "portdst", "idregle", "action"]
+SORT_COLUMNS = ["COUNT", "PERMIT", "DENY", "Part_DENY", "Nb_Regles", "Premier", "Dernier"]
+
+
+class CountTable:
+    """Compteurs creux par (IP, valeur) : clés `ip << bits | valeur` triées, lots fusionnés à la lecture."""
+
+    def __init__(self, bits):
+        self.bits = bits
+        self.keys = np.zeros(0, dtype=np.uint64)
+        self.counts = np.zeros(0, dtype=np.int64)
+        self._pending = []
+
+    def add(self, ips, values):
+        self._pending.append((ips.astype(np.uint64) << np.uint64(self.bits)) | values.astype(np.uint64))
+
+    def merge(self):
+        """Intègre les lots en attente (tri des clés puis somme des doublons)."""
+        if not self._pending:
+            return
+        keys = np.concatenate([self.keys] + self._pending)
+        counts = np.concatenate([self.counts, np.ones(len(keys) - len(self.keys), dtype=np.int64)])
+        self._pending = []
+        order = np.argsort(keys, kind="stable")
+        keys, counts = keys[order], counts[order]
+        starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]])
+        self.keys, self.counts = keys[starts], np.add.reduceat(counts, starts) if len(keys) else counts
+
+    def lookup(self, ip):
+        """Valeurs et comptes d'une IP (plage contiguë des clés triées)."""
+        low = np.uint64(ip) << np.uint64(self.bits)
+        start, end = np.searchsorted(self.keys, [low, low + (np.uint64(1) << np.uint64(self.bits))])
+        values = (self.keys[start:end] & np.uint64((1 << self.bits) - 1)).astype(np.int64)
+        return values, self.counts[start:end]
+
+    def distinct_per_ip(self, ips):
+        """Nombre de valeurs distinctes de chaque IP de `ips` (triées)."""
+        high = self.keys >> np.uint64(self.bits)
+        ips = np.asarray(ips, dtype=np.uint64)
+        return np.searchsorted(high, ips, side="right") - np.searchsorted(high, ips, side="left")
+
+
+class ProfileStore(EventConsumer):
+    """Profils des IP sources, avec consultation d'une IP et liste triée / paginée."""
+
+    FIELDS = PROFILE_FIELDS
+
+    def __init__(self):
+        self.last_ts = None
+        self.protocols = []
+        self._ips = np.zeros(0, dtype=np.uint32)  # IP triées
+        self._first = np.zeros(0, dtype=np.int64)
+        self._last = np.zeros(0, dtype=np.int64)
+        self._actions = np.zeros((0, len(ACTIONS)), dtype=np.int64)
+        self._protos = np.zeros((0, 0), dtype=np.int64)
+        self._portdst = CountTable(16)
+        self._portsrc = CountTable(16)
+        self._rules = CountTable(32)  # idregle + 1 (0 : règle inconnue)
+        self._daily = CountTable(24)  # jour * 2 + permit
+        self._labels = pd.Series(dtype=object)  # IP (uint32) -> étiquette de cluster
+        self.labels_source = None
+        self._table = None  # Table des profils, recalculée après une mise à jour
+        self._orders = {}  # Ordres de tri de la table, par colonne
+        self._lock = threading.RLock()
+
+    @property
+    def n_profiles(self):
+        return len(self._ips)
+
+    # ------------------------------------------------------------------ Alimentation
+
+    def _grow(self, ips):
+        """Ajoute les IP inconnues en conservant l'ordre trié des tableaux denses."""
+        new = np.setdiff1d(ips, self._ips, assume_unique=True)
+        if not len(new):
+            return
+        merged = np.union1d(self._ips, new).astype(np.uint32)
+        old = np.searchsorted(merged, self._ips)
+        n = len(merged)
+
+        def spread(values, fill):
+            out = np.full((n,) + values.shape[1:], fill, dtype=values.dtype)
+            out[old] = values
+            return out
+
+        self._first = spread(self._first, np.iinfo(np.int64).max)
+        self._last = spread(self._last, np.iinfo(np.int64).min)
+        self._actions = spread(self._actions, 0)
+        self._protos = spread(self._protos, 0)
+        self._ips = merged
+
+    def update(self, events):
+        """Intègre un lot d'événements typés (voir `events.to_event_columns`)."""
+        if events.empty:
+            return
+        with self._lock:
+            src = events["ipsrc"].to_numpy(np.uint32)
+            ts = events["ts"].to_numpy(np.int64)
+            permit = events["permit"].to_numpy().astype(np.int64)
+            uniques, inverse = np.unique(src, return_inverse=True)
+            self._grow(uniques)
+            rows = np.searchsorted(self._ips, uniques)
+            row = rows[inverse]
+
+            # Première / dernière apparition : min / max par IP du lot (lot trié par horodatage)
+            np.minimum.at(self._first, rows, pd.Series(ts).groupby(inverse).min().to_numpy())
+            np.maximum.at(self._last, rows, pd.Series(ts).groupby(inverse).max().to_numpy())
+            np.add.at(self._actions, (row, permit), 1)
+
+            proto = events["proto"].astype("category")
+            codes = proto.cat.codes.to_numpy()
+            names = [str(name) for name in proto.cat.categories]
+            self.protocols.extend(name for name in names if name not in self.protocols)
+            if self._protos.shape[1] < len(self.protocols):
+                self._protos = np.pad(self._protos, ((0, 0), (0, len(self.protocols) - self._protos.shape[1])))
+            vocab = np.array([self.protocols.index(name) for name in names], dtype=np.int64)
+            valid = codes >= 0  # Protocole manquant : non compté
+            np.add.at(self._protos, (row[valid], vocab[codes[valid]]), 1)
+
+            self._portdst.add(src, events["portdst"].to_numpy(np.int64))
+            self._portsrc.add(src, events["portsrc"].to_numpy(np.int64))
+            self._rules.add(src, events["idregle"].to_numpy(np.int64) + 1)
+            self._daily.add(src, ts // DAY_SECONDS * 2 + permit)
+
+            self._table, self._orders = None, {}
+            ts_max = int(ts.max())
+            self.last_ts = ts_max if self.last_ts is None else max(self.last_ts, ts_max)
+
+    def update_from_es(self, batch_size=10000):
+        """Intègre les événements arrivés depuis la dernière lecture, puis fusionne les compteurs creux."""
+        super().update_from_es(batch_size)
+        self.merge()
+        return self
+
+    def merge(self):
+        """Fusionne les lots en attente des compteurs creux (sinon fait à la première consultation)."""
+        with self._lock:
+            for table in (self._portdst, self._portsrc, self._rules, self._daily):
+                table.merge()
+
+    def set_labels(self, labels, source=None):
+        """
+        Étiquettes de cluster par IP (Series indexée par IP texte, voir la tâche de clustering).
+        Sans effet si `source` (par exemple le fichier des étiquettes) n'a pas changé.
+        """
+        with self._lock:
+            if source is not None and source == self.labels_source:
+                return
+            keys = ip_to_uint32(labels.index).astype(np.int64)
+            self._labels = pd.Series(labels.to_numpy(), index=pd.Index(keys)).sort_index()
+            self.labels_source = source
+            self._table, self._orders = None, {}
+
+    # ------------------------------------------------------------------ Consultation
+
+    def _row(self, ip):
+        try:
+            value = int(ipaddress.IPv4Address(ip))
+        except ValueError:
+            return None
+        index = np.searchsorted(self._ips, value)
+        if index < len(self._ips) and self._ips[index] == value:
+            return int(index)
+        return None
+
+    @staticmethod
+    def _top(values, counts, n=TOP_N):
+        top = np.argsort(-counts, kind="stable")[:n]
+        return pd.Series(counts[top], index=values[top], name="Événements")
+
+    def profile(self, ip):
+        """
+        Profil d'une IP source (None si elle n'a émis aucun événement intégré).
+
+        Returns:
+            dict: Premier / Dernier (pd.Timestamp), COUNT / PERMIT / DENY, protocoles, top ports
+            destination et source, règles déclenchées (Series idregle -> événements), activité journalière
+            (DataFrame jour x action), étiquette de cluster (ou None).
+        """
+        with self._lock:
+            row = self._row(ip)
+            if row is None:
+                return None
+            self.merge()
+            key = int(self._ips[row])
+            actions = self._actions[row]
+            rules, rule_counts = self._rules.lookup(key)
+            days, day_counts = self._daily.lookup(key)
+            day_index, slot = np.unique(days // 2, return_inverse=True)
+            activity = np.zeros((len(day_index), len(ACTIONS)), dtype=np.int64)
+            activity[slot, days % 2] = day_counts
+            daily = pd.DataFrame(activity, index=pd.to_datetime(day_index * DAY_SECONDS, unit="s"), columns=ACTIONS)
+            protocols = pd.Series(self._protos[row, :len(self.protocols)], index=self.protocols, name="Événements")
+            return {
+                "IP_Source": ip,
+                "Premier": pd.Timestamp(self._first[row], unit="s"),
+                "Dernier": pd.Timestamp(self._last[row], unit="s"),
+                "COUNT": int(actions.sum()),
+                "PERMIT": int(actions[ACTIONS.index("PERMIT")]),
+                "DENY": int(actions[ACTIONS.index("DENY")]),
+                "protocoles": protocols[protocols > 0].sort_values(ascending=False),
+                "top_portdst": self._top(*self._portdst.lookup(key)),
+                "top_portsrc": self._top(*self._portsrc.lookup(key)),
+                "regles": pd.Series(rule_counts, index=pd.Index(rules - 1, name="idregle"), name="Événements")
+                .sort_values(ascending=False),
+                "activite": daily,
+                "cluster": self._labels.get(key),
+            }
+
+    def time_range(self):
+        """Première et dernière apparition, toutes IP confondues ((None, None) sans profil)."""
+        with self._lock:
+            if not len(self._ips):
+                return None, None
+            return pd.Timestamp(self._first.min(), unit="s"), pd.Timestamp(self._last.max(), unit="s")
+
+    def table(self):
+        """Une ligne par IP source : totaux, part de DENY, règles distinctes, apparitions, cluster."""
+        with self._lock:
+            if self._table is None:
+                self._rules.merge()
+                count = self._actions.sum(axis=1)
+                label_index = self._labels.index.get_indexer(self._ips.astype(np.int64))
+                labels = np.append(self._labels.to_numpy(dtype=object), None)[label_index]
+                self._table = pd.DataFrame({
+                    "IP_Source": uint32_to_ip(self._ips),
+                    "COUNT": count,
+                    "PERMIT": self._actions[:, ACTIONS.index("PERMIT")],
+                    "DENY": self._actions[:, ACTIONS.index("DENY")],
+                    "Part_DENY": self._actions[:, ACTIONS.index("DENY")] / np.maximum(count, 1),
+                    "Nb_Regles": self._rules.distinct_per_ip(self._ips),
+                    "Premier": pd.to_datetime(self._first, unit="s"),
+                    "Dernier": pd.to_datetime(self._last, unit="s"),
+                    "Cluster": labels,
+                })
+            return self._table
+
+    def page(self, sort_by="COUNT", descending=True, page=0, page_size=50, ips=None):
+        """
+        Page de la liste des IP triée par `sort_by` (ordre de tri calculé une fois par mise à jour).
+
+        Args:
+            ips (iterable, optional): IP retenues (par exemple celles des filtres de la page).
+
+        Returns:
+            tuple: (DataFrame de la page, nombre total d'IP retenues).
+        """
+        with self._lock:
+            table = self.table()
+            if sort_by not in self._orders:
+                self._orders[sort_by] = np.argsort(table[sort_by].to_numpy(), kind="stable")
+            order = self._orders[sort_by]
+        if descending:
+            order = order[::-1]
+        if ips is not None:
+            keep = table["IP_Source"].isin(pd.Index(ips)).to_numpy()
+            order = order[keep[order]]
+        start = page * page_size
+        return table.iloc[order[start:start + page_size]].reset_index(drop=True), len(order)
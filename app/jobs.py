@@ -0,0 +1,463 @@
+"""
+File locale de tâches longues (exports, synthèse par IP, clustering, détection de scans).
+
+Les tâches s'exécutent dans des processus de travail (`ProcessPoolExecutor`), hors du fil du script
+Streamlit : une réexécution de la page ne les interrompt pas et la session reste utilisable. Chaque tâche
+dispose d'un dossier `JOBS_DIR/<id>/` contenant son état (`job.json` : statut, avancement, message,
+fichiers produits) et ses résultats, consultables plus tard depuis n'importe quelle session.
+
+L'identifiant est l'empreinte de la demande (type + paramètres) : une demande identique à une tâche en
+attente, en cours ou terminée renvoie cette tâche au lieu d'en lancer une nouvelle.
+"""
+import hashlib
+import json
+import multiprocessing
+import os
+import shutil
+import threading
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pandas as pd
+import streamlit as st
+
+JOBS_DIR = os.environ.get("JOBS_DIR", os.path.join(".cache", "jobs"))
+MAX_WORKERS = int(os.environ.get("JOB_WORKERS", 2))
+PROGRESS_INTERVAL = 0.5  # Secondes minimales entre deux écritures de l'avancement
+EXPORT_BATCH_SIZE = 10000
+
+STATUS_LABELS = {
+    "queued": "⏳ En attente",
+    "running": "⚙️ En cours",
+    "done": "✅ Terminée",
+    "failed": "❌ Échec",
+}
+ACTIVE = {"queued", "running"}
+
+
+def job_id(kind, params):
+    """Empreinte d'une demande : deux demandes identiques désignent la même tâche."""
+    payload = json.dumps([kind, params], sort_keys=True, default=str)
+    return hashlib.sha1(payload.encode()).hexdigest()[:16]
+
+
+def _state_file(directory, job):
+    return os.path.join(directory, job, "job.json")
+
+
+def read_state(directory, job):
+    """État d'une tâche (None si inconnue)."""
+    try:
+        with open(_state_file(directory, job)) as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return None
+
+
+def write_state(directory, job, **changes):
+    """Met à jour l'état d'une tâche (écriture atomique, lisible à tout moment par l'interface)."""
+    state = read_state(directory, job) or {}
+    state.update(changes)
+    path = _state_file(directory, job)
+    tmp = f"{path}.{os.getpid()}.tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f, default=str)
+    os.replace(tmp, path)
+    return state
+
+
+class Progress:
+    """Avancement d'une tâche (ou d'une étape [start, end] de la tâche), écrit au plus toutes les `PROGRESS_INTERVAL` secondes."""
+
+    def __init__(self, directory, job, start=0.0, end=1.0, _last=None):
+        self.directory = directory
+        self.job = job
+        self.start, self.end = start, end
+        self._last = _last if _last is not None else [0.0]  # Partagé entre les étapes
+
+    def __call__(self, fraction, message=None, force=False):
+        now = time.monotonic()
+        if not force and now - self._last[0] < PROGRESS_INTERVAL:
+            return
+        self._last[0] = now
+        fraction = min(max(fraction, 0.0), 1.0)
+        changes = {"progress": self.start + (self.end - self.start) * fraction}
+        if message is not None:
+            changes["message"] = message
+        write_state(self.directory, self.job, **changes)
+
+    def span(self, start, end):
+        """Avancement d'une étape couvrant [start, end] de cet avancement."""
+        width = self.end - self.start
+        return Progress(self.directory, self.job, self.start + width * start, self.start + width * end, self._last)
+
+
+# ---------------------------------------------------------------------- Tâches (exécutées dans les processus de travail)
+
+def _count_events(query=None, index=None):
+    from utils import INDEX_NAME, get_es
+    body = {"size": 0, "track_total_hits": True, "query": query or {"match_all": {}}}
+    return get_es().search(index=index or INDEX_NAME, body=body)["hits"]["total"]["value"]
+
+
+def _stream_events(progress, fields=None, query=None, max_docs=None, message="Lecture des logs", start=None, end=None):
+    """
+    Lots d'événements de l'index (requête optionnelle, parcours par scroll), avec avancement. `start` /
+    `end` (bornes de la requête) limitent le parcours aux index journaliers de la période.
+    """
+    from utils import EVENT_FIELDS, NO_INDEX, get_es, index_for_range
+    index = index_for_range(start, end)
+    if index is NO_INDEX:
+        progress(1.0, f"{message} : aucun index sur la période", force=True)
+        return
+    es = get_es()
+    total = _count_events(query, index)
+    if max_docs:
+        total = min(total, max_docs)
+    body = {"query": query or {"match_all": {}}, "_source": fields or EVENT_FIELDS, "sort": ["_doc"]}
+    response = es.search(index=index, scroll="5m", size=EXPORT_BATCH_SIZE, body=body)
+    scroll_id = response["_scroll_id"]
+    seen = 0
+    try:
+        while response["hits"]["hits"] and (not max_docs or seen < max_docs):
+            hits = response["hits"]["hits"]
+            if max_docs:
+                hits = hits[:max_docs - seen]
+            seen += len(hits)
+            progress(seen / max(total, 1), f"{message} : {seen} / {total}")
+            yield pd.DataFrame([hit["_source"] for hit in hits])
+            response = es.scroll(scroll_id=scroll_id, scroll="5m")
+    finally:
+        es.clear_scroll(scroll_id=scroll_id)
+
+
+def export_logs(params, out_dir, progress):
+    """Export CSV des logs (requête Elasticsearch, période et étiquettes d'IP sources optionnelles)."""
+    from cidr_tags import tag_values_mask
+    path = os.path.join(out_dir, "logs.csv")
+    rows = 0
+    with open(path, "w", newline="") as f:
+        for batch in _stream_events(progress, query=params.get("query"), max_docs=params.get("max_docs"),
+                                    start=params.get("start"), end=params.get("end")):
+            if params.get("tags"):
+                batch = batch[tag_values_mask(batch["ipsrc"], params["tags"])]
+            batch.to_csv(f, index=False, header=rows == 0)
+            rows += len(batch)
+    return {"logs.csv": rows}
+
+
+def _temporal_features(progress):
+    from events import to_event_columns
+    from features import FeatureAccumulator
+    accumulator = FeatureAccumulator()
+    for batch in _stream_events(progress, fields=FeatureAccumulator.FIELDS, message="Caractéristiques temporelles"):
+        accumulator.update(to_event_columns(batch))
+    return accumulator.features()
+
+
+def _ip_table(progress):
+    from utils import permit_deny_by_ip
+    progress(0.0, "Agrégation par IP source", force=True)
+    df = permit_deny_by_ip()
+    temporal = _temporal_features(progress.span(0.2, 1.0))
+    return df.merge(temporal, left_on="IP_Source", right_index=True, how="left")
+
+
+def ip_summary(params, out_dir, progress):
+    """Table par IP source : compteurs PERMIT / DENY, ports, caractéristiques temporelles."""
+    df = _ip_table(progress)
+    df.to_csv(os.path.join(out_dir, "ip_summary.csv"), index=False)
+    return {"ip_summary.csv": len(df)}
+
+
+def clustering(params, out_dir, progress):
+    """
+    Sélection du modèle puis clustering KMeans de la table par IP (k de meilleure silhouette pour les
+    caractéristiques et la normalisation demandées).
+    """
+    from sklearn.cluster import KMeans
+    from model import DEFAULT_FEATURE_SET, FEATURE_SETS, label_clusters
+    from model_selection import DEFAULT_SCALER, best_config, make_scaler, select_model
+
+    df = _ip_table(progress.span(0.0, 0.6))
+    feature_sets = FEATURE_SETS
+    progress(0.6, "Sélection du modèle", force=True)
+    selection = select_model(df[feature_sets[DEFAULT_FEATURE_SET]].fillna(0), feature_sets)
+    best = best_config(selection, params.get("feature_set") or DEFAULT_FEATURE_SET, params.get("scaler") or DEFAULT_SCALER)
+    k = int(params.get("k") or best["k"])
+    progress(0.9, f"KMeans (k = {k}, {best['scaler']})", force=True)
+    X = make_scaler(best["scaler"]).fit_transform(df[feature_sets[best["feature_set"]]].fillna(0))
+    df["Cluster"] = KMeans(n_clusters=k, random_state=42, n_init=10).fit_predict(X)
+    df["Cluster_str"] = label_clusters(df["Cluster"])
+    df.to_csv(os.path.join(out_dir, "clusters.csv"), index=False)
+    selection.to_csv(os.path.join(out_dir, "model_selection.csv"), index=False)
+    return {"clusters.csv": len(df), "model_selection.csv": len(selection)}
+
+
+def scan_detection(params, out_dir, progress):
+    """Épisodes de scans de ports et de balayages d'hôtes sur tout l'historique."""
+    from events import to_event_columns
+    from scan_detection import ScanDetector
+    detector = ScanDetector()
+    fields = ["timestamp", "ipsrc", "ipdst", "portdst", "action"]
+    for batch in _stream_events(progress, fields=fields, message="Détection des scans"):
+        detector.update(to_event_columns(batch))
+    detector.flush()
+    episodes = detector.episodes()
+    episodes.to_csv(os.path.join(out_dir, "scan_episodes.csv"), index=False)
+    return {"scan_episodes.csv": len(episodes)}
+
+
+def rule_simulation(params, out_dir, progress):
+    """Rejoue un jeu de règles proposé (CSV) sur l'historique : flux dont le verdict changerait."""
+    import io
+    from events import to_event_columns
+    from rule_simulation import Simulation, load_ruleset
+    ruleset = load_ruleset(io.StringIO(params["rules_csv"]), params.get("default_action", "DENY"))
+    simulation = Simulation(ruleset)
+    for batch in _stream_events(progress, fields=Simulation.FIELDS, max_docs=params.get("max_docs"),
+                                message="Simulation des règles"):
+        simulation.update(to_event_columns(batch))
+    artifacts = {}
+    for name, frame in [("by_rule.csv", simulation.by_rule()), ("by_idregle.csv", simulation.by_idregle()),
+                        ("samples.csv", simulation.samples())]:
+        frame.to_csv(os.path.join(out_dir, name), index=False)
+        artifacts[name] = len(frame)
+    return artifacts
+
+
+TASKS = {
+    "export_logs": ("📄 Export des logs", export_logs),
+    "ip_summary": ("📊 Synthèse par IP", ip_summary),
+    "clustering": ("🕸️ Clustering des IP", clustering),
+    "scan_detection": ("🚨 Détection de scans", scan_detection),
+    "rule_simulation": ("🧪 Simulation de règles", rule_simulation),
+}
+
+
+def _run(directory, job):
+    """Point d'entrée d'un processus de travail : exécute la tâche et consigne son résultat."""
+    state = write_state(directory, job, status="running", started=time.time(), pid=os.getpid())
+    progress = Progress(directory, job)
+    try:
+        artifacts = TASKS[state["kind"]][1](state["params"], os.path.join(directory, job), progress)
+    except Exception as e:
+        traceback.print_exc()
+        write_state(directory, job, status="failed", finished=time.time(), error=f"{type(e).__name__}: {e}")
+        return
+    write_state(directory, job, status="done", finished=time.time(), progress=1.0, message="Terminée",
+                artifacts=artifacts)
+    print(f"✅ Tâche {job} ({state['kind']}) terminée : {artifacts}")
+
+
+# ---------------------------------------------------------------------- File de tâches
+
+class JobQueue:
+    """File de tâches du serveur : processus de travail, déduplication et états sur disque."""
+
+    def __init__(self, directory=JOBS_DIR, max_workers=MAX_WORKERS):
+        self.directory = directory
+        self.max_workers = max_workers
+        self._pool = None
+        self._lock = threading.RLock()  # Réentrant : un rappel de fin peut s'exécuter dans `submit`
+        os.makedirs(directory, exist_ok=True)
+        # Tâches laissées en attente ou en cours par un serveur précédent : leurs processus n'existent plus
+        for state in self.jobs():
+            if state["status"] in ACTIVE:
+                write_state(directory, state["id"], status="failed", finished=time.time(),
+                            error="Interrompue (redémarrage du serveur)")
+
+    def submit(self, kind, params=None):
+        """
+        Lance une tâche, ou renvoie la tâche identique déjà en attente, en cours ou terminée.
+
+        Returns:
+            tuple: (identifiant, True si une nouvelle tâche a été lancée).
+        """
+        if kind not in TASKS:
+            raise ValueError(f"Tâche inconnue : {kind}")
+        params = params or {}
+        job = job_id(kind, params)
+        with self._lock:
+            state = read_state(self.directory, job)
+            if state is not None and state["status"] != "failed":
+                return job, False
+            shutil.rmtree(os.path.join(self.directory, job), ignore_errors=True)
+            os.makedirs(os.path.join(self.directory, job))
+            write_state(self.directory, job, id=job, kind=kind, params=params, status="queued",
+                        created=time.time(), progress=0.0, message="En attente d'un processus")
+            pool = self._executor()
+            try:
+                future = pool.submit(_run, self.directory, job)
+            except BrokenProcessPool:
+                self._pool = None  # Un processus de travail est mort : nouvel ensemble de processus
+                pool = self._executor()
+                future = pool.submit(_run, self.directory, job)
+            future.add_done_callback(lambda future: self._on_done(job, future, pool))
+        print(f"✅ Tâche {job} ({kind}) ajoutée à la file.")
+        return job, True
+
+    def _executor(self):
+        if self._pool is None:
+            # Processus lancés par « spawn » : un fork du serveur copierait ses threads et leurs verrous
+            self._pool = ProcessPoolExecutor(max_workers=self.max_workers,
+                                             mp_context=multiprocessing.get_context("spawn"))
+        return self._pool
+
+    def _on_done(self, job, future, pool):
+        """
+        Consigne l'échec d'une tâche que `_run` n'a pas pu consigner (processus de travail tué,
+        paramètres non transmissibles) ; un ensemble de processus cassé est remplacé à la demande suivante.
+        """
+        error = future.exception() if not future.cancelled() else None
+        if not future.cancelled() and error is None:
+            return
+        with self._lock:
+            if isinstance(error, BrokenProcessPool) and self._pool is pool:
+                self._pool = None
+            state = read_state(self.directory, job)
+            if state is not None and state["status"] in ACTIVE:
+                message = f"{type(error).__name__}: {error}" if error is not None else "Annulée"
+                write_state(self.directory, job, status="failed", finished=time.time(), error=message)
+        print(f"❌ Tâche {job} interrompue : {error}")
+
+    def get(self, job):
+        return read_state(self.directory, job)
+
+    def jobs(self):
+        """États de toutes les tâches, de la plus récente à la plus ancienne."""
+        states = []
+        for job in os.listdir(self.directory):
+            state = read_state(self.directory, job)
+            if state is not None:
+                states.append(state)
+        return sorted(states, key=lambda state: state.get("created", 0), reverse=True)
+
+    def remove(self, job):
+        """Supprime une tâche terminée ou en échec et ses fichiers."""
+        state = read_state(self.directory, job)
+        if state is not None and state["status"] not in ACTIVE:
+            shutil.rmtree(os.path.join(self.directory, job), ignore_errors=True)
+
+    def artifact_path(self, job, name):
+        return os.path.join(self.directory, job, name)
+
+    def latest_artifact(self, kind, name):
+        """Chemin du fichier `name` de la dernière tâche `kind` terminée (None si aucune)."""
+        for state in self.jobs():
+            if state["kind"] == kind and state["status"] == "done" and name in state.get("artifacts", {}):
+                return self.artifact_path(state["id"], name)
+        return None
+
+
+def eta(state, now=None):
+    """Temps restant estimé (s) d'après l'avancement et la durée écoulée (None si inconnu)."""
+    if state["status"] != "running" or not state.get("started"):
+        return None
+    fraction = state.get("progress") or 0.0
+    if fraction <= 0:
+        return None
+    elapsed = (now or time.time()) - state["started"]
+    return elapsed * (1 - fraction) / fraction
+
+
+def _format_seconds(seconds):
+    seconds = int(round(seconds))
+    if seconds < 60:
+        return f"{seconds} s"
+    if seconds < 3600:
+        return f"{seconds // 60} min {seconds % 60:02d} s"
+    return f"{seconds // 3600} h {seconds % 3600 // 60:02d} min"
+
+
+# ---------------------------------------------------------------------- Interface
+
+@st.cache_resource
+def get_queue():
+    # Une seule file (et un seul ensemble de processus) par serveur
+    return JobQueue()
+
+
+def submit_button(label, kind, params=None, key=None):
+    """Bouton de lancement d'une tâche de fond, avec rappel de la page « 📦 Tâches »."""
+    if st.button(label, key=key):
+        job, created = get_queue().submit(kind, params)
+        if created:
+            st.success(f"Tâche {job} lancée : suivi et résultats dans la page « 📦 Tâches ».")
+        else:
+            st.info(f"Demande identique à la tâche {job} : suivi et résultats dans la page « 📦 Tâches ».")
+
+
+def _show_job(queue, state):
+    label = TASKS.get(state["kind"], (state["kind"],))[0]
+    created = pd.Timestamp(state["created"], unit="s").strftime("%Y-%m-%d %H:%M")
+    with st.container(border=True):
+        st.markdown(f"**{label}** · {STATUS_LABELS.get(state['status'], state['status'])} · {created} · `{state['id']}`")
+        if state["params"]:
+            st.caption(json.dumps(state["params"], ensure_ascii=False, default=str)[:300])
+        if state["status"] in ACTIVE:
+            remaining = eta(state)
+            text = state.get("message") or ""
+            if remaining is not None:
+                text += f" — reste environ {_format_seconds(remaining)}"
+            st.progress(state.get("progress") or 0.0, text=text)
+        elif state["status"] == "failed":
+            st.error(state.get("error", "Échec"))
+        else:
+            duration = state.get("finished", 0) - state.get("started", 0)
+            st.caption(f"Durée : {_format_seconds(max(duration, 0))}")
+            columns = st.columns(len(state.get("artifacts", {})) + 1)
+            for column, (name, rows) in zip(columns, state.get("artifacts", {}).items()):
+                path = queue.artifact_path(state["id"], name)
+                if os.path.exists(path):
+                    with open(path, "rb") as f:
+                        column.download_button(f"⬇️ {name} ({rows} lignes, {os.path.getsize(path) / 2**20:.1f} Mo)",
+                                               f.read(), file_name=name, mime="text/csv", key=f"job_{state['id']}_{name}")
+            if columns[-1].button("🗑️ Supprimer", key=f"job_{state['id']}_remove"):
+                queue.remove(state["id"])
+                st.rerun()
+
+
+def _show_job_list():
+    queue = get_queue()
+    states = queue.jobs()
+    if not states:
+        st.info("Aucune tâche.")
+    for state in states:
+        _show_job(queue, state)
+
+
+def show_jobs():
+    """Page « 📦 Tâches » : lancement des traitements longs, avancement et résultats."""
+    st.markdown("### 📦 Tâches en arrière-plan")
+    st.caption("Les traitements longs s'exécutent hors de la page : ils se poursuivent après un changement "
+               "de filtre ou de page, et leurs résultats restent téléchargeables ici.")
+
+    with st.expander("➕ Nouvelle tâche", expanded=False):
+        kind = st.selectbox("Traitement", list(TASKS), format_func=lambda kind: TASKS[kind][0], key="jobs_kind")
+        params = {}
+        if kind == "export_logs":
+            limit = st.number_input("Nombre maximal de logs (0 = tous)", min_value=0, value=0, step=100000,
+                                    key="jobs_max_docs")
+            params = {"max_docs": int(limit) or None}
+            if st.session_state.get("ip_tags"):
+                params["tags"] = sorted(st.session_state["ip_tags"])
+        elif kind == "clustering":
+            k = st.number_input("Nombre de clusters (0 = meilleure silhouette)", min_value=0, max_value=10, value=0,
+                                key="jobs_k")
+            params = {"k": int(k) or None}
+        if kind == "rule_simulation":
+            # Le jeu de règles se téléverse depuis le dashboard, où les résultats s'affichent aussi
+            st.caption("À lancer depuis l'onglet « 📜 Règles » du dashboard (jeu de règles à téléverser).")
+        else:
+            submit_button("🚀 Lancer", kind, params, key="jobs_submit")
+
+    # Liste réactualisée toutes les 2 s sans réexécuter la page entière
+    fragment = getattr(st, "fragment", None)
+    if fragment is not None:
+        fragment(run_every=2)(_show_job_list)()
+    else:
+        st.button("🔄 Actualiser")
+        _show_job_list()
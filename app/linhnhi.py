@@ -1,22 +1,131 @@
 import streamlit as st
 import pandas as pd
-from elasticsearch import Elasticsearch
 import plotly.express as px
 import datetime
 
+import filters
+import metrics
+from cidr_tags import apply_tag_filter, get_tagger
+from filters import And, Cidr, OneOf, Or, TimeRange
+from time_index import TimeIndex, sort_by_time
+from utils import INDEX_NAME, NO_INDEX, get_es, index_for_range
+
+ADMIN_PORTS = [21, 22, 23, 3306, 3389]
+TOP_N = 5
+
+# Une agrégation par panneau, toutes envoyées dans une seule requête
+PANEL_AGGS = {
+    "proto_all": {"terms": {"field": "proto.keyword", "size": 20}},
+    "deny": {
+        "filter": {"term": {"action.keyword": "DENY"}},
+        "aggs": {
+            "proto": {"terms": {"field": "proto.keyword", "size": 20}},
+            "portdst": {"terms": {"field": "portdst.keyword", "size": TOP_N}},
+        },
+    },
+    "permit": {
+        "filter": {"term": {"action.keyword": "PERMIT"}},
+        "aggs": {
+            "proto": {"terms": {"field": "proto.keyword", "size": 20}},
+            "portdst": {"terms": {"field": "portdst.keyword", "size": TOP_N}},
+        },
+    },
+    "top_ipdst": {"terms": {"field": "ipdst.keyword", "size": TOP_N}},
+    "top_ipsrc": {"terms": {"field": "ipsrc.keyword", "size": TOP_N}},
+    "admin": {
+        "filter": {"terms": {"portdst.keyword": [str(port) for port in ADMIN_PORTS]}},
+        "aggs": {
+            "ipdst": {"terms": {"field": "ipdst.keyword", "size": TOP_N}},
+            "permit": {
+                "filter": {"term": {"action.keyword": "PERMIT"}},
+                "aggs": {"ipsrc": {"terms": {"field": "ipsrc.keyword", "size": TOP_N}}},
+            },
+        },
+    },
+}
+
 # Fonction pour charger les données depuis Elasticsearch avec mise en cache
-@st.cache_data
+@metrics.cache_data("linhnhi.load_data")
 def load_data():
-    # es = Elasticsearch("http://localhost:9200")
-    es = Elasticsearch("http://elasticsearch:9200")
+    es = get_es()
     response = es.search(index="application-logs", size=5000, body={"query": {"match_all": {}}})
     logs = [hit["_source"] for hit in response["hits"]["hits"]]
-    return pd.DataFrame(logs)
+    if not logs:
+        return pd.DataFrame(logs)
+    return sort_by_time(pd.DataFrame(logs))[0]  # Trié par horodatage (voir time_index)
+
+@metrics.cache_data("linhnhi.load_time_bounds", ttl=300)
+def load_time_bounds():
+    """Premier et dernier horodatage de l'index entier."""
+    body = {"size": 0, "aggs": {"first": {"min": {"field": "@timestamp"}}, "last": {"max": {"field": "@timestamp"}}}}
+    aggregations = get_es().search(index=INDEX_NAME, body=body)["aggregations"]
+    if aggregations["first"]["value"] is None:
+        return None, None
+    return (pd.to_datetime(aggregations["first"]["value"], unit="ms"),
+            pd.to_datetime(aggregations["last"]["value"], unit="ms"))
+
+def _buckets(aggregation):
+    """Buckets d'une agrégation terms en série (clé -> nombre de documents)."""
+    buckets = aggregation["buckets"]
+    return pd.Series([b["doc_count"] for b in buckets], index=[str(b["key"]) for b in buckets], dtype="int64")
+
+def _empty_aggregations(aggs):
+    """Réponse vide de même forme que les agrégations `aggs` (période sans index journalier)."""
+    return {name: {"buckets": [], **_empty_aggregations(spec.get("aggs", {}))} for name, spec in aggs.items()}
+
+@metrics.cache_data("linhnhi.load_panels", ttl=300)
+def load_panels(query=None, index=INDEX_NAME):
+    """
+    Comptes exacts de tous les panneaux de la page sur l'index entier (restreint par `query`,
+    voir `filters.Filter.to_query`), en une seule requête d'agrégation. `index` limite la recherche
+    aux index journaliers de la période (voir `utils.index_for_range`).
+    """
+    body = {"size": 0, "query": query or {"match_all": {}}, "aggs": PANEL_AGGS}
+    if index is NO_INDEX:
+        aggs = _empty_aggregations(PANEL_AGGS)
+    else:
+        aggs = get_es().search(index=index, body=body)["aggregations"]
+    return {
+        "proto_all": _buckets(aggs["proto_all"]),
+        "proto_deny": _buckets(aggs["deny"]["proto"]),
+        "proto_permit": _buckets(aggs["permit"]["proto"]),
+        "top_ipdst": _buckets(aggs["top_ipdst"]),
+        "top_ipsrc": _buckets(aggs["top_ipsrc"]),
+        "top_portdst_permit": _buckets(aggs["permit"]["portdst"]),
+        "top_portdst_deny": _buckets(aggs["deny"]["portdst"]),
+        "admin_ipsrc": _buckets(aggs["admin"]["permit"]["ipsrc"]),
+        "admin_ipdst": _buckets(aggs["admin"]["ipdst"]),
+    }
+
+def show_top_table(counts, columns, header_fill, cell_fill, header_font=None):
+    """Tableau Plotly d'un top (clé, nombre d'occurrences)."""
+    import plotly.graph_objects as go
+    fig = go.Figure(data=[go.Table(
+        header=dict(values=columns,
+                    fill_color=header_fill,
+                    align='center',
+                    font=header_font or dict(size=14)),
+        cells=dict(values=[counts.index.tolist(), counts.tolist()],
+                   fill_color=cell_fill,
+                   align='center',
+                   font=dict(color='black', size=13))
+    )])
+    st.plotly_chart(fig, use_container_width=True)
+
+def show_proto_bar(counts, label, key, color=None):
+    fig = px.bar(x=counts.index, y=counts.values, text_auto=True,
+                 labels={'x': 'Protocole', 'y': label},
+                 color_discrete_sequence=[color] if color else None)
+    st.plotly_chart(fig, use_container_width=True, key=key)
 
 def show_linhnhi():
     st.markdown("<h2 style='text-align: center;'>🔍 Analyse Linh Nhi - Filtres interactifs</h2>", unsafe_allow_html=True)
 
     df = load_data()
+    df = apply_tag_filter(df, "ipsrc", st.session_state.get("ip_tags"))
+    if df.empty:
+        st.warning("Aucun log ne correspond aux étiquettes sélectionnées.")
+        return
 
     # Sélection des colonnes à afficher
     colonnes_a_afficher = ['ipsrc', 'ipdst', 'portsrc', 'portdst', 'proto', 'action', 'timestamp', 'idregle', 'interfaceint']
@@ -24,6 +133,7 @@ def show_linhnhi():
 
     # Convertir timestamp en datetime
     df['timestamp'] = pd.to_datetime(df['timestamp'], errors='coerce')
+    times = TimeIndex.from_series(df['timestamp'])
 
     # 🔹 **Filtres interactifs organisés proprement**
     with st.expander("🎛️ **Filtres avancés**", expanded=True):
@@ -60,7 +170,11 @@ def show_linhnhi():
         col6, col7, col8, col9 = st.columns(4)
 
         with col6:
-            min_date, max_date = df['timestamp'].min().date(), df['timestamp'].max().date()
+            # Bornes de l'index entier (et non de l'échantillon affiché)
+            first, last = load_time_bounds()
+            if first is None:
+                first, last = times.start, times.end
+            min_date, max_date = first.date(), last.date()
             selected_start_date = st.date_input("📆 Date de début", min_date, min_value=min_date, max_value=max_date)
 
         with col7:
@@ -72,26 +186,23 @@ def show_linhnhi():
         with col9:
             selected_end_time = st.time_input("🕘 Heure de fin", datetime.time(23, 59))
 
-    # 🔹 **Appliquer les filtres**
-    df_filtered = df[df['proto'].isin(selected_protos)]
+    # Convertir les sélections de date et heure en `datetime`
+    start_datetime = datetime.datetime.combine(selected_start_date, selected_start_time)
+    end_datetime = datetime.datetime.combine(selected_end_date, selected_end_time)
+    period = TimeRange(start_datetime, end_datetime)
 
+    # 🔹 **Appliquer les filtres** (un seul masque, voir filters)
+    df_period = df.iloc[times.window(start_datetime, end_datetime)]  # Tranche sans copie, O(log n)
+    clauses = [OneOf('proto', selected_protos)]
     if selected_action != "Tous":
-        df_filtered = df_filtered[df_filtered['action'] == selected_action]
-
+        clauses.append(OneOf('action', [selected_action]))
     if selected_interface != "Tous":
-        df_filtered = df_filtered[df_filtered['interfaceint'] == selected_interface]
-
+        clauses.append(OneOf('interfaceint', [selected_interface]))
     if portsrc_input:
-        df_filtered = df_filtered[df_filtered['portsrc'] == int(portsrc_input)]
-
+        clauses.append(OneOf('portsrc', [int(portsrc_input)]))
     if portdst_input:
-        df_filtered = df_filtered[df_filtered['portdst'] == int(portdst_input)]
-
-    # Convertir les sélections de date et heure en `datetime`
-    start_datetime = datetime.datetime.combine(selected_start_date, selected_start_time)
-    end_datetime = datetime.datetime.combine(selected_end_date, selected_end_time)
-
-    df_filtered = df_filtered[(df_filtered['timestamp'] >= start_datetime) & (df_filtered['timestamp'] <= end_datetime)]
+        clauses.append(OneOf('portdst', [int(portdst_input)]))
+    df_filtered = filters.apply(df_period, And(*clauses))
 
     # 📌 **Pagination**
     page_size = 50
@@ -99,7 +210,8 @@ def show_linhnhi():
 
     col1, col2 = st.columns([3, 1])
     with col1:
-        page = st.slider("📄 Sélectionner la page", min_value=1, max_value=total_pages, value=1)
+        # Un slider exige min_value < max_value
+        page = st.slider("📄 Sélectionner la page", min_value=1, max_value=total_pages, value=1) if total_pages > 1 else 1
 
     # Calcul des indices pour afficher les données
     start = (page - 1) * page_size
@@ -128,167 +240,51 @@ def show_linhnhi():
 
 
 
+    # 🔹 **Panneaux agrégés** : index entier sur la période choisie, restreint aux IP sources des
+    # étiquettes sélectionnées (préfixes `prefix` / `terms` sur le champ keyword, voir filters.Cidr)
+    selection = period
+    if st.session_state.get("ip_tags"):
+        tagger = get_tagger()
+        selection = And(period, Or(*(Cidr('ipsrc', intervals=tagger.intervals(tag))
+                                     for tag in sorted(st.session_state["ip_tags"]) if tag in tagger.tags)))
+    panels = load_panels(selection.to_query(), index_for_range(period.start, period.end))
+
     # Histogramme global des protocoles
     st.subheader("Distribution des protocoles (tous flux)")
-    fig_proto = px.histogram(df, x='proto',
-                             labels={'proto': 'Protocole', 'count': 'Nombre d’occurrences'},
-                             text_auto=True)
-    st.plotly_chart(fig_proto, use_container_width=True, key="proto_all")
+    show_proto_bar(panels["proto_all"], 'Nombre d’occurrences', key="proto_all")
 
     # Histogramme des flux rejetés
-    df_deny = df[df['action'] == 'DENY']
-
-    if not df_deny.empty:
+    if not panels["proto_deny"].empty:
         st.subheader("Protocoles des flux rejetés")
-        fig_deny = px.histogram(df_deny, x='proto',
-                                labels={'proto': 'Protocole', 'count': 'Nombre de rejets'},
-                                color_discrete_sequence=['#EF553B'],
-                                text_auto=True)
-        st.plotly_chart(fig_deny, use_container_width=True, key="proto_deny_hist")
+        show_proto_bar(panels["proto_deny"], 'Nombre de rejets', key="proto_deny_hist", color='#EF553B')
     else:
         st.info("Aucun flux rejeté trouvé.")
 
     # Histogramme des flux acceptés
-    df_permit = df[df['action'] == 'PERMIT']
-
-    if not df_permit.empty:
+    if not panels["proto_permit"].empty:
         st.subheader("Protocoles des flux acceptés")
-        fig_permit = px.histogram(df_permit, x='proto',
-                                  labels={'proto': 'Protocole', 'count': 'Nombre d’occurrences'},
-                                  text_auto=True)
-        st.plotly_chart(fig_permit, use_container_width=True, key="proto_permit_hist")
+        show_proto_bar(panels["proto_permit"], 'Nombre d’occurrences', key="proto_permit_hist")
     else:
         st.info("Aucun flux accepté trouvé.")
 
-
-    import plotly.graph_objects as go
-
-    # Sélection des 5 IP les plus fréquentes
-    top_ipdst = df['ipdst'].value_counts().head(5).reset_index()
-    top_ipdst.columns = ['IP Destination', 'Nombre d’occurrences']
-
-    # Création du tableau Plotly
-    fig = go.Figure(data=[go.Table(
-        header=dict(
-            values=['IP Destination', 'Nombre d’occurrences'],
-            fill_color='lightblue',
-            align='center',
-            font=dict(color='black', size=16)
-        ),
-        cells=dict(
-            values=[top_ipdst['IP Destination'], top_ipdst['Nombre d’occurrences']],
-            fill_color='lavender',
-            align='center',
-            font=dict(color='black', size=13)
-        )
-    )])
-
     st.subheader("Top 5 IP Destination les plus fréquentes")
-    st.plotly_chart(fig, use_container_width=True)
-
-
-    # Top 5 IP sources
-    top_ipsrc = df['ipsrc'].value_counts().head(5).reset_index()
-    top_ipsrc.columns = ['IP Source', 'Nombre d’occurrences']
-
-    fig_ipsrc = go.Figure(data=[go.Table(
-        header=dict(values=['IP Source', 'Nombre d’occurrences'],
-                    fill_color='paleturquoise',
-                    align='center',
-                    font=dict(size=14)),
-        cells=dict(values=[top_ipsrc['IP Source'], top_ipsrc['Nombre d’occurrences']],
-                fill_color='lavender',
-                align='center',
-                font=dict(color='black', size=13))
-    )])
+    show_top_table(panels["top_ipdst"], ['IP Destination', 'Nombre d’occurrences'], 'lightblue', 'lavender',
+                   header_font=dict(color='black', size=16))
 
     st.subheader("Top 5 IP Source les plus fréquentes")
-    st.plotly_chart(fig_ipsrc, use_container_width=True)
-
-
-    # Top 5 ports destination pour les flux acceptés (action != 'Deny')
-    df_permit = df[df['action'] =='PERMIT']
-
-    top_portsdst_permit = df_permit['portdst'].value_counts().head(5).reset_index()
-    top_portsdst_permit.columns = ['Port Destination', 'Nombre d’occurrences']
-
-    fig_portsdst = go.Figure(data=[go.Table(
-        header=dict(values=['Port Destination', 'Nombre d’occurrences'],
-                    fill_color='lightgreen',
-                    align='center',
-                    font=dict(size=14)),
-        cells=dict(values=[top_portsdst_permit['Port Destination'], top_portsdst_permit['Nombre d’occurrences']],
-                fill_color='mintcream',
-                align='center',
-                font=dict(color='black', size=13))
-    )])
+    show_top_table(panels["top_ipsrc"], ['IP Source', 'Nombre d’occurrences'], 'paleturquoise', 'lavender')
 
     st.subheader("Top 5 Ports Destination les plus utilisés (action = Permit)")
-    st.plotly_chart(fig_portsdst, use_container_width=True)
-
-
-    # Top 5 ports destination pour les flux rejetés (action == 'Deny')
-    df_deny = df[df['action'] == 'DENY']
-
-    top_portsdst_deny = df_deny['portdst'].value_counts().head(5).reset_index()
-    top_portsdst_deny.columns = ['Port Destination', 'Nombre d’occurrences']
-
-    fig_portsdst_deny = go.Figure(data=[go.Table(
-        header=dict(values=['Port Destination', 'Nombre d’occurrences'],
-                    fill_color='lightcoral',
-                    align='center',
-                    font=dict(size=14)),
-        cells=dict(values=[top_portsdst_deny['Port Destination'], top_portsdst_deny['Nombre d’occurrences']],
-                fill_color='mistyrose',
-                align='center',
-                font=dict(color='black', size=13))
-    )])
+    show_top_table(panels["top_portdst_permit"], ['Port Destination', 'Nombre d’occurrences'], 'lightgreen', 'mintcream')
 
     st.subheader("Top 5 Ports Destination les plus rejetés (action = Deny)")
-    st.plotly_chart(fig_portsdst_deny, use_container_width=True)
-
-    # Filtre sur les ports d'administration et action = Permit
-    admin_ports = [21, 22, 23, 3306, 3389]
-    df_admin_permit = df[(df['portdst'].isin(admin_ports)) & (df['action'] == 'PERMIT')]
-
-    # Top 5 IP sources utilisant les ports d'administration
-    top_admin_ipsrc = df_admin_permit['ipsrc'].value_counts().head(5).reset_index()
-    top_admin_ipsrc.columns = ['IP Source', 'Nombre d’utilisations']
-
-    fig_admin_ipsrc = go.Figure(data=[go.Table(
-        header=dict(values=['IP Source', 'Nombre d’utilisations'],
-                    fill_color='orange',
-                    align='center',
-                    font=dict(size=14)),
-        cells=dict(values=[top_admin_ipsrc['IP Source'], top_admin_ipsrc['Nombre d’utilisations']],
-                fill_color='floralwhite',
-                align='center',
-                font=dict(color='black', size=13))
-    )])
+    show_top_table(panels["top_portdst_deny"], ['Port Destination', 'Nombre d’occurrences'], 'lightcoral', 'mistyrose')
 
+    # Ports d'administration (ADMIN_PORTS) et action = Permit
     st.subheader("Top 5 IP sources utilisant les ports d'administration (Permit)")
-    st.plotly_chart(fig_admin_ipsrc, use_container_width=True)
-
-
-
-    # Filtre sur les ports d'administration (sans filtrer l'action)
-    admin_ports = [21, 22, 23, 3306, 3389]
-    df_admin_ipdst = df[df['portdst'].isin(admin_ports)]
-
-    # Top 5 IP destinations les plus sollicitées sur ces ports
-    top_admin_ipdst = df_admin_ipdst['ipdst'].value_counts().head(5).reset_index()
-    top_admin_ipdst.columns = ['IP Destination', 'Nombre de sollicitations']
-
-    fig_admin_ipdst = go.Figure(data=[go.Table(
-        header=dict(values=['IP Destination', 'Nombre de sollicitations'],
-                    fill_color='mediumorchid',
-                    align='center',
-                    font=dict(size=14, color='white')),
-        cells=dict(values=[top_admin_ipdst['IP Destination'], top_admin_ipdst['Nombre de sollicitations']],
-                fill_color='thistle',
-                align='center',
-                font=dict(color='black', size=13))
-    )])
+    show_top_table(panels["admin_ipsrc"], ['IP Source', 'Nombre d’utilisations'], 'orange', 'floralwhite')
 
+    # Ports d'administration, sans filtrer l'action
     st.subheader("Top 5 IP destination sollicitées sur les ports d'administration")
-    st.plotly_chart(fig_admin_ipdst, use_container_width=True)
+    show_top_table(panels["admin_ipdst"], ['IP Destination', 'Nombre de sollicitations'], 'mediumorchid', 'thistle',
+                   header_font=dict(size=14, color='white'))
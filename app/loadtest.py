@@ -0,0 +1,249 @@
+"""
+Test de charge : N sessions Streamlit simulées (API `streamlit.testing`) rejouent des scénarios
+d'interaction réalistes sur les pages, face au substitut en mémoire d'Elasticsearch.
+
+Rapport par page : latences de réexécution p50 / p95 / p99, requêtes envoyées au backend,
+mémoire résidente (RSS) du serveur.
+
+Exemple :
+    python loadtest.py --sessions 20 --rounds 5 --events 200000
+"""
+import argparse
+import os
+import resource
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+import numpy as np
+import pandas as pd
+from streamlit.testing.v1 import AppTest
+
+import synthetic_logs
+from benchmark import install_backend
+from fake_es import FakeElasticsearch
+
+PAGE_MODULES = ["dashboard", "explore_data", "model", "linhnhi"]
+
+
+# Scripts exécutés par chaque session (le code est extrait par AppTest : imports à l'intérieur)
+def dashboard_page():
+    import dashboard
+    dashboard.show_dashboard()
+
+
+def explore_data_page():
+    import explore_data
+    explore_data.show_data()
+
+
+def model_page():
+    import model
+    model.show_model()
+
+
+PAGES = {"dashboard": dashboard_page, "explore_data": explore_data_page, "model": model_page}
+
+
+class CountingBackend:
+    """
+    Enveloppe du backend qui compte les requêtes par page : la page est retrouvée
+    en remontant la pile d'appels jusqu'au module de page appelant.
+    """
+
+    def __init__(self, es):
+        self._es = es
+        self.calls = Counter()
+        self._lock = threading.Lock()
+
+    def _page(self):
+        frame = sys._getframe(2)
+        while frame is not None:
+            module = frame.f_globals.get("__name__")
+            if module in PAGE_MODULES:
+                return module
+            frame = frame.f_back
+        return "autre"
+
+    def _count(self, method):
+        with self._lock:
+            self.calls[(self._page(), method)] += 1
+
+    def search(self, *args, **kwargs):
+        self._count("search")
+        return self._es.search(*args, **kwargs)
+
+    def scroll(self, *args, **kwargs):
+        self._count("scroll")
+        return self._es.scroll(*args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._es, name)
+
+
+def rss_mb():
+    """Mémoire résidente courante du processus (Mo)."""
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmRSS:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def _find(widgets, label):
+    """Premier widget dont le libellé contient `label` (None si absent)."""
+    return next((w for w in widgets if label in (w.label or "")), None)
+
+
+def _pick(rng, options, k=1):
+    options = list(options)
+    if not options:
+        return []
+    return [options[i] for i in rng.choice(len(options), size=min(k, len(options)), replace=False)]
+
+
+# Scénarios d'interaction : chaque étape modifie un widget, puis la page est réexécutée
+def _set_permit_range(at, rng):
+    slider = _find(at.slider, "Nombre de PERMIT")
+    if slider is not None:
+        high = int(slider.max)
+        slider.set_value((0, int(rng.integers(min(1, high), high + 1))))
+
+
+def _set_protocols(at, rng):
+    widget = _find(at.multiselect, "Protocole")
+    if widget is not None:
+        widget.set_value(_pick(rng, widget.options, int(rng.integers(1, 3))))
+
+
+def _set_port_range(at, rng):
+    widget = _find(at.selectbox, "Plage de ports")
+    if widget is not None:
+        widget.select(_pick(rng, widget.options)[0])
+
+
+def _pick_ip(at, rng):
+    widget = _find(at.selectbox, "Sélectionnez une IP")
+    if widget is not None and widget.options:
+        widget.select(_pick(rng, widget.options[:200])[0])
+
+
+def _set_max_logs(at, rng):
+    slider = _find(at.slider, "Nombre de logs")
+    if slider is not None:
+        slider.set_value(int(rng.choice([10000, 20000, 50000])))
+
+
+def _set_actions(at, rng):
+    widget = _find(at.multiselect, "Action")
+    if widget is not None:
+        widget.set_value(_pick(rng, widget.options))
+
+
+def _pick_ipsrc(at, rng):
+    widget = _find(at.multiselect, "IP Source")
+    if widget is not None:
+        widget.set_value(_pick(rng, widget.options[1:200], int(rng.integers(1, 4))))
+
+
+def _set_k(at, rng):
+    widget = _find(at.select_slider, "Nombre de clusters")
+    if widget is not None:
+        widget.set_value(_pick(rng, widget.options)[0])
+
+
+def _set_pairplot(at, rng):
+    widget = _find(at.multiselect, "pairplot")
+    if widget is not None:
+        widget.set_value(_pick(rng, widget.options, 3))
+
+
+SCENARIOS = {
+    "dashboard": [_set_permit_range, _set_protocols, _set_port_range, _pick_ip],
+    "explore_data": [_set_max_logs, _set_protocols, _set_actions, _pick_ipsrc],
+    "model": [_set_k, _set_pairplot],
+}
+
+
+def run_session(page, rounds, seed, latencies, errors, timeout):
+    """Une session : premier affichage puis `rounds` passes sur le scénario de la page."""
+    rng = np.random.default_rng(seed)
+    at = AppTest.from_function(PAGES[page], default_timeout=timeout)
+    steps = [None] + SCENARIOS[page] * rounds
+    for step in steps:
+        try:
+            if step is not None:
+                step(at, rng)
+            start = time.perf_counter()
+            at.run()
+            latencies[page].append(time.perf_counter() - start)
+            for exception in at.exception:
+                errors[page].append(exception.message)
+        except Exception as e:
+            errors[page].append(repr(e))
+
+
+def run(n_sessions=10, rounds=3, n_events=200_000, pages=tuple(PAGES), timeout=600, seed=42):
+    """
+    Lance `n_sessions` sessions simulées réparties sur les pages, en parallèle.
+
+    Returns:
+        pd.DataFrame: Le rapport par page.
+    """
+    documents = synthetic_logs.SyntheticLogGenerator(seed=seed).documents(n_events)
+    backend = CountingBackend(FakeElasticsearch(documents))
+    install_backend(backend)
+
+    latencies, errors = defaultdict(list), defaultdict(list)
+    rss_start = rss_mb()
+    threads = [
+        threading.Thread(
+            target=run_session,
+            args=(pages[i % len(pages)], rounds, seed + i, latencies, errors, timeout),
+        )
+        for i in range(n_sessions)
+    ]
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+
+    rows = []
+    for page in pages:
+        values = np.array(latencies[page]) * 1000
+        rows.append({
+            "page": page,
+            "sessions": sum(1 for i in range(n_sessions) if pages[i % len(pages)] == page),
+            "réexécutions": len(values),
+            "erreurs": len(errors[page]),
+            "p50_ms": np.percentile(values, 50) if len(values) else np.nan,
+            "p95_ms": np.percentile(values, 95) if len(values) else np.nan,
+            "p99_ms": np.percentile(values, 99) if len(values) else np.nan,
+            "requêtes_search": backend.calls[(page, "search")],
+            "requêtes_scroll": backend.calls[(page, "scroll")],
+        })
+    report = pd.DataFrame(rows)
+    print(report.round(1).to_string(index=False))
+    for page in pages:
+        for message, count in Counter(errors[page]).most_common(3):
+            print(f"❌ {page} ({count}x) : {message[:200]}")
+    print(f"🧠 RSS serveur : {rss_start:.0f} Mo -> {rss_mb():.0f} Mo | durée totale {elapsed:.1f} s")
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Test de charge des pages Streamlit.")
+    parser.add_argument("--sessions", type=int, default=10, help="Nombre de sessions simultanées")
+    parser.add_argument("--rounds", type=int, default=3, help="Passes du scénario par session")
+    parser.add_argument("--events", type=int, default=200_000, help="Nombre d'événements synthétiques")
+    parser.add_argument("--pages", nargs="+", default=list(PAGES), choices=list(PAGES))
+    parser.add_argument("--timeout", type=float, default=600, help="Délai maximal d'une réexécution (s)")
+    args = parser.parse_args()
+    os.chdir(os.path.dirname(os.path.abspath(__file__)))
+    run(args.sessions, args.rounds, args.events, tuple(args.pages), args.timeout)
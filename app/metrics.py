@@ -0,0 +1,282 @@
+"""
+Instrumentation des accès aux données et des étapes lourdes des pages.
+
+Chaque mesure (durée, `took` Elasticsearch, hits / buckets renvoyés, taille de la réponse,
+succès ou échec du cache) est :
+- conservée en mémoire pour le panneau de diagnostic (`show_diagnostics_panel`) ;
+- cumulée dans des compteurs exportés au format texte Prometheus (`prometheus_text`) ;
+- écrite sous forme de ligne de log JSON (logger `perf`).
+"""
+import functools
+import json
+import logging
+import os
+import threading
+import time
+from collections import defaultdict, deque
+
+import pandas as pd
+
+import profiler
+
+MAX_RECORDS = 5000
+PROMETHEUS_TEXTFILE = os.environ.get("PROMETHEUS_TEXTFILE")  # Fichier pour le collecteur textfile de node_exporter
+TEXTFILE_INTERVAL = 10  # Secondes entre deux réécritures du fichier Prometheus
+LOG_LEVEL = os.environ.get("PERF_LOG_LEVEL", "INFO")  # WARNING pour couper les lignes de log
+
+logger = logging.getLogger("perf")
+if not logger.handlers:
+    _handler = logging.StreamHandler()
+    _handler.setFormatter(logging.Formatter("%(message)s"))
+    logger.addHandler(_handler)
+    logger.setLevel(LOG_LEVEL)
+    logger.propagate = False
+
+_records = deque(maxlen=MAX_RECORDS)
+_totals = defaultdict(float)  # (métrique, étiquettes) -> valeur cumulée
+_lock = threading.Lock()
+_local = threading.local()
+_last_textfile = 0.0
+
+
+def _stack():
+    if not hasattr(_local, "stack"):
+        _local.stack = []
+    return _local.stack
+
+
+def current_stage():
+    """Étape en cours dans le thread courant (pour rattacher les requêtes à leur étape)."""
+    stack = _stack()
+    return stack[-1]["stage"] if stack else "hors_étape"
+
+
+def record(kind, stage, seconds, **fields):
+    """Enregistre une mesure et met à jour les compteurs cumulés."""
+    entry = {"ts": time.time(), "kind": kind, "stage": stage, "seconds": round(seconds, 6), **fields}
+    with _lock:
+        _records.append(entry)
+        _totals[("app_stage_seconds_sum", kind, stage)] += seconds
+        _totals[("app_stage_seconds_count", kind, stage)] += 1
+        for field in ("took_ms", "hits", "buckets", "bytes"):
+            if fields.get(field) is not None:
+                _totals[(f"app_es_{field}_total", kind, stage)] += fields[field]
+        if fields.get("cache"):
+            _totals[(f"app_cache_{fields['cache']}_total", kind, stage)] += 1
+    logger.info(json.dumps(entry, ensure_ascii=False, default=str))
+    _maybe_write_textfile()
+
+
+class timed:
+    """
+    Mesure la durée d'un bloc ou d'une fonction (utilisable comme contexte ou décorateur).
+
+        with timed("dashboard.filtres"):
+            ...
+    """
+
+    def __init__(self, stage, kind="stage"):
+        self.stage = stage
+        self.kind = kind
+
+    def __enter__(self):
+        self.frame = {"stage": self.stage}
+        _stack().append(self.frame)
+        self.start = time.perf_counter()
+        return self.frame
+
+    def __exit__(self, exc_type, exc, tb):
+        seconds = time.perf_counter() - self.start
+        _stack().pop()
+        # Signale à un éventuel appelant mis en cache que la fonction a réellement été exécutée
+        for frame in _stack():
+            frame["executed"] = True
+        record(self.kind, self.stage, seconds, error=exc_type.__name__ if exc_type else None,
+               **{k: v for k, v in self.frame.items() if k not in ("stage", "executed")})
+        return False
+
+    def __call__(self, func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with timed(self.stage, self.kind):
+                return func(*args, **kwargs)
+        return wrapper
+
+
+instrument = timed
+
+
+def cache_data(stage, **cache_kwargs):
+    """
+    Équivalent de `st.cache_data` qui mesure chaque appel et indique s'il a été servi par le cache.
+    """
+    def decorator(func):
+        import streamlit as st  # Import différé : utils (et les tâches de fond) importent ce module sans Streamlit
+        cached = st.cache_data(**cache_kwargs)(timed(stage)(func))
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            probe = {"stage": f"{stage} (cache)"}
+            _stack().append(probe)
+            start = time.perf_counter()
+            try:
+                return cached(*args, **kwargs)
+            finally:
+                _stack().pop()
+                record("cache", stage, time.perf_counter() - start,
+                       cache="miss" if probe.get("executed") else "hit")
+
+        wrapper.clear = cached.clear
+        return wrapper
+    return decorator
+
+
+class Stopwatch:
+    """
+    Chronomètre à tours pour découper une page en étapes sans restructurer le code :
+
+        watch = Stopwatch("explore_data")
+        ...
+        watch.lap("chargement")
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.last = time.perf_counter()
+
+    def lap(self, step, **fields):
+        now = time.perf_counter()
+        record("stage", f"{self.page}.{step}", now - self.last, **fields)
+        self.last = now
+
+
+class InstrumentedElasticsearch:
+    """Enveloppe d'un client Elasticsearch qui mesure chaque requête."""
+
+    def __init__(self, client):
+        self._client = client
+
+    def _measure(self, method, *args, **kwargs):
+        start = time.perf_counter()
+        response = getattr(self._client, method)(*args, **kwargs)
+        seconds = time.perf_counter() - start
+        body = getattr(response, "body", response)
+        stage = current_stage()
+        record(
+            "es", stage, seconds,
+            method=method,
+            took_ms=body.get("took"),
+            hits=len(body.get("hits", {}).get("hits", [])),
+            buckets=_count_buckets(body.get("aggregations", {})),
+            bytes=_response_bytes(response, body),
+        )
+        profiler.maybe_profile(self._client, method, args, kwargs, seconds, stage, body.get("took"))
+        return response
+
+    def search(self, *args, **kwargs):
+        return self._measure("search", *args, **kwargs)
+
+    def scroll(self, *args, **kwargs):
+        return self._measure("scroll", *args, **kwargs)
+
+    def __getattr__(self, name):
+        return getattr(self._client, name)
+
+
+def _count_buckets(aggregations):
+    """Nombre total de buckets renvoyés par les agrégations de premier niveau."""
+    total = 0
+    for agg in aggregations.values():
+        buckets = agg.get("buckets") if isinstance(agg, dict) else None
+        if buckets is not None:
+            total += len(buckets)
+    return total
+
+
+def _response_bytes(response, body):
+    meta = getattr(response, "meta", None)
+    length = getattr(meta, "headers", {}).get("content-length") if meta is not None else None
+    if length is not None:
+        return int(length)
+    return len(json.dumps(body, default=str))
+
+
+def records():
+    """Mesures récentes sous forme de DataFrame."""
+    with _lock:
+        return pd.DataFrame(list(_records))
+
+
+def summary(frame=None):
+    """Agrège les mesures récentes par type et par étape."""
+    frame = records() if frame is None else frame
+    if frame.empty:
+        return frame
+    for column in ("took_ms", "hits", "buckets", "bytes", "cache"):
+        if column not in frame.columns:
+            frame[column] = None
+    grouped = frame.groupby(["kind", "stage"])
+    result = pd.DataFrame({
+        "appels": grouped.size(),
+        "total_s": grouped["seconds"].sum(),
+        "moyenne_ms": grouped["seconds"].mean() * 1000,
+        "p95_ms": grouped["seconds"].quantile(0.95) * 1000,
+        "es_took_ms": grouped["took_ms"].sum(min_count=1),
+        "hits": grouped["hits"].sum(min_count=1),
+        "buckets": grouped["buckets"].sum(min_count=1),
+        "octets": grouped["bytes"].sum(min_count=1),
+        "cache_hit_%": grouped["cache"].agg(
+            lambda c: 100 * (c == "hit").sum() / c.notna().sum() if c.notna().any() else None
+        ),
+    })
+    return result.sort_values("total_s", ascending=False).reset_index()
+
+
+def prometheus_text():
+    """Compteurs cumulés au format d'exposition texte de Prometheus."""
+    with _lock:
+        totals = dict(_totals)
+    lines = []
+    for metric in sorted({name for name, _, _ in totals}):
+        lines.append(f"# TYPE {metric} counter")
+        for (name, kind, stage), value in sorted(totals.items()):
+            if name == metric:
+                stage_label = stage.replace("\\", "\\\\").replace('"', '\\"')
+                lines.append(f'{name}{{kind="{kind}",stage="{stage_label}"}} {value:.15g}')
+    return "\n".join(lines) + "\n"
+
+
+def _maybe_write_textfile():
+    global _last_textfile
+    if not PROMETHEUS_TEXTFILE:
+        return
+    with _lock:  # Un seul thread réécrit le fichier par intervalle
+        if time.time() - _last_textfile < TEXTFILE_INTERVAL:
+            return
+        _last_textfile = time.time()
+    # Fichier temporaire propre au processus et au thread : plusieurs serveurs peuvent partager le chemin
+    tmp = f"{PROMETHEUS_TEXTFILE}.{os.getpid()}.{threading.get_ident()}.tmp"
+    try:
+        with open(tmp, "w") as f:
+            f.write(prometheus_text())
+        os.replace(tmp, PROMETHEUS_TEXTFILE)
+    except OSError as e:
+        # Une mesure ne doit jamais faire échouer la page qui l'enregistre
+        logger.warning(f"⚠️ Écriture de {PROMETHEUS_TEXTFILE} impossible : {e}")
+
+
+def show_diagnostics_panel():
+    """Panneau de diagnostic (à afficher dans la barre latérale)."""
+    import streamlit as st
+    st.subheader("🩺 Diagnostics")
+    frame = records()
+    if frame.empty:
+        st.info("Aucune mesure enregistrée.")
+    else:
+        st.dataframe(summary(frame).round(1), use_container_width=True, hide_index=True)
+        with st.expander("Dernières mesures"):
+            st.dataframe(frame.tail(50).iloc[::-1], use_container_width=True, hide_index=True)
+        st.download_button("📈 Métriques Prometheus", prometheus_text(), file_name="metrics.prom", mime="text/plain")
+    profiler.show_slow_queries()
+    from shared_store import show_stats  # Import différé : shared_store n'est utile qu'une fois des jeux publiés
+    show_stats()
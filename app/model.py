@@ -1,44 +1,122 @@
 import streamlit as st
 import pandas as pd
 import plotly.express as px
-from sklearn.cluster import KMeans
-from sklearn.preprocessing import StandardScaler
-from st_aggrid import AgGrid, GridOptionsBuilder
 import plotly.graph_objects as go
 
 
 # Importez vos fonctions depuis utils.py
-from utils import permit_deny_by_ip, get_one_ip_logs
+from utils import BackgroundCatchUp, permit_deny_by_ip, get_one_ip_logs
+from features import FeatureAccumulator, TEMPORAL_FEATURES
+from scan_detection import ScanDetector
+from plots import cluster_scatter, stratified_sample
+import metrics
+from cidr_tags import apply_tag_filter
 
-@st.cache_data(show_spinner=False)
+# scikit-learn et st_aggrid sont importés à la première utilisation (voir warmup.py)
+
+# Colonnes numériques à utiliser pour le clustering (table par IP de `permit_deny_by_ip`)
+COUNT_FEATURES = [
+    "COUNT", "PERMIT", "DENY", "PERMIT_TCP", "PERMIT_UDP",
+    "Nb_Port_Dest", "Nb_Port_Src", "Port_Dest_Well_Known",
+    "Port_Dest_Registered", "Port_Dest_Dynamic_Private"
+]
+# Jeux de caractéristiques évalués par la sélection du modèle (voir model_selection)
+FEATURE_SETS = {
+    "Compteurs": COUNT_FEATURES,
+    "Compteurs + temporel": COUNT_FEATURES + TEMPORAL_FEATURES,
+}
+DEFAULT_FEATURE_SET = "Compteurs + temporel"
+
+@metrics.cache_data("model.load_data", show_spinner=False)
 def load_data():
     # Chargement des données depuis Elasticsearch
     return permit_deny_by_ip()
 
-@st.cache_data(show_spinner=False)
-def compute_clusters(df, features, k = 2):
+@st.cache_resource(show_spinner=False)
+def get_feature_accumulator():
+    # Un seul moteur de caractéristiques partagé, complété au fil des nouveaux logs
+    return FeatureAccumulator()
+
+@st.cache_resource(show_spinner=False)
+def get_accumulators():
+    # Lecture de l'historique puis des nouveaux logs par les deux accumulateurs dans un thread du
+    # serveur, indépendante de celle du dashboard : la page lit l'état déjà construit sans attendre
+    return BackgroundCatchUp("model.accumulators", [get_feature_accumulator(), get_scan_detector()]).start()
+
+def show_catch_up_status():
+    """Avancement de la lecture des logs par les caractéristiques temporelles et la détection des scans."""
+    accumulators = get_accumulators()
+    if accumulators.error:
+        st.warning(f"⚠️ Dernière lecture des logs en échec : {accumulators.error}")
+    if accumulators.ready:
+        st.caption(accumulators.describe())
+    else:
+        st.info(accumulators.describe())
+
+@metrics.cache_data("model.load_temporal_features", show_spinner=False, ttl=300, max_entries=4)
+def load_temporal_features(updated):
+    # `updated` (fin de la dernière lecture complète) : les caractéristiques, et donc la sélection du
+    # modèle, ne changent qu'une fois par lecture et non à chaque lot intégré
+    return get_feature_accumulator().features()
+
+@st.cache_resource(show_spinner=False)
+def get_scan_detector():
+    # Détecteur partagé : l'historique n'est parcouru qu'une fois, puis seulement les nouveaux logs
+    return ScanDetector()
+
+@metrics.cache_data("model.load_scan_episodes", show_spinner=False, ttl=300, max_entries=4)
+def load_scan_episodes(version):
+    # `version` (lots déjà intégrés en arrière-plan) : les épisodes suivent l'avancée de la lecture
+    return get_scan_detector().episodes()
+
+@metrics.cache_data("model.run_model_selection", show_spinner=False)
+def run_model_selection(df, feature_sets):
+    # Évaluation parallèle de k / normalisation / caractéristiques, mise en cache sur disque
+    from model_selection import select_model
+    return select_model(df, feature_sets)
+
+@metrics.cache_data("model.compute_suspects", show_spinner=False)
+def compute_suspects(df, features, scaler, k):
+    # KMeans, Isolation Forest et z-score robuste exécutés en parallèle sur la même matrice
+    from detectors import score_detectors
+    return score_detectors(df, features, scaler, k)
+
+@metrics.cache_data("model.compute_clusters", show_spinner=False)
+def compute_clusters(df, features, k = 2, scaler = "standard"):
+    from sklearn.cluster import KMeans
+    from model_selection import make_scaler
     X = df[features].fillna(0)
-    scaler = StandardScaler()
-    X_scaled = scaler.fit_transform(X)
-    kmeans = KMeans(n_clusters=k, random_state=42)
+    X_scaled = make_scaler(scaler).fit_transform(X)
+    kmeans = KMeans(n_clusters=k, random_state=42, n_init=10)  # Mêmes initialisations que la sélection du modèle
     clusters = kmeans.fit_predict(X_scaled)
     return clusters, kmeans
 
 @st.cache_data(show_spinner=False)
-def sample_for_pairplot(df, max_rows=800000):
-    # Si le DataFrame est grand, on en prend un échantillon pour accélérer l'affichage
-    if len(df) > max_rows:
-        return df.sample(max_rows, random_state=42)
-    return df
+def sample_for_pairplot(df, max_rows=20000):
+    # Échantillon stratifié par cluster : le petit cluster "Attaque" n'est jamais écarté
+    return stratified_sample(df, "Cluster_str", max_rows)
 
 
 def configure_aggrid(df):
+    from st_aggrid import GridOptionsBuilder
     gb = GridOptionsBuilder.from_dataframe(df)
     gb.configure_pagination(enabled=True, paginationPageSize=10)
     gb.configure_side_bar()
     gb.configure_default_column(sortable=True, filterable=True)
     return gb.build()
 
+def label_clusters(clusters):
+    """
+    Nomme les clusters : le plus peuplé correspond aux utilisateurs normaux,
+    les autres aux comportements d'attaque (numérotés par taille décroissante si k > 2).
+    """
+    sizes = pd.Series(clusters).value_counts()
+    names = {sizes.index[0]: "Utilisateur normal"}
+    others = sizes.index[1:]
+    for rank, cluster in enumerate(others, start=1):
+        names[cluster] = "Attaque" if len(others) == 1 else f"Attaque {rank}"
+    return pd.Series(clusters).map(names).to_numpy()
+
 def create_cluster_summary(df):
     summary = df.groupby('Cluster_str').agg({
         'PERMIT': ['mean'],
@@ -70,31 +148,64 @@ def show_model():
     
     # Chargement des données (mise en cache)
     df = load_data()
+    df = apply_tag_filter(df, "IP_Source", st.session_state.get("ip_tags"))
     
     if df.empty:
         st.error("Aucune donnée récupérée depuis Elasticsearch.")
         return
     
-    tab1, tab2 = st.tabs(["📉 Clustering", "🖥️ Analyse détaillée"])
+    show_catch_up_status()
+    tab1, tab2, tab3, tab4 = st.tabs(["📉 Clustering", "🖥️ Analyse détaillée", "🚨 Scans", "🎯 Suspects"])
 
 
-    # Colonnes numériques à utiliser pour le clustering
-    features = [
-        "COUNT", "PERMIT", "DENY", "PERMIT_TCP", "PERMIT_UDP", 
-        "Nb_Port_Dest", "Nb_Port_Src", "Port_Dest_Well_Known", 
-        "Port_Dest_Registered", "Port_Dest_Dynamic_Private"
-    ]
+    # Caractéristiques temporelles par fenêtre (débit, rafales, IP destination distinctes, heures)
+    temporal = load_temporal_features(get_accumulators().updated)
+    df = df.merge(temporal, left_on="IP_Source", right_index=True, how="left")
+    feature_sets = FEATURE_SETS
 
-    # Choix du nombre de clusters
-    # k = st.number_input("Nombre de clusters", min_value=2, max_value=10, value=3, step=1)
+    # Sélection du modèle : toutes les configurations sont évaluées une fois puis mises en cache
+    with st.spinner("Sélection du nombre de clusters..."):
+        selection = run_model_selection(df[feature_sets[DEFAULT_FEATURE_SET]].fillna(0), feature_sets)
+    from model_selection import DEFAULT_SCALER, SCALERS, best_config
+
+    # Le nombre de clusters se choisit dans une configuration : les silhouettes de normalisations ou de
+    # caractéristiques différentes ne se comparent pas
+    col_features, col_scaler = st.columns(2)
+    with col_features:
+        feature_set = st.selectbox("Caractéristiques", list(feature_sets),
+                                   index=list(feature_sets).index(DEFAULT_FEATURE_SET), key="model_feature_set")
+    with col_scaler:
+        scaler = st.selectbox("Normalisation", SCALERS, index=SCALERS.index(DEFAULT_SCALER), key="model_scaler")
+    best = best_config(selection, feature_set, scaler)
+    features = feature_sets[feature_set]
+
+    # Choix du nombre de clusters, avec le score silhouette de chaque k déjà calculé
+    scores = selection[
+        (selection["feature_set"] == best["feature_set"]) & (selection["scaler"] == best["scaler"])
+    ].set_index("k")["silhouette"].sort_index()
+    k = st.select_slider(
+        "Nombre de clusters",
+        options=scores.index.tolist(),
+        value=best["k"],
+        format_func=lambda k: f"{k} (silhouette {scores[k]:.2f})",
+    )
+    with st.expander("📐 Sélection du modèle"):
+        st.caption(
+            f"Meilleur k pour {best['feature_set']}, normalisation {best['scaler']} : {best['k']} "
+            "(silhouettes comparables seulement au sein d'une même configuration)"
+        )
+        fig_selection = px.line(
+            selection.sort_values("k"), x="k", y="silhouette",
+            color="scaler", line_dash="feature_set", markers=True,
+            title="Score silhouette par configuration"
+        )
+        st.plotly_chart(fig_selection, use_container_width=True)
+        st.dataframe(selection, use_container_width=True)
     
     # Calcul des clusters (mise en cache)
-    clusters, _ = compute_clusters(df, features)
+    clusters, _ = compute_clusters(df, features, k, best["scaler"])
     df["Cluster"] = clusters  # Ajout des labels de clusters (entiers)
 
-    # Créer une version "texte" du cluster pour un affichage catégoriel
-    df["Cluster_str"] = df["Cluster"].apply(lambda x: f"Cluster {x}")
-
     # Vérifier l'existence de la colonne "IP_Source" pour les tooltips
     if "IP_Source" not in df.columns:
         st.warning("La colonne 'IP_Source' n'existe pas. Les IP ne seront pas affichées dans les tooltips.")
@@ -103,10 +214,7 @@ def show_model():
         hover_cols = ["IP_Source"]  # Liste des colonnes à afficher en tooltip
 
     # Mapper les clusters en "Attaque" et "Utilisateur normal"
-    df["Cluster_str"] = df["Cluster"].map({
-        0: "Utilisateur normal",  # Cluster 0 devient "Utilisateur normal"
-        1: "Attaque"              # Cluster 1 devient "Attaque"
-    })
+    df["Cluster_str"] = label_clusters(df["Cluster"])
 
     with tab1:
         # Affichage des résultats du clustering
@@ -118,7 +226,8 @@ def show_model():
         with plot_col:
             # ----------------- Visualisation : Scatter plot (exemple) -----------------
             # st.write("###Clustering des logs  PERMIT vs DENY")
-            fig_scatter = px.scatter(
+            # Rendu adapté au volume : SVG, WebGL puis carte de densité avec points atypiques
+            fig_scatter = cluster_scatter(
                 df,
                 x="PERMIT",
                 y="DENY",
@@ -129,8 +238,8 @@ def show_model():
                     "Attaque": "red",               # "Attaque" en rouge
                     "Utilisateur normal": "green"   # "Utilisateur normal" en vert
                 },
-                size_max=25,                        # Taille maximale des points
                 size="COUNT",                       # Utilisez une colonne numérique pour la taille des points (ex: "COUNT")
+                minority=[c for c in df["Cluster_str"].unique() if c != "Utilisateur normal"],
             )
             st.plotly_chart(fig_scatter)
 
@@ -193,4 +302,45 @@ def show_model():
                 color_discrete_sequence=px.colors.qualitative.Set2
             )
             st.plotly_chart(fig_pair)
- 
+
+    with tab3:
+        # ----------------- Détection des scans de ports et balayages d'hôtes -----------------
+        st.write("### Épisodes de scan détectés")
+        episodes = load_scan_episodes(get_accumulators().version)
+
+        if episodes.empty:
+            st.info("Aucun scan détecté.")
+        else:
+            col1, col2, col3 = st.columns(3)
+            col1.metric("Épisodes", len(episodes))
+            col2.metric("IP sources", episodes["IP_Source"].nunique())
+            col3.metric("Cibles touchées", int(episodes["Nb_Cibles"].sum()))
+
+            fig_scans = px.timeline(
+                episodes,
+                x_start="Début",
+                x_end="Fin",
+                y="IP_Source",
+                color="Type",
+                hover_data=["Nb_Cibles", "Nb_Ports", "Événements"],
+                title="Chronologie des scans"
+            )
+            st.plotly_chart(fig_scans, use_container_width=True)
+
+            st.dataframe(episodes, use_container_width=True)
+
+    with tab4:
+        # ----------------- Classement des IP suspectes (plusieurs détecteurs) -----------------
+        st.write("### Classement des IP suspectes")
+        with st.spinner("Calcul des scores d'anomalie..."):
+            suspects, timings = compute_suspects(df, features, best["scaler"], k)
+
+        from detectors import DETECTOR_LABELS
+        from st_aggrid import AgGrid
+        cols = st.columns(len(timings))
+        for col, (name, seconds) in zip(cols, timings.items()):
+            col.metric(DETECTOR_LABELS[name], f"{seconds:.2f} s")
+
+        top_n = st.slider("Nombre d'IP affichées", 10, 500, 50, step=10)
+        top_suspects = suspects.head(top_n).round(4)
+        AgGrid(top_suspects, gridOptions=configure_aggrid(top_suspects))
@@ -0,0 +1,135 @@
+import hashlib
+import json
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+import pandas as pd
+from sklearn.cluster import KMeans
+from sklearn.metrics import silhouette_score
+from sklearn.pipeline import make_pipeline
+from sklearn.preprocessing import FunctionTransformer, RobustScaler, StandardScaler
+
+CACHE_DIR = os.environ.get("MODEL_CACHE_DIR", os.path.join(".cache", "model_selection"))
+CACHE_MAX_FILES = 20  # Résultats conservés (les moins récemment utilisés sont supprimés au-delà)
+K_RANGE = range(2, 11)
+SILHOUETTE_SAMPLE = 10000  # Taille de l'échantillon pour le score silhouette (coût constant)
+
+
+def _signed_log1p(X):
+    # log1p symétrique : les caractéristiques négatives (Burstiness ∈ [-1, 1]) restent finies
+    return np.sign(X) * np.log1p(np.abs(X))
+
+
+def make_scaler(name):
+    """Construit la normalisation à appliquer avant le clustering."""
+    if name == "standard":
+        return StandardScaler()
+    if name == "robust":
+        return RobustScaler()
+    if name == "log_standard":
+        # Atténue la forte asymétrie des compteurs (COUNT, PERMIT, DENY...)
+        return make_pipeline(FunctionTransformer(_signed_log1p), StandardScaler())
+    raise ValueError(f"Normalisation inconnue : {name}")
+
+
+SCALERS = ["standard", "robust", "log_standard"]
+DEFAULT_SCALER = "standard"
+
+_matrices = {}  # Matrices des caractéristiques, transmises une seule fois à chaque processus
+
+
+def _init_worker(matrices):
+    global _matrices
+    _matrices = matrices
+
+
+def _evaluate(feature_set, scaler, k, sample_size, random_state=42):
+    """Ajuste un KMeans pour une configuration et renvoie inertie et silhouette (sous-échantillonnée)."""
+    start = time.perf_counter()
+    X = make_scaler(scaler).fit_transform(_matrices[feature_set])
+    labels = KMeans(n_clusters=k, random_state=random_state, n_init=10).fit(X)
+    # Silhouette sur un échantillon de taille fixe : coût constant quelle que soit la taille de la table
+    rng = np.random.default_rng(random_state)
+    sample = rng.choice(len(X), size=min(sample_size, len(X)), replace=False)
+    sample_labels = labels.labels_[sample]
+    silhouette = np.nan
+    if 1 < len(np.unique(sample_labels)) < len(sample):
+        silhouette = silhouette_score(X[sample], sample_labels)
+    return {
+        "feature_set": feature_set,
+        "scaler": scaler,
+        "k": k,
+        "inertia": float(labels.inertia_),
+        "silhouette": float(silhouette),
+        "seconds": time.perf_counter() - start,
+    }
+
+
+def _cache_key(df, feature_sets, k_range, scalers, sample_size):
+    digest = hashlib.sha1()
+    digest.update(pd.util.hash_pandas_object(df, index=False).to_numpy().tobytes())
+    digest.update(json.dumps([feature_sets, list(k_range), list(scalers), sample_size], sort_keys=True).encode())
+    return digest.hexdigest()
+
+
+def _prune_cache(max_files=None):
+    """Supprime les résultats les moins récemment utilisés au-delà de `max_files` (`CACHE_MAX_FILES`) fichiers."""
+    max_files = CACHE_MAX_FILES if max_files is None else max_files
+    try:
+        files = [os.path.join(CACHE_DIR, name) for name in os.listdir(CACHE_DIR) if name.endswith(".json")]
+        files.sort(key=os.path.getmtime, reverse=True)
+        for path in files[max_files:]:
+            os.remove(path)
+    except OSError:
+        pass  # Fichier supprimé entre-temps par un autre processus
+
+
+def select_model(df, feature_sets, k_range=K_RANGE, scalers=SCALERS, sample_size=SILHOUETTE_SAMPLE, n_jobs=None):
+    """
+    Évalue en parallèle un ensemble de configurations de clustering (k, normalisation, caractéristiques).
+    Les résultats sont mis en cache sur disque : une même table et une même grille ne sont évaluées qu'une fois
+    (les `CACHE_MAX_FILES` derniers résultats utilisés sont conservés).
+
+    Args:
+        df (pd.DataFrame): Table par IP.
+        feature_sets (dict): Nom -> liste de colonnes à utiliser.
+        k_range (iterable): Nombres de clusters à tester.
+        scalers (iterable): Normalisations à tester (voir `make_scaler`).
+        sample_size (int): Taille de l'échantillon utilisé pour la silhouette.
+        n_jobs (int | None): Nombre de processus (par défaut, nombre de cœurs).
+
+    Returns:
+        pd.DataFrame: Une ligne par configuration, triée par silhouette décroissante.
+    """
+    key = _cache_key(df, feature_sets, k_range, scalers, sample_size)
+    cache_file = os.path.join(CACHE_DIR, f"{key}.json")
+    if os.path.exists(cache_file):
+        os.utime(cache_file)  # Date d'utilisation, pour l'éviction des résultats anciens
+        return pd.read_json(cache_file, orient="records")
+
+    matrices = {name: df[cols].fillna(0).to_numpy(dtype=float) for name, cols in feature_sets.items()}
+    configs = [(name, scaler, k) for name in feature_sets for scaler in scalers for k in k_range]
+
+    with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_worker, initargs=(matrices,)) as pool:
+        futures = [pool.submit(_evaluate, name, scaler, k, sample_size) for name, scaler, k in configs]
+        results = pd.DataFrame([future.result() for future in futures])
+
+    results = results.sort_values("silhouette", ascending=False, ignore_index=True)
+    os.makedirs(CACHE_DIR, exist_ok=True)
+    results.to_json(cache_file, orient="records")
+    _prune_cache()
+    print(f"✅ Sélection de modèle terminée : {len(results)} configurations évaluées.")
+    return results
+
+
+def best_config(results, feature_set, scaler=DEFAULT_SCALER):
+    """
+    Nombre de clusters de meilleure silhouette pour un jeu de caractéristiques et une normalisation
+    donnés, sous forme de dictionnaire. Les silhouettes de normalisations ou de caractéristiques
+    différentes sont mesurées dans des espaces différents et ne se comparent pas entre elles.
+    """
+    candidates = results[(results["feature_set"] == feature_set) & (results["scaler"] == scaler)]
+    best = candidates.dropna(subset=["silhouette"]).sort_values("silhouette", ascending=False).iloc[0]
+    return {"feature_set": feature_set, "scaler": scaler, "k": int(best["k"])}
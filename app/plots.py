@@ -0,0 +1,97 @@
+import numpy as np
+import pandas as pd
+import plotly.express as px
+import plotly.graph_objects as go
+
+# Seuils de rendu : SVG en dessous de WEBGL_THRESHOLD points, WebGL jusqu'à DENSITY_THRESHOLD,
+# au-delà une carte de densité calculée côté serveur avec les points atypiques superposés.
+WEBGL_THRESHOLD = 5000
+DENSITY_THRESHOLD = 100000
+DENSITY_BINS = 200
+MAX_OVERLAY_POINTS = 5000
+OUTLIER_QUANTILE = 0.999
+
+
+def stratified_sample(df, column, max_rows, random_state=42):
+    """
+    Échantillonne au plus `max_rows` lignes en répartissant le budget entre les groupes de `column`.
+    Les petits groupes (ex. le cluster "Attaque") sont conservés en entier tant que le budget le permet,
+    le reste du budget est partagé entre les groupes plus grands.
+    """
+    if len(df) <= max_rows:
+        return df
+
+    sizes = df[column].value_counts(dropna=False).sort_values()
+    quotas = {}
+    budget = max_rows
+    for i, (group, size) in enumerate(sizes.items()):
+        quota = min(size, budget // (len(sizes) - i))
+        quotas[group] = quota
+        budget -= quota
+
+    parts = [
+        group_df.sample(quotas[group], random_state=random_state) if quotas[group] < len(group_df) else group_df
+        for group, group_df in df.groupby(column, dropna=False, sort=False)
+    ]
+    return pd.concat(parts)
+
+
+def _overlay_points(df, x, y, color, minority):
+    """Sélectionne les points à superposer à la carte de densité : groupes minoritaires et valeurs extrêmes."""
+    extreme = (df[x] > df[x].quantile(OUTLIER_QUANTILE)) | (df[y] > df[y].quantile(OUTLIER_QUANTILE))
+    overlay = df[df[color].isin(minority) | extreme]
+    return stratified_sample(overlay, color, MAX_OVERLAY_POINTS)
+
+
+def cluster_scatter(df, x, y, color, color_discrete_map=None, size=None, hover_data=None, title=None,
+                    minority=("Attaque",)):
+    """
+    Nuage de points dont le mode de rendu s'adapte au nombre de points, pour que la taille
+    de la figure envoyée au navigateur reste bornée quel que soit le nombre d'IP.
+
+    Args:
+        df (pd.DataFrame): Données à représenter.
+        x, y (str): Colonnes numériques des axes.
+        color (str): Colonne catégorielle (cluster).
+        color_discrete_map (dict): Couleurs par valeur de `color`.
+        size (str): Colonne de taille des points (ignorée en mode densité).
+        hover_data (list): Colonnes affichées en tooltip.
+        title (str): Titre du graphique.
+        minority (tuple): Valeurs de `color` toujours affichées point par point.
+
+    Returns:
+        go.Figure: La figure Plotly.
+    """
+    n = len(df)
+    if n <= DENSITY_THRESHOLD:
+        return px.scatter(
+            df, x=x, y=y, color=color, hover_data=hover_data, title=title,
+            color_discrete_map=color_discrete_map, size=size, size_max=25,
+            render_mode="svg" if n <= WEBGL_THRESHOLD else "webgl",
+        )
+
+    # Carte de densité calculée côté serveur : seule la grille est transmise au navigateur
+    counts, x_edges, y_edges = np.histogram2d(
+        df[x].to_numpy(dtype=float), df[y].to_numpy(dtype=float), bins=DENSITY_BINS
+    )
+    fig = go.Figure(go.Heatmap(
+        x=(x_edges[:-1] + x_edges[1:]) / 2,
+        y=(y_edges[:-1] + y_edges[1:]) / 2,
+        z=np.log1p(counts.T),
+        colorscale="Greys",
+        showscale=False,
+        hovertemplate=f"{x}: %{{x:.0f}}<br>{y}: %{{y:.0f}}<extra>densité (log)</extra>",
+    ))
+
+    overlay = _overlay_points(df, x, y, color, minority)
+    overlay_fig = px.scatter(
+        overlay, x=x, y=y, color=color, hover_data=hover_data,
+        color_discrete_map=color_discrete_map, render_mode="webgl",
+    )
+    fig.add_traces(overlay_fig.data)
+    fig.update_layout(
+        title=f"{title} — {n:,} points, densité + {len(overlay):,} points atypiques" if title else None,
+        xaxis_title=x,
+        yaxis_title=y,
+    )
+    return fig
@@ -0,0 +1,186 @@
+"""
+Profilage des requêtes Elasticsearch lentes (mode optionnel).
+
+Lorsqu'une recherche dépasse le seuil de latence, elle est réexécutée avec `"profile": true` ;
+les temps par shard du moteur de requête, des collecteurs et de chaque agrégation (y compris les
+sous-agrégations) sont extraits et ajoutés au journal des requêtes lentes :
+- en mémoire, pour le panneau de diagnostic (`show_slow_queries`) ;
+- dans un fichier JSONL (`SLOW_QUERY_LOG`).
+"""
+import copy
+import json
+import os
+import threading
+import time
+from collections import deque
+
+import pandas as pd
+
+ENABLED = os.environ.get("ES_PROFILE", "0") == "1"
+THRESHOLD_MS = float(os.environ.get("SLOW_QUERY_MS", 500))
+COOLDOWN = 60  # Secondes minimum entre deux profilages d'une même étape (pagination composite...)
+SLOW_QUERY_LOG = os.environ.get("SLOW_QUERY_LOG", os.path.join(".cache", "slow_queries.jsonl"))
+MAX_ENTRIES = 200
+
+_entries = deque(maxlen=MAX_ENTRIES)
+_last_profiled = {}
+_lock = threading.Lock()
+
+
+def configure(enabled=None, threshold_ms=None):
+    """Active / désactive le profilage et règle le seuil (ms)."""
+    global ENABLED, THRESHOLD_MS
+    if enabled is not None:
+        ENABLED = enabled
+    if threshold_ms is not None:
+        THRESHOLD_MS = float(threshold_ms)
+
+
+def _profile_request(args, kwargs):
+    """Copie des paramètres de la recherche avec le profilage activé (sans contexte de scroll)."""
+    kwargs = {k: v for k, v in kwargs.items() if k != "scroll"}
+    if kwargs.get("body") is not None:
+        kwargs["body"] = {**copy.deepcopy(kwargs["body"]), "profile": True}
+    else:
+        kwargs["profile"] = True
+    return args, kwargs
+
+
+def _query_dsl(kwargs):
+    body = kwargs.get("body")
+    if body is None:
+        body = {k: v for k, v in kwargs.items() if k not in ("index", "scroll", "request_timeout")}
+    return json.dumps(body, default=str, ensure_ascii=False)
+
+
+def maybe_profile(client, method, args, kwargs, seconds, stage, took_ms=None):
+    """
+    Profile la recherche si le mode est actif et qu'elle dépasse le seuil.
+
+    Returns:
+        dict | None: L'entrée ajoutée au journal des requêtes lentes.
+    """
+    if not ENABLED or method != "search" or seconds * 1000 < THRESHOLD_MS:
+        return None
+    now = time.time()
+    with _lock:
+        if now - _last_profiled.get(stage, 0) < COOLDOWN:
+            return None
+        _last_profiled[stage] = now
+
+    profile_args, profile_kwargs = _profile_request(args, kwargs)
+    try:
+        response = client.search(*profile_args, **profile_kwargs)
+        profile = getattr(response, "body", response).get("profile", {})
+        error = None
+    except Exception as e:
+        profile, error = {}, repr(e)
+
+    entry = {
+        "ts": now,
+        "stage": stage,
+        "seconds": round(seconds, 3),
+        "took_ms": took_ms,
+        "query": _query_dsl(kwargs),
+        "timings": parse_profile(profile),
+        "error": error,
+    }
+    with _lock:
+        _entries.append(entry)
+        os.makedirs(os.path.dirname(SLOW_QUERY_LOG) or ".", exist_ok=True)
+        with open(SLOW_QUERY_LOG, "a") as f:
+            f.write(json.dumps(entry, ensure_ascii=False, default=str) + "\n")
+    return entry
+
+
+def _walk(nodes, shard, section, parent=""):
+    """Aplatit un arbre de profil (query / collector / aggregations) en lignes."""
+    for node in nodes:
+        name = node.get("name") or node.get("description") or node.get("type")
+        path = f"{parent} > {name}" if parent else name
+        yield {
+            "shard": shard,
+            "section": section,
+            "path": path,
+            "type": node.get("type") or node.get("reason"),
+            "time_ms": node.get("time_in_nanos", 0) / 1e6,
+        }
+        yield from _walk(node.get("children", []), shard, section, path)
+
+
+def parse_profile(profile):
+    """
+    Extrait les temps par shard d'une réponse profilée.
+
+    Returns:
+        list[dict]: Une ligne par nœud (shard, section, chemin dans l'arbre, type, temps en ms).
+    """
+    rows = []
+    for shard in profile.get("shards", []):
+        shard_id = shard.get("id", "")
+        for search in shard.get("searches", []):
+            rows.extend(_walk(search.get("query", []), shard_id, "query"))
+            rows.extend(_walk(search.get("collector", []), shard_id, "collector"))
+            if search.get("rewrite_time"):
+                rows.append({"shard": shard_id, "section": "query", "path": "rewrite",
+                             "type": "rewrite", "time_ms": search["rewrite_time"] / 1e6})
+        rows.extend(_walk(shard.get("aggregations", []), shard_id, "aggregation"))
+    return rows
+
+
+def entries():
+    """Journal des requêtes lentes (les plus récentes en dernier)."""
+    with _lock:
+        return list(_entries)
+
+
+def load_log(path=None):
+    """Relit le journal JSONL (entrées des exécutions précédentes du serveur comprises)."""
+    path = path or SLOW_QUERY_LOG
+    if not os.path.exists(path):
+        return []
+    with open(path) as f:
+        return [json.loads(line) for line in f if line.strip()]
+
+
+def breakdown(entry):
+    """Temps cumulé sur les shards (et pire shard) par section et par nœud, du plus coûteux au moins coûteux."""
+    frame = pd.DataFrame(entry["timings"], columns=["shard", "section", "path", "type", "time_ms"])
+    if frame.empty:
+        return frame
+    return (
+        frame.groupby(["section", "path", "type"], dropna=False)
+        .agg(time_ms=("time_ms", "sum"), max_shard_ms=("time_ms", "max"), shards=("shard", "nunique"))
+        .sort_values("time_ms", ascending=False)
+        .reset_index()
+    )
+
+
+def show_slow_queries():
+    """Réglages du profilage et consultation du journal des requêtes lentes."""
+    import streamlit as st  # Import différé : le profilage s'exécute aussi hors de Streamlit (voir metrics)
+    st.markdown("**🐢 Requêtes lentes**")
+    # Réglages communs à tout le serveur : appliqués seulement quand l'utilisateur les modifie, et non
+    # à chaque réexécution (une autre session écraserait sinon le réglage avec ses propres widgets)
+    def apply():
+        configure(st.session_state["profiler_enabled"], st.session_state["profiler_threshold"])
+
+    st.toggle("Profiler les requêtes lentes", value=ENABLED, key="profiler_enabled", on_change=apply)
+    st.number_input("Seuil (ms)", min_value=10, value=int(THRESHOLD_MS), step=50, key="profiler_threshold",
+                    on_change=apply)
+
+    log = entries() or load_log()[-MAX_ENTRIES:]
+    if not log:
+        st.caption("Aucune requête lente profilée.")
+        return
+    labels = [
+        f"{time.strftime('%H:%M:%S', time.localtime(e['ts']))} · {e['stage']} · {e['seconds'] * 1000:.0f} ms"
+        for e in log
+    ]
+    index = st.selectbox("Requête", range(len(log)), index=len(log) - 1, format_func=lambda i: labels[i])
+    entry = log[index]
+    if entry.get("error"):
+        st.error(f"Profilage impossible : {entry['error']}")
+    st.dataframe(breakdown(entry).round(2), use_container_width=True, hide_index=True)
+    with st.expander("DSL"):
+        st.code(entry["query"], language="json")
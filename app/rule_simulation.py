@@ -0,0 +1,241 @@
+"""
+Simulation « what-if » d'un jeu de règles de pare-feu sur le trafic historique.
+
+Le jeu de règles (ordonné, première règle correspondante appliquée) est compilé en un index par
+dimension — IP source, IP destination, port destination, protocole. Chaque index découpe le domaine
+(uint32 pour les IP, uint16 pour les ports) en intervalles élémentaires triés, et associe à chaque
+intervalle le bitset des règles qui le couvrent. Pour un lot d'événements, une recherche dichotomique
+par dimension donne quatre bitsets dont l'intersection contient les règles applicables ; le bit de
+poids faible est la première règle correspondante. Tout est vectorisé sur les événements.
+
+Format du jeu de règles (CSV) : une ligne par règle, dans l'ordre d'évaluation (ou colonne `order`) :
+    name, action, proto, src, dst, portdst
+`src` / `dst` : CIDR ou IP, séparés par des virgules, `*` pour tout ;
+`portdst` : port ou plage (`1024-65535`), séparés par des virgules, `*` pour tout ;
+`proto` : TCP, UDP... ou `*`.
+"""
+import numpy as np
+import pandas as pd
+
+from events import ip_to_uint32, to_event_columns, uint32_to_ip
+from utils import iter_events
+
+ANY = {"", "*", "any", "all", "nan"}
+IP_MAX = (1 << 32) - 1
+PORT_MAX = (1 << 16) - 1
+CHUNK_SIZE = 1_000_000  # Événements évalués à la fois (borne la mémoire des bitsets)
+DEFAULT_NAME = "(défaut)"
+
+
+def parse_cidrs(spec):
+    """Intervalles [début, fin] d'une liste de CIDR / IP (`*` pour tout)."""
+    spec = str(spec).strip()
+    if spec.lower() in ANY:
+        return [(0, IP_MAX)]
+    intervals = []
+    for part in spec.split(","):
+        address, _, prefix = part.strip().partition("/")
+        prefix = int(prefix) if prefix else 32
+        if not 0 <= prefix <= 32:
+            raise ValueError(f"Préfixe invalide : {part}")
+        base = int(ip_to_uint32([address])[0])
+        if base == 0 and address.strip() != "0.0.0.0":
+            raise ValueError(f"Adresse invalide : {part}")
+        mask = (IP_MAX << (32 - prefix)) & IP_MAX
+        intervals.append((base & mask, (base & mask) | (~mask & IP_MAX)))
+    return intervals
+
+
+def parse_ports(spec):
+    """Intervalles [début, fin] d'une liste de ports / plages (`*` pour tout)."""
+    spec = str(spec).strip()
+    if spec.lower() in ANY:
+        return [(0, PORT_MAX)]
+    intervals = []
+    for part in spec.split(","):
+        low, _, high = part.strip().partition("-")
+        low, high = int(float(low)), int(float(high or low))
+        if not 0 <= low <= high <= PORT_MAX:
+            raise ValueError(f"Plage de ports invalide : {part}")
+        intervals.append((low, high))
+    return intervals
+
+
+class IntervalIndex:
+    """
+    Index d'une dimension : intervalles élémentaires triés (`bounds`) et, pour chacun,
+    le bitset (mots uint64) des règles qui le couvrent.
+    """
+
+    def __init__(self, rule_intervals, n_words):
+        starts = [low for intervals in rule_intervals for low, _ in intervals]
+        ends = [high + 1 for intervals in rule_intervals for _, high in intervals]
+        self.bounds = np.unique(np.array([0] + starts + ends, dtype=np.int64))
+        self.bits = np.zeros((len(self.bounds), n_words), dtype=np.uint64)
+        for rule, intervals in enumerate(rule_intervals):
+            word, bit = divmod(rule, 64)
+            for low, high in intervals:
+                first = np.searchsorted(self.bounds, low)
+                last = np.searchsorted(self.bounds, high + 1)
+                self.bits[first:last, word] |= np.uint64(1 << bit)
+
+    def lookup(self, values):
+        """Ligne de `bits` (intervalle élémentaire) de chaque valeur."""
+        return np.searchsorted(self.bounds, values, side="right") - 1
+
+
+class CompiledRuleSet:
+    """Jeu de règles compilé, évalué en sémantique « première règle correspondante »."""
+
+    def __init__(self, rules, default_action="DENY"):
+        rules = rules.copy()
+        rules.columns = [c.strip().lower() for c in rules.columns]
+        if "order" in rules.columns:
+            rules = rules.sort_values("order", kind="stable")
+        rules = rules.reset_index(drop=True)
+        if "name" not in rules.columns:
+            rules["name"] = [f"r{i + 1}" for i in range(len(rules))]
+        for column, default in (("proto", "*"), ("src", "*"), ("dst", "*"), ("portdst", "*")):
+            if column not in rules.columns:
+                rules[column] = default
+        rules["action"] = rules["action"].str.upper().str.strip()
+        if not rules["action"].isin(["PERMIT", "DENY"]).all():
+            raise ValueError("La colonne action doit valoir PERMIT ou DENY.")
+
+        self.rules = rules
+        self.names = rules["name"].astype(str).tolist()
+        self.default_action = default_action
+        self.permit = (rules["action"] == "PERMIT").to_numpy()
+        n_words = max(1, -(-len(rules) // 64))
+
+        self.src = IntervalIndex([parse_cidrs(s) for s in rules["src"]], n_words)
+        self.dst = IntervalIndex([parse_cidrs(s) for s in rules["dst"]], n_words)
+        self.port = IntervalIndex([parse_ports(s) for s in rules["portdst"]], n_words)
+
+        # Protocole : une ligne par protocole nommé, plus une pour les autres (règles `*` uniquement)
+        protos = rules["proto"].astype(str).str.strip().str.upper()
+        self.protocols = sorted(p for p in protos.unique() if p.lower() not in ANY)
+        self.proto_bits = np.zeros((len(self.protocols) + 1, n_words), dtype=np.uint64)
+        for rule, proto in enumerate(protos):
+            word, bit = divmod(rule, 64)
+            rows = slice(None) if proto.lower() in ANY else self.protocols.index(proto)
+            self.proto_bits[rows, word] |= np.uint64(1 << bit)
+
+    def match(self, events):
+        """
+        Première règle correspondante de chaque événement (-1 si aucune).
+
+        Args:
+            events (pd.DataFrame): Événements typés (voir `events.to_event_columns`).
+        """
+        result = np.full(len(events), -1, dtype=np.int64)
+        for offset in range(0, len(events), CHUNK_SIZE):
+            chunk = events.iloc[offset:offset + CHUNK_SIZE]
+            s = self.src.lookup(chunk["ipsrc"].to_numpy())
+            d = self.dst.lookup(chunk["ipdst"].to_numpy())
+            p = self.port.lookup(chunk["portdst"].to_numpy())
+            proto = pd.Categorical(chunk["proto"].astype(str).str.upper(), categories=self.protocols).codes
+            proto = np.where(proto < 0, len(self.protocols), proto)
+
+            matched = np.full(len(chunk), -1, dtype=np.int64)
+            for word in range(self.src.bits.shape[1]):
+                bits = self.src.bits[s, word] & self.dst.bits[d, word] & self.port.bits[p, word] & self.proto_bits[proto, word]
+                todo = (matched < 0) & (bits != 0)
+                lowest = bits[todo] & (~bits[todo] + np.uint64(1))  # Bit de poids faible
+                matched[todo] = word * 64 + np.log2(lowest.astype(np.float64)).astype(np.int64)
+            result[offset:offset + CHUNK_SIZE] = matched
+        return result
+
+    def verdicts(self, matched):
+        """Verdict (True = PERMIT) à partir des règles correspondantes."""
+        return np.where(matched >= 0, self.permit[np.maximum(matched, 0)], self.default_action == "PERMIT")
+
+
+class Simulation:
+    """
+    Rejoue un jeu de règles sur des lots d'événements et cumule les changements de verdict,
+    par règle proposée et par règle d'origine (`idregle`).
+    """
+
+    FIELDS = ["timestamp", "ipsrc", "ipdst", "portsrc", "portdst", "proto", "action", "idregle"]
+
+    def __init__(self, ruleset, max_samples=1000):
+        self.ruleset = ruleset
+        self.max_samples = max_samples
+        self.n_events = 0
+        self._by_rule = np.zeros((len(ruleset.names) + 1, 3), dtype=np.int64)  # Évalués, PERMIT->DENY, DENY->PERMIT
+        self._by_idregle = []
+        self._samples = []
+        self._n_samples = 0
+
+    def update(self, events):
+        if events.empty:
+            return self
+        matched = self.ruleset.match(events)
+        new = self.ruleset.verdicts(matched)
+        old = events["permit"].to_numpy()
+        closed, opened = old & ~new, ~old & new
+        rows = np.where(matched >= 0, matched, len(self.ruleset.names))
+        n_rows = len(self._by_rule)
+        self._by_rule[:, 0] += np.bincount(rows, minlength=n_rows)
+        self._by_rule[:, 1] += np.bincount(rows, weights=closed, minlength=n_rows).astype(np.int64)
+        self._by_rule[:, 2] += np.bincount(rows, weights=opened, minlength=n_rows).astype(np.int64)
+
+        self._by_idregle.append(pd.DataFrame({
+            "idregle": events["idregle"].to_numpy(), "closed": closed, "opened": opened,
+        }).groupby("idregle").agg(Événements=("closed", "size"), closed=("closed", "sum"), opened=("opened", "sum")))
+        if len(self._by_idregle) > 32:
+            self._by_idregle = [pd.concat(self._by_idregle).groupby(level=0).sum()]
+
+        changed = np.flatnonzero(closed | opened)[: self.max_samples - self._n_samples]
+        if len(changed):
+            sample = events.iloc[changed].copy()
+            sample["Règle proposée"] = np.array(self.ruleset.names + [DEFAULT_NAME], dtype=object)[rows[changed]]
+            self._samples.append(sample)
+            self._n_samples += len(changed)
+        self.n_events += len(events)
+        return self
+
+    def update_from_es(self, since=None, batch_size=10000, max_docs=None):
+        """Rejoue le jeu de règles sur les événements stockés dans Elasticsearch."""
+        for batch in iter_events(since=since, fields=self.FIELDS, batch_size=batch_size, max_docs=max_docs):
+            self.update(to_event_columns(batch))
+        return self
+
+    def by_rule(self):
+        """Événements évalués et verdicts modifiés par règle proposée (dont la politique par défaut)."""
+        counts = self._by_rule
+        frame = pd.DataFrame({
+            "Règle": self.ruleset.names + [DEFAULT_NAME],
+            "Action": list(self.ruleset.rules["action"]) + [self.ruleset.default_action],
+            "Événements": counts[:, 0],
+            "PERMIT -> DENY": counts[:, 1],
+            "DENY -> PERMIT": counts[:, 2],
+        })
+        frame["Changements"] = frame["PERMIT -> DENY"] + frame["DENY -> PERMIT"]
+        return frame
+
+    def by_idregle(self):
+        """Verdicts modifiés par règle d'origine (`idregle` des logs)."""
+        if not self._by_idregle:
+            return pd.DataFrame(columns=["idregle", "Événements", "PERMIT -> DENY", "DENY -> PERMIT", "Changements"])
+        frame = pd.concat(self._by_idregle).groupby(level=0).sum().astype(np.int64)
+        frame = frame.rename(columns={"closed": "PERMIT -> DENY", "opened": "DENY -> PERMIT"})
+        frame["Changements"] = frame["PERMIT -> DENY"] + frame["DENY -> PERMIT"]
+        return frame.sort_values("Changements", ascending=False).reset_index()
+
+    def samples(self):
+        """Exemples de flux dont le verdict change (IP en texte)."""
+        if not self._samples:
+            return pd.DataFrame()
+        sample = pd.concat(self._samples, ignore_index=True)
+        sample["ipsrc"] = uint32_to_ip(sample["ipsrc"].to_numpy())
+        sample["ipdst"] = uint32_to_ip(sample["ipdst"].to_numpy())
+        sample["timestamp"] = pd.to_datetime(sample.pop("ts"), unit="s")
+        sample["action"] = np.where(sample.pop("permit"), "PERMIT", "DENY")
+        return sample
+
+
+def load_ruleset(source, default_action="DENY"):
+    """Charge et compile un jeu de règles depuis un CSV (chemin ou fichier ouvert)."""
+    return CompiledRuleSet(pd.read_csv(source, dtype=str, keep_default_na=False), default_action)
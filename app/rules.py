@@ -0,0 +1,242 @@
+"""
+Index des déclenchements des règles de pare-feu (`idregle`), alimenté de façon incrémentale.
+
+Pour chaque règle, des compteurs sont tenus à jour à chaque lot intégré : déclenchements par action et
+par protocole, série horaire (tampon circulaire), première / dernière occurrence, et principales IP
+sources (résumé Space-Saving de taille fixe). Les rapports (règles jamais déclenchées, règles les plus
+sollicitées, tendance) se calculent à partir de ces compteurs seuls, sans relire les logs.
+"""
+import os
+import threading
+
+import numpy as np
+import pandas as pd
+
+from events import uint32_to_ip
+from utils import EventConsumer
+
+BUCKET_SECONDS = 3600  # Granularité de la série temporelle (1 heure)
+TREND_BUCKETS = 24 * 14  # Historique conservé : 14 jours
+TOP_SOURCES = 20  # Taille du résumé des IP sources par règle
+RULES_FILE = os.environ.get("RULES_FILE", os.path.join(os.path.dirname(os.path.abspath(__file__)), "rules.csv"))
+
+
+def load_rule_ids(path=RULES_FILE):
+    """
+    Lit la liste des règles configurées (CSV avec une colonne `idregle`, ou un identifiant par ligne).
+    Retourne une liste vide si le fichier n'existe pas.
+    """
+    if not os.path.exists(path):
+        return []
+    rules = pd.read_csv(path, dtype=str)
+    column = rules["idregle"] if "idregle" in rules.columns else pd.read_csv(path, header=None, dtype=str)[0]
+    return sorted(pd.to_numeric(column, errors="coerce").dropna().astype(int).unique().tolist())
+
+
+def merge_top(keys, counts, errors, new_keys, new_counts, capacity=TOP_SOURCES):
+    """
+    Fusionne les comptes exacts d'un lot dans un résumé Space-Saving de `capacity` éléments.
+
+    Une clé absente d'un résumé plein hérite du plus petit compte du résumé (surestimation bornée,
+    conservée dans `errors`) ; seuls les `capacity` plus grands comptes sont gardés.
+
+    Returns:
+        tuple: (keys, counts, errors) du résumé fusionné, triés par compte décroissant.
+    """
+    floor = counts.min() if len(counts) >= capacity else 0
+    inherited = np.where(np.isin(new_keys, keys), 0, floor)
+    old = pd.DataFrame({"count": counts, "error": errors}, index=keys)
+    new = pd.DataFrame({"count": new_counts + inherited, "error": inherited}, index=new_keys)
+    merged = old.add(new, fill_value=0).nlargest(capacity, "count")
+    return (
+        merged.index.to_numpy(np.uint32),
+        merged["count"].to_numpy(np.int64),
+        merged["error"].to_numpy(np.int64),
+    )
+
+
+class RuleIndex(EventConsumer):
+    """
+    Compteurs par règle de pare-feu, mis à jour par lots d'événements typés
+    (voir `events.to_event_columns`). Le coût des rapports dépend du nombre de règles,
+    pas du volume de logs intégré.
+    """
+
+    FIELDS = ["timestamp", "ipsrc", "ipdst", "portdst", "proto", "action", "idregle"]
+
+    def __init__(self, bucket_seconds=BUCKET_SECONDS, trend_buckets=TREND_BUCKETS, top_sources=TOP_SOURCES):
+        self.bucket_seconds = bucket_seconds
+        self.trend_buckets = trend_buckets
+        self.top_size = top_sources
+        self.last_ts = None
+        self._rule_ids = []  # Identifiant de règle de chaque ligne des compteurs
+        self._rule_pos = {}  # Identifiant de règle -> ligne
+        self._protos = []  # Protocole de chaque colonne de `_proto_hits`
+        self._hits = np.zeros((0, 2), dtype=np.int64)  # Colonnes : DENY, PERMIT
+        self._proto_hits = np.zeros((0, 0), dtype=np.int64)
+        self._trend = np.zeros((0, trend_buckets), dtype=np.int64)  # Tampon circulaire horaire
+        self._slot_bucket = np.full(trend_buckets, -1, dtype=np.int64)  # Heure contenue dans chaque case
+        self._newest_bucket = -1
+        self._first_seen = np.zeros(0, dtype=np.int64)
+        self._last_seen = np.zeros(0, dtype=np.int64)
+        self._top = []  # (keys, counts, errors) par règle
+        self._lock = threading.Lock()
+
+    # ------------------------------------------------------------------ Alimentation
+
+    def _positions(self, rule_ids):
+        """Lignes des règles `rule_ids`, en créant celles qui n'existent pas encore."""
+        new = [int(r) for r in rule_ids if int(r) not in self._rule_pos]
+        if new:
+            for rule in new:
+                self._rule_pos[rule] = len(self._rule_ids)
+                self._rule_ids.append(rule)
+            n = len(new)
+            self._hits = np.vstack([self._hits, np.zeros((n, 2), dtype=np.int64)])
+            self._proto_hits = np.vstack([self._proto_hits, np.zeros((n, len(self._protos)), dtype=np.int64)])
+            self._trend = np.vstack([self._trend, np.zeros((n, self.trend_buckets), dtype=np.int64)])
+            self._first_seen = np.r_[self._first_seen, np.full(n, np.iinfo(np.int64).max)]
+            self._last_seen = np.r_[self._last_seen, np.full(n, np.iinfo(np.int64).min)]
+            self._top.extend((np.zeros(0, np.uint32), np.zeros(0, np.int64), np.zeros(0, np.int64)) for _ in new)
+        return np.array([self._rule_pos[int(r)] for r in rule_ids], dtype=np.int64)
+
+    def _proto_columns(self, categories):
+        """Colonnes des protocoles `categories`, en créant celles qui n'existent pas encore."""
+        new = [p for p in categories if p not in self._protos]
+        if new:
+            self._protos.extend(new)
+            self._proto_hits = np.hstack([self._proto_hits, np.zeros((len(self._rule_ids), len(new)), dtype=np.int64)])
+        return np.array([self._protos.index(p) for p in categories], dtype=np.int64)
+
+    def update(self, events):
+        """Intègre un lot d'événements typés."""
+        if events.empty:
+            return
+        with self._lock:
+            uniques, inverse = np.unique(events["idregle"].to_numpy(), return_inverse=True)
+            pos = self._positions(uniques)[inverse]
+            n_rules = len(self._rule_ids)
+
+            # Déclenchements par action et par protocole
+            action = events["permit"].to_numpy().astype(np.int64)
+            self._hits += np.bincount(pos * 2 + action, minlength=n_rules * 2).reshape(n_rules, 2)
+            codes, protos = pd.factorize(events["proto"].astype("string").fillna("?").to_numpy(dtype=object))
+            columns = self._proto_columns(list(protos))[codes]
+            n_protos = len(self._protos)
+            self._proto_hits += np.bincount(pos * n_protos + columns, minlength=n_rules * n_protos).reshape(n_rules, n_protos)
+
+            # Série horaire : tampon circulaire, les cases d'une heure plus ancienne sont remises à zéro
+            ts = events["ts"].to_numpy()
+            bucket = ts // self.bucket_seconds
+            self._newest_bucket = max(self._newest_bucket, int(bucket.max()))
+            recent = bucket > self._newest_bucket - self.trend_buckets
+            for b in np.unique(bucket[recent]):
+                slot = b % self.trend_buckets
+                if self._slot_bucket[slot] != b:
+                    self._trend[:, slot] = 0
+                    self._slot_bucket[slot] = b
+            slots = bucket[recent] % self.trend_buckets
+            self._trend += np.bincount(
+                pos[recent] * self.trend_buckets + slots, minlength=n_rules * self.trend_buckets
+            ).reshape(n_rules, self.trend_buckets)
+
+            # Première / dernière occurrence et IP sources : group-by trié par (règle, IP source)
+            ipsrc = events["ipsrc"].to_numpy()
+            order = np.lexsort((ipsrc, pos))
+            pos_s, ip_s, ts_s = pos[order], ipsrc[order], ts[order]
+            rule_starts = np.flatnonzero(np.r_[True, pos_s[1:] != pos_s[:-1]])
+            rules = pos_s[rule_starts]
+            self._first_seen[rules] = np.minimum(self._first_seen[rules], np.minimum.reduceat(ts_s, rule_starts))
+            self._last_seen[rules] = np.maximum(self._last_seen[rules], np.maximum.reduceat(ts_s, rule_starts))
+
+            pair_starts = np.flatnonzero(np.r_[True, (pos_s[1:] != pos_s[:-1]) | (ip_s[1:] != ip_s[:-1])])
+            pair_counts = np.diff(np.r_[pair_starts, len(pos_s)])
+            pair_rule = pos_s[pair_starts]
+            bounds = np.r_[np.searchsorted(pair_rule, rules), len(pair_rule)]
+            for i, rule in enumerate(rules):
+                segment = slice(bounds[i], bounds[i + 1])
+                self._top[rule] = merge_top(*self._top[rule], ip_s[pair_starts][segment],
+                                            pair_counts[segment], self.top_size)
+
+            ts_max = int(ts.max())
+            self.last_ts = ts_max if self.last_ts is None else max(self.last_ts, ts_max)
+
+    # ------------------------------------------------------------------ Rapports
+
+    def summary(self):
+        """
+        Compteurs de toutes les règles vues, de la plus sollicitée à la moins sollicitée.
+
+        Returns:
+            pd.DataFrame: Colonnes idregle, Hits, PERMIT, DENY, Part (%), Première, Dernière, puis une par protocole.
+        """
+        with self._lock:
+            hits = self._hits.copy()
+            protos = pd.DataFrame(self._proto_hits.copy(), columns=list(self._protos))
+            frame = pd.DataFrame({
+                "idregle": np.array(self._rule_ids, dtype=np.int64),
+                "Hits": hits.sum(axis=1),
+                "PERMIT": hits[:, 1],
+                "DENY": hits[:, 0],
+                "Première": pd.to_datetime(self._first_seen, unit="s"),
+                "Dernière": pd.to_datetime(self._last_seen, unit="s"),
+            })
+        total = frame["Hits"].sum()
+        frame.insert(4, "Part (%)", 100 * frame["Hits"] / total if total else 0.0)
+        frame = pd.concat([frame, protos.loc[:, protos.any()]], axis=1)
+        return frame.sort_values("Hits", ascending=False, kind="stable").reset_index(drop=True)
+
+    def top_rules(self, n=10):
+        """Les `n` règles qui reçoivent le plus de trafic."""
+        return self.summary().head(n)
+
+    def unused(self, known_rules=(), idle_seconds=None):
+        """
+        Règles configurées jamais déclenchées et, si `idle_seconds` est donné, règles sans
+        déclenchement depuis plus de `idle_seconds` (par rapport au dernier événement intégré).
+
+        Returns:
+            pd.DataFrame: Colonnes idregle, Statut, Dernière.
+        """
+        with self._lock:
+            seen = dict(zip(self._rule_ids, self._last_seen))
+            last_ts = self.last_ts
+        rows = [{"idregle": r, "Statut": "Jamais déclenchée", "Dernière": pd.NaT}
+                for r in known_rules if r not in seen]
+        if idle_seconds is not None and last_ts is not None:
+            rows += [{"idregle": r, "Statut": "Inactive", "Dernière": pd.Timestamp(t, unit="s")}
+                     for r, t in seen.items() if t < last_ts - idle_seconds]
+        return pd.DataFrame(rows, columns=["idregle", "Statut", "Dernière"])
+
+    def trend(self, rule_ids=None):
+        """
+        Déclenchements horaires des règles (14 derniers jours par défaut).
+
+        Returns:
+            pd.DataFrame: Index horaire chronologique, une colonne par règle.
+        """
+        with self._lock:
+            if self._newest_bucket < 0:
+                return pd.DataFrame()
+            buckets = np.arange(self._newest_bucket - self.trend_buckets + 1, self._newest_bucket + 1)
+            slots = buckets % self.trend_buckets
+            valid = self._slot_bucket[slots] == buckets
+            values = np.where(valid, self._trend[:, slots], 0)
+            rule_ids = list(self._rule_ids) if rule_ids is None else [r for r in rule_ids if r in self._rule_pos]
+            rows = [self._rule_pos[r] for r in rule_ids]
+        index = pd.to_datetime(buckets * self.bucket_seconds, unit="s")
+        return pd.DataFrame(values[rows].T, index=index, columns=rule_ids)
+
+    def top_sources(self, rule_id, n=10):
+        """
+        Principales IP sources d'une règle (comptes estimés, surestimés au plus de `Erreur max`).
+        """
+        with self._lock:
+            if rule_id not in self._rule_pos:
+                return pd.DataFrame(columns=["IP_Source", "Hits", "Erreur max"])
+            keys, counts, errors = self._top[self._rule_pos[rule_id]]
+        return pd.DataFrame({
+            "IP_Source": uint32_to_ip(keys[:n]),
+            "Hits": counts[:n],
+            "Erreur max": errors[:n],
+        })
@@ -0,0 +1,274 @@
+import threading
+
+import numpy as np
+import pandas as pd
+
+from events import uint32_to_ip
+from utils import EventConsumer
+
+SCAN_WINDOW_SECONDS = 300  # Fenêtre d'analyse (5 minutes)
+MIN_PORTS_PER_TARGET = 20  # Scan vertical : nombre de ports distincts sur une même cible
+MIN_TARGETS_PER_PORT = 20  # Balayage horizontal : nombre de cibles distinctes sur un même port
+MAX_LISTED = 20  # Nombre de cibles / ports listés par épisode
+
+SCAN_TYPES = {
+    "vertical": "Scan vertical (ports)",
+    "horizontal": "Balayage horizontal (hôtes)",
+    "bloc": "Scan en bloc (hôtes et ports)",
+}
+
+
+def _changes(*columns):
+    """Booléen vrai au début de chaque segment de valeurs identiques (colonnes déjà triées)."""
+    flags = np.empty(len(columns[0]), dtype=bool)
+    flags[:1] = True
+    flags[1:] = False
+    for col in columns:
+        flags[1:] |= col[1:] != col[:-1]
+    return flags
+
+
+def window_fanout(ipsrc, window, ipdst, portdst, ts):
+    """
+    Mesure l'éventail (fan-out) de chaque IP source par fenêtre, par comptage distinct sur tableaux triés.
+
+    Returns:
+        tuple: (fenêtres, quadruplets) où `fenêtres` contient, par couple (ipsrc, window),
+        `n_events`, `n_targets`, `n_ports`, `max_ports_per_target`, `max_targets_per_port`,
+        `ts_min`, `ts_max` ; et `quadruplets` les (ipsrc, window, ipdst, portdst) distincts.
+    """
+    order = np.lexsort((portdst, ipdst, window, ipsrc))
+    s, w, d, p, t = ipsrc[order], window[order], ipdst[order], portdst[order], ts[order]
+
+    new_sw = _changes(s, w)
+    new_swd = new_sw | _changes(d)
+    new_quad = new_swd | _changes(p)
+    sw_starts = np.flatnonzero(new_sw)
+    sw_id = np.cumsum(new_sw) - 1
+
+    windows = pd.DataFrame({
+        "ipsrc": s[sw_starts],
+        "window": w[sw_starts],
+        "n_events": np.bincount(sw_id),
+        "n_targets": np.bincount(sw_id, weights=new_swd).astype(np.int64),
+        "ts_min": np.minimum.reduceat(t, sw_starts),
+        "ts_max": np.maximum.reduceat(t, sw_starts),
+    })
+
+    # Quadruplets distincts : la suite du calcul ne porte plus que sur eux
+    q = np.flatnonzero(new_quad)
+    qs, qw, qd, qp = s[q], w[q], d[q], p[q]
+    q_sw = sw_id[q]
+
+    # Nombre maximal de ports distincts sur une même cible (scan vertical)
+    swd_starts = np.flatnonzero(_changes(qs, qw, qd))
+    ports_per_target = np.diff(np.r_[swd_starts, len(q)])
+    windows["max_ports_per_target"] = _segment_max(ports_per_target, q_sw[swd_starts], len(windows))
+
+    # Nombre de ports distincts et nombre maximal de cibles sur un même port (balayage horizontal)
+    order2 = np.lexsort((qd, qp, qw, qs))
+    qs2, qw2, qp2 = qs[order2], qw[order2], qp[order2]
+    swp_starts = np.flatnonzero(_changes(qs2, qw2, qp2))
+    targets_per_port = np.diff(np.r_[swp_starts, len(q)])
+    swp_sw = q_sw[order2][swp_starts]
+    windows["n_ports"] = np.bincount(swp_sw, minlength=len(windows))
+    windows["max_targets_per_port"] = _segment_max(targets_per_port, swp_sw, len(windows))
+
+    quads = pd.DataFrame({"ipsrc": qs, "window": qw, "ipdst": qd, "portdst": qp})
+    return windows, quads
+
+
+def _segment_max(values, segment, n_segments):
+    """Maximum de `values` par segment (les segments sont des entiers triés de 0 à n_segments - 1)."""
+    result = np.zeros(n_segments, dtype=np.int64)
+    np.maximum.at(result, segment, values)
+    return result
+
+
+def classify_windows(windows, min_ports=MIN_PORTS_PER_TARGET, min_targets=MIN_TARGETS_PER_PORT):
+    """Ajoute la colonne `type` (vertical, horizontal, bloc ou None) à chaque fenêtre."""
+    vertical = windows["max_ports_per_target"].to_numpy() >= min_ports
+    horizontal = windows["max_targets_per_port"].to_numpy() >= min_targets
+    bloc = (windows["n_targets"].to_numpy() >= min_targets) & (windows["n_ports"].to_numpy() >= min_ports)
+    kind = np.select(
+        [vertical & horizontal, vertical, horizontal, bloc],
+        ["bloc", "vertical", "horizontal", "bloc"],
+        default="",
+    )
+    return windows.assign(type=np.where(kind == "", None, kind))
+
+
+def _episode_ids(src, window):
+    """Numérote les suites de fenêtres consécutives d'une même source (entrées triées par (src, window))."""
+    new_episode = _changes(src)
+    new_episode[1:] |= (window[1:] - window[:-1]) > 1
+    return np.cumsum(new_episode) - 1
+
+
+def build_episodes(windows, quads):
+    """
+    Regroupe les fenêtres suspectes consécutives d'une même source en épisodes de scan.
+
+    Args:
+        windows (pd.DataFrame): Fenêtres suspectes triées par (ipsrc, window).
+        quads (pd.DataFrame): Quadruplets distincts de ces fenêtres, triés de la même façon.
+
+    Returns:
+        pd.DataFrame: Un épisode par ligne (début, fin, type, cibles et ports).
+    """
+    if windows.empty:
+        return pd.DataFrame(columns=[
+            "IP_Source", "Type", "Début", "Fin", "Fenêtres", "Événements",
+            "Nb_Cibles", "Nb_Ports", "Cibles", "Ports", "last_window",
+        ])
+
+    src, w = windows["ipsrc"].to_numpy(), windows["window"].to_numpy()
+    episode = _episode_ids(src, w)
+    starts = np.flatnonzero(_changes(episode))
+
+    # Type de l'épisode : bloc si les fenêtres mélangent scans verticaux et horizontaux
+    kinds = pd.Series(windows["type"].to_numpy()).groupby(episode).agg(
+        lambda k: k.iloc[0] if k.nunique() == 1 else "bloc"
+    )
+
+    # Rattachement de chaque quadruplet à son épisode par recherche dichotomique sur (ipsrc, window)
+    window_key = (src.astype(np.uint64) << np.uint64(32)) | w.astype(np.uint64)
+    quad_key = (quads["ipsrc"].to_numpy().astype(np.uint64) << np.uint64(32)) | quads["window"].to_numpy().astype(np.uint64)
+    quad_episode = episode[np.searchsorted(window_key, quad_key)]
+
+    def distinct(column):
+        pairs = pd.DataFrame({"episode": quad_episode, "value": quads[column].to_numpy()}).drop_duplicates()
+        pairs = pairs.sort_values(["episode", "value"])
+        counts = pairs.groupby("episode").size().reindex(range(len(starts)), fill_value=0)
+        listed = pairs.groupby("episode").head(MAX_LISTED).groupby("episode")["value"].agg(list)
+        return counts.to_numpy(), listed.reindex(range(len(starts)))
+
+    n_targets, targets = distinct("ipdst")
+    n_ports, ports = distinct("portdst")
+
+    return pd.DataFrame({
+        "IP_Source": uint32_to_ip(src[starts]),
+        "Type": kinds.map(SCAN_TYPES).to_numpy(),
+        "Début": pd.to_datetime(np.minimum.reduceat(windows["ts_min"].to_numpy(), starts), unit="s"),
+        "Fin": pd.to_datetime(np.maximum.reduceat(windows["ts_max"].to_numpy(), starts), unit="s"),
+        "Fenêtres": np.diff(np.r_[starts, len(w)]),
+        "Événements": np.add.reduceat(windows["n_events"].to_numpy(), starts),
+        "Nb_Cibles": n_targets,
+        "Nb_Ports": n_ports,
+        "Cibles": [list(uint32_to_ip(t)) if isinstance(t, list) else [] for t in targets],
+        "Ports": [[int(x) for x in p] if isinstance(p, list) else [] for p in ports],
+        "last_window": np.maximum.reduceat(w, starts),
+    })
+
+
+class ScanDetector(EventConsumer):
+    """
+    Détecteur de scans de ports et de balayages d'hôtes, utilisable en lot ou en incrémental.
+
+    Seules les fenêtres terminées sont analysées ; les événements de la fenêtre ouverte sont
+    conservés jusqu'au lot suivant. Seuls les quadruplets des fenêtres suspectes sont gardés
+    en mémoire, ce qui borne la mémoire quel que soit le volume traité.
+    """
+
+    FIELDS = ["timestamp", "ipsrc", "ipdst", "portdst", "action"]
+
+    def __init__(self, window_seconds=SCAN_WINDOW_SECONDS,
+                 min_ports=MIN_PORTS_PER_TARGET, min_targets=MIN_TARGETS_PER_PORT):
+        self.window_seconds = window_seconds
+        self.min_ports = min_ports
+        self.min_targets = min_targets
+        self.last_ts = None
+        self._pending = None  # Événements de la fenêtre ouverte
+        self._last_closed = None  # Dernière fenêtre analysée
+        self._windows = []  # Fenêtres suspectes des épisodes encore ouverts
+        self._quads = []
+        self._finished = []  # Épisodes terminés
+        self._lock = threading.Lock()
+
+    def update(self, events):
+        """Intègre un lot d'événements typés (voir `events.to_event_columns`)."""
+        if events.empty:
+            return
+        with self._lock:
+            batch = pd.DataFrame({
+                "ipsrc": events["ipsrc"].to_numpy(),
+                "window": events["ts"].to_numpy() // self.window_seconds,
+                "ipdst": events["ipdst"].to_numpy(),
+                "portdst": events["portdst"].to_numpy(),
+                "ts": events["ts"].to_numpy(),
+            })
+            if self._pending is not None:
+                batch = pd.concat([self._pending, batch], ignore_index=True)
+            is_open = (batch["window"] == batch["window"].max()).to_numpy()
+            self._pending = batch[is_open]
+            self._analyse(batch[~is_open])
+            ts_max = int(events["ts"].max())
+            self.last_ts = ts_max if self.last_ts is None else max(self.last_ts, ts_max)
+
+    def flush(self):
+        """Analyse la fenêtre ouverte et clôt tous les épisodes (fin d'un traitement par lot)."""
+        with self._lock:
+            if self._pending is not None:
+                self._analyse(self._pending)
+                self._pending = None
+            if self._windows:
+                self._finished.append(build_episodes(*self._open_state()))
+                self._windows, self._quads = [], []
+
+    def _analyse(self, closed):
+        if closed.empty:
+            return
+        windows, quads = window_fanout(*(closed[c].to_numpy() for c in ["ipsrc", "window", "ipdst", "portdst", "ts"]))
+        windows = classify_windows(windows, self.min_ports, self.min_targets)
+        flagged = windows["type"].notna().to_numpy()
+        if flagged.any():
+            keys = windows.loc[flagged, ["ipsrc", "window"]]
+            self._windows.append(windows[flagged])
+            self._quads.append(quads.merge(keys, on=["ipsrc", "window"]))
+        self._last_closed = int(closed["window"].max())
+        self._finalize()
+
+    def _open_state(self):
+        windows = pd.concat(self._windows, ignore_index=True).sort_values(["ipsrc", "window"], kind="stable")
+        quads = pd.concat(self._quads, ignore_index=True).sort_values(["ipsrc", "window"], kind="stable")
+        return windows.drop_duplicates(["ipsrc", "window"]), quads.drop_duplicates()
+
+    def _finalize(self):
+        """Déplace les épisodes qui ne peuvent plus se prolonger vers la liste des épisodes terminés."""
+        if not self._windows:
+            return
+        windows, quads = self._open_state()
+        episodes = build_episodes(windows, quads)
+        done = episodes["last_window"].to_numpy() < self._last_closed
+        if done.any():
+            self._finished.append(episodes[done])
+            # On ne garde que les fenêtres des épisodes encore ouverts
+            episode = _episode_ids(windows["ipsrc"].to_numpy(), windows["window"].to_numpy())
+            keep = ~done[episode]
+            keys = windows.loc[keep, ["ipsrc", "window"]]
+            self._windows = [windows[keep]] if keep.any() else []
+            self._quads = [quads.merge(keys, on=["ipsrc", "window"])] if keep.any() else []
+
+    def episodes(self):
+        """Retourne tous les épisodes détectés, y compris ceux encore en cours."""
+        with self._lock:
+            frames = list(self._finished)
+            if self._windows:
+                frames.append(build_episodes(*self._open_state()))
+        if not frames:
+            return build_episodes(pd.DataFrame(), pd.DataFrame()).drop(columns="last_window")
+        episodes = pd.concat(frames, ignore_index=True).drop(columns="last_window")
+        return episodes.sort_values("Début", ignore_index=True)
+
+
+def detect_scans(events, **kwargs):
+    """
+    Détection en lot sur un historique d'événements typés.
+
+    Returns:
+        pd.DataFrame: Les épisodes de scan détectés.
+    """
+    detector = ScanDetector(**kwargs)
+    detector.update(events)
+    detector.flush()
+    return detector.episodes()
@@ -0,0 +1,220 @@
+"""
+Jeux de données partagés entre les sessions Streamlit, en colonnes NumPy projetées en mémoire.
+
+Un jeu volumineux (par exemple les logs chargés par `explore_data`) est publié une seule fois par
+serveur dans `SHARED_STORE_DIR` : une colonne par fichier `.npy`, les colonnes texte encodées en
+dictionnaire (codes entiers + valeurs distinctes), les dates en int64. Chaque session en reçoit une
+vue en lecture seule (`np.load(mmap_mode="r")`, catégories pandas sur les codes) : la mémoire croît
+avec le nombre de jeux distincts, pas avec le nombre d'utilisateurs.
+
+Chaque session qui utilise un jeu en est détentrice (compteur de références, expiré après
+`SESSION_TTL` secondes d'inactivité) ; au-delà de `SHARED_STORE_MAX_MB`, les jeux sans détenteur
+sont évincés du moins récemment utilisé au plus récent.
+"""
+import json
+import os
+import shutil
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+STORE_DIR = os.environ.get("SHARED_STORE_DIR", os.path.join(".cache", "shared"))
+MAX_BYTES = int(float(os.environ.get("SHARED_STORE_MAX_MB", 2048)) * 1024 * 1024)
+SESSION_TTL = int(os.environ.get("SHARED_STORE_SESSION_TTL", 1800))
+
+
+def _safe_name(key):
+    return "".join(c if c.isalnum() or c in "-_" else "_" for c in key)
+
+
+def _hashable(values):
+    """Colonne objet encodable en dictionnaire : objets imbriqués (dict, list) convertis en JSON."""
+    nested = values.map(lambda v: isinstance(v, (dict, list, set))).to_numpy(dtype=bool)
+    if not nested.any():
+        return values
+    encoded = values.copy()
+    encoded[nested] = [json.dumps(v, sort_keys=True, default=str) for v in values[nested]]
+    return encoded
+
+
+def write_columns(df, path):
+    """
+    Écrit un DataFrame en colonnes `.npy` (texte encodé en dictionnaire) ; renvoie la taille en octets.
+    Les valeurs non hachables (objets imbriqués de `_source`) sont écrites en texte JSON.
+    """
+    tmp = f"{path}.tmp"
+    os.makedirs(tmp, exist_ok=True)
+    columns = []
+    for i, name in enumerate(df.columns):
+        values = df[name]
+        base = os.path.join(tmp, f"{i}")
+        if pd.api.types.is_datetime64_any_dtype(values):
+            np.save(f"{base}.npy", values.to_numpy(dtype="datetime64[ns]").view(np.int64))
+            kind = "datetime"
+        elif pd.api.types.is_bool_dtype(values) or pd.api.types.is_numeric_dtype(values):
+            np.save(f"{base}.npy", values.to_numpy())
+            kind = "numeric"
+        else:
+            codes, uniques = pd.factorize(_hashable(values), sort=True)
+            dtype = np.int16 if len(uniques) < 2**15 else np.int32
+            np.save(f"{base}.npy", codes.astype(dtype))
+            np.save(f"{base}.values.npy", np.asarray(uniques, dtype=str))
+            kind = "dictionary"
+        columns.append({"name": str(name), "kind": kind})
+    with open(os.path.join(tmp, "meta.json"), "w") as f:
+        json.dump({"columns": columns, "rows": len(df)}, f)
+    os.replace(tmp, path)  # Publication atomique
+    return sum(os.path.getsize(os.path.join(path, file)) for file in os.listdir(path))
+
+
+def open_columns(path):
+    """DataFrame de vues en lecture seule sur les colonnes écrites par `write_columns`."""
+    with open(os.path.join(path, "meta.json")) as f:
+        meta = json.load(f)
+    data = {}
+    for i, column in enumerate(meta["columns"]):
+        base = os.path.join(path, f"{i}")
+        values = np.load(f"{base}.npy", mmap_mode="r")
+        if column["kind"] == "datetime":
+            data[column["name"]] = pd.Series(values.view("datetime64[ns]"), copy=False)
+        elif column["kind"] == "dictionary":
+            categories = pd.Index(np.load(f"{base}.values.npy"), dtype=object)
+            data[column["name"]] = pd.Categorical.from_codes(values, categories=categories, validate=False)
+        else:
+            data[column["name"]] = pd.Series(values, copy=False)
+    return pd.DataFrame(data, copy=False)
+
+
+class _Entry:
+    def __init__(self, path, nbytes, frame, derived):
+        self.path = path
+        self.nbytes = nbytes
+        self.frame = frame
+        self.derived = derived
+        self.holders = {}  # (session, slot) -> dernière utilisation
+        self.last_used = time.time()
+
+
+class SharedStore:
+    """Registre des jeux publiés, avec détenteurs par session et éviction LRU."""
+
+    def __init__(self, directory=STORE_DIR, max_bytes=MAX_BYTES, session_ttl=SESSION_TTL):
+        self.directory = directory
+        self.max_bytes = max_bytes
+        self.session_ttl = session_ttl
+        self._entries = OrderedDict()
+        self._slots = {}  # (session, slot) -> clé détenue
+        self._lock = threading.Lock()
+        self._building = {}  # clé -> verrou de construction (une seule publication par clé)
+
+    def get(self, key, loader, derive=None, session=None, slot=None):
+        """
+        Vue partagée du jeu `key`, publié par `loader()` au premier appel.
+
+        Args:
+            loader (callable): Renvoie le DataFrame à publier.
+            derive (callable, optional): Calcule, une fois sur la vue publiée, des objets associés
+                (index...) conservés et évincés avec le jeu.
+            session (str, optional): Session détentrice (session Streamlit courante par défaut).
+            slot (str, optional): Emplacement de la session (par page) : le jeu précédemment détenu au
+                même emplacement est relâché.
+
+        Returns:
+            tuple: (DataFrame en lecture seule, objets dérivés ou None).
+        """
+        session = session or current_session()
+        holder = (session, slot or key)
+        with self._lock:
+            build_lock = self._building.setdefault(key, threading.Lock())
+        with build_lock:
+            with self._lock:
+                entry = self._entries.get(key)
+            if entry is None:
+                path = os.path.join(self.directory, f"{_safe_name(key)}-{uuid.uuid4().hex[:8]}")
+                os.makedirs(self.directory, exist_ok=True)
+                nbytes = write_columns(loader(), path)
+                frame = open_columns(path)
+                entry = _Entry(path, nbytes, frame, derive(frame) if derive else None)
+                print(f"✅ Jeu partagé publié : {key} ({len(frame)} lignes, {nbytes / 2**20:.1f} Mo)")
+
+        with self._lock:
+            self._entries[key] = entry
+            self._entries.move_to_end(key)
+            previous = self._slots.get(holder)
+            if previous is not None and previous != key and previous in self._entries:
+                self._entries[previous].holders.pop(holder, None)
+            self._slots[holder] = key
+            entry.holders[holder] = entry.last_used = time.time()
+            self._evict()
+        return entry.frame, entry.derived
+
+    def release(self, key, session=None, slot=None):
+        """Relâche le jeu pour une session (il devient évinçable s'il n'a plus de détenteur)."""
+        holder = (session or current_session(), slot or key)
+        with self._lock:
+            if key in self._entries:
+                self._entries[key].holders.pop(holder, None)
+            if self._slots.get(holder) == key:
+                del self._slots[holder]
+            self._evict()
+
+    def _evict(self):
+        # Sous verrou : expire les détenteurs inactifs, puis évince les jeux libres les plus anciens
+        now = time.time()
+        for entry in self._entries.values():
+            for holder, seen in list(entry.holders.items()):
+                if now - seen > self.session_ttl:
+                    del entry.holders[holder]
+        total = sum(entry.nbytes for entry in self._entries.values())
+        for key in list(self._entries):
+            if total <= self.max_bytes:
+                break
+            entry = self._entries[key]
+            if entry.holders:
+                continue
+            del self._entries[key]
+            total -= entry.nbytes
+            # Les vues encore référencées restent valides : le fichier supprimé reste projeté jusqu'à leur libération
+            shutil.rmtree(entry.path, ignore_errors=True)
+            print(f"♻️ Jeu partagé évincé : {key} ({entry.nbytes / 2**20:.1f} Mo)")
+
+    def stats(self):
+        """Jeux publiés : lignes, taille, nombre de détenteurs, dernière utilisation."""
+        with self._lock:
+            return pd.DataFrame([
+                {
+                    "jeu": key,
+                    "lignes": len(entry.frame),
+                    "Mo": round(entry.nbytes / 2**20, 1),
+                    "sessions": len({session for session, _ in entry.holders}),
+                    "dernière utilisation": pd.Timestamp(entry.last_used, unit="s"),
+                }
+                for key, entry in self._entries.items()
+            ], columns=["jeu", "lignes", "Mo", "sessions", "dernière utilisation"])
+
+
+def current_session():
+    """Identifiant de la session Streamlit courante (`local` hors d'une session)."""
+    from streamlit.runtime.scriptrunner import get_script_run_ctx
+    ctx = get_script_run_ctx(suppress_warning=True)
+    return ctx.session_id if ctx is not None else "local"
+
+
+@st.cache_resource
+def get_store():
+    # Un seul registre par processus serveur ; les jeux d'une exécution précédente sont supprimés
+    shutil.rmtree(STORE_DIR, ignore_errors=True)
+    return SharedStore()
+
+
+def show_stats():
+    """Section « jeux partagés » du panneau de diagnostic."""
+    stats = get_store().stats()
+    if not stats.empty:
+        st.write("**Jeux de données partagés**")
+        st.dataframe(stats, use_container_width=True, hide_index=True)
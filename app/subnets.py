@@ -0,0 +1,116 @@
+"""
+Agrégats hiérarchiques par sous-réseau (/8 → /16 → /24) d'une table par IP source.
+
+Les IP (uint32, voir `events.ip_to_uint32`) sont triées une seule fois ; le préfixe d'un sous-réseau
+s'obtient par décalage (`ip >> (32 - longueur)`) et, l'ordre des IP étant aussi celui des préfixes,
+chaque niveau se calcule en une passe (`np.add.reduceat` sur les groupes contigus). Les sous-réseaux
+d'un niveau sont triés : descendre d'un /8 à ses /16, d'un /16 à ses /24 ou d'un /24 à ses IP est une
+recherche dichotomique de la plage de clés enfants, sans nouveau parcours des IP.
+"""
+import numpy as np
+import pandas as pd
+
+from events import ip_to_uint32, uint32_to_ip
+
+PREFIXES = (8, 16, 24)
+# Comptes par action, protocole et classe de port de `utils.permit_deny_by_ip`
+ROLLUP_COLUMNS = [
+    "COUNT", "PERMIT", "DENY", "PERMIT_TCP", "PERMIT_UDP",
+    "Port_Dest_Well_Known", "Port_Dest_Registered", "Port_Dest_Dynamic_Private",
+]
+
+
+def parse_subnet(subnet):
+    """Clé (préfixe décalé) et longueur d'un sous-réseau `a.b.c.d/n` (une IP seule vaut /32)."""
+    address, _, length = str(subnet).partition("/")
+    length = int(length) if length else 32
+    if not 0 <= length <= 32:
+        raise ValueError(f"Longueur de préfixe invalide : {subnet}")
+    return int(ip_to_uint32([address])[0]) >> (32 - length), length
+
+
+def subnet_names(keys, length):
+    """Noms `a.b.c.d/n` de clés de sous-réseaux de longueur `length`."""
+    base = np.asarray(keys, dtype=np.int64) << (32 - length)
+    return pd.Series(uint32_to_ip(base)).add(f"/{length}").to_numpy(dtype=object)
+
+
+class SubnetRollup:
+    """Totaux d'une table par IP, agrégés par sous-réseau pour chaque longueur de `prefixes`."""
+
+    def __init__(self, df, ip_column="IP_Source", columns=ROLLUP_COLUMNS, prefixes=PREFIXES):
+        self.ip_column = ip_column
+        self.columns = [column for column in columns if column in df.columns]
+        self.prefixes = tuple(sorted(prefixes))
+        ips = ip_to_uint32(df[ip_column]).astype(np.int64)
+        self._rows = np.argsort(ips, kind="stable")  # Positions des lignes de `df`, par IP croissante
+        self._ips = ips[self._rows]
+        self._df = df.iloc[self._rows].reset_index(drop=True)
+        values = df[self.columns].fillna(0).to_numpy(dtype=np.int64)[self._rows]
+
+        # Par niveau : clés triées, première IP de chaque groupe, nombre d'IP, totaux
+        self._levels = {}
+        for length in self.prefixes:
+            keys = self._ips >> (32 - length)
+            starts = np.flatnonzero(np.r_[True, keys[1:] != keys[:-1]]) if len(keys) else np.zeros(0, dtype=np.int64)
+            totals = np.add.reduceat(values, starts, axis=0) if len(starts) else np.zeros((0, len(self.columns)), dtype=np.int64)
+            self._levels[length] = (keys[starts], np.diff(np.r_[starts, len(keys)]), totals)
+
+    def __len__(self):
+        return len(self._ips)
+
+    def _frame(self, length, start=0, stop=None):
+        keys, n_ips, totals = self._levels[length]
+        df = pd.DataFrame(totals[start:stop], columns=self.columns)
+        df.insert(0, "Nb_IP", n_ips[start:stop])
+        df.insert(0, "Sous_reseau", subnet_names(keys[start:stop], length))
+        if "DENY" in df.columns and "COUNT" in df.columns:
+            df["Part_DENY"] = df["DENY"] / df["COUNT"].clip(lower=1)
+        return df
+
+    def level(self, length):
+        """Tous les sous-réseaux d'une longueur de `prefixes` (un par ligne, dans l'ordre des adresses)."""
+        return self._frame(length)
+
+    def _child_length(self, length):
+        deeper = [prefix for prefix in self.prefixes if prefix > length]
+        return deeper[0] if deeper else None
+
+    def children(self, subnet):
+        """
+        Sous-réseaux du niveau suivant contenus dans `subnet` (par exemple les /16 d'un /8), ou ses IP
+        si `subnet` est au niveau le plus fin.
+        """
+        key, length = parse_subnet(subnet)
+        child = self._child_length(length)
+        if child is None:
+            return self.ips(subnet)
+        keys = self._levels[child][0]
+        shift = child - length
+        start, stop = np.searchsorted(keys, [key << shift, (key + 1) << shift])
+        return self._frame(child, start, stop)
+
+    def _ip_slice(self, key, length):
+        shift = 32 - length
+        return np.searchsorted(self._ips, [key << shift, (key + 1) << shift])
+
+    def rows(self, subnet):
+        """Positions (dans la table d'origine) des lignes dont l'IP appartient à `subnet`."""
+        start, stop = self._ip_slice(*parse_subnet(subnet))
+        return self._rows[start:stop]
+
+    def ips(self, subnet):
+        """Lignes de la table d'origine dont l'IP appartient à `subnet`, par IP croissante."""
+        start, stop = self._ip_slice(*parse_subnet(subnet))
+        return self._df.iloc[start:stop]
+
+    def rows_in(self, starts, ends):
+        """
+        Positions des lignes dont l'IP tombe dans l'un des intervalles [début, fin] (uint32, disjoints),
+        par exemple ceux d'une étiquette de `cidr_tags` : une recherche dichotomique par intervalle.
+        """
+        low = np.searchsorted(self._ips, np.asarray(starts, dtype=np.int64), side="left")
+        high = np.searchsorted(self._ips, np.asarray(ends, dtype=np.int64), side="right")
+        if not len(low):
+            return np.zeros(0, dtype=np.int64)
+        return np.concatenate([self._rows[start:stop] for start, stop in zip(low, high)])
@@ -0,0 +1,183 @@
+"""
+Générateur déterministe de logs de pare-feu synthétiques, au format attendu par le grok de `logstash.conf` :
+
+    timestamp \\t ipsrc \\t ipdst \\t proto \\t portsrc \\t portdst \\t idregle \\t action \\t interfaceint \\t interfaceout \\r
+
+Exemple :
+    python synthetic_logs.py --lines 1000000 --output ../log_clear.log
+"""
+import argparse
+
+import numpy as np
+import pandas as pd
+
+from events import uint32_to_ip
+
+CHUNK_SIZE = 1_000_000
+
+# Plages universitaires (voir `dashboard.filter_university_ips`)
+UNIVERSITY_NETWORKS = [("159.84.0.0", 16), ("10.70.0.0", 16), ("192.168.0.0", 16), ("103.0.0.0", 8)]
+
+# Services de destination : (port, protocole, poids)
+SERVICES = [
+    (80, "TCP", 30), (443, "TCP", 35), (53, "UDP", 12), (22, "TCP", 4), (25, "TCP", 3),
+    (123, "UDP", 3), (3389, "TCP", 2), (3306, "TCP", 2), (21, "TCP", 1), (23, "TCP", 1),
+    (8080, "TCP", 4), (161, "UDP", 2), (445, "TCP", 1),
+]
+INTERFACES = ["eth0", "eth1", "dmz", "wan"]
+
+
+def _network_base(address):
+    a, b, c, d = (int(x) for x in address.split("."))
+    return (a << 24) | (b << 16) | (c << 8) | d
+
+
+class SyntheticLogGenerator:
+    """
+    Produit des événements réalistes et reproductibles (même graine, mêmes logs) :
+    - une population de sources de popularité très inégale (loi de Zipf, quelques « gros émetteurs ») ;
+    - une part de sources dans les plages universitaires ;
+    - quelques scanners (balayages de ports et d'hôtes, majoritairement rejetés) ;
+    - un mélange PERMIT / DENY qui dépend du service et de la règle.
+    """
+
+    def __init__(self, seed=42, start="2024-01-01", days=30, n_sources=200_000, n_servers=5_000,
+                 n_scanners=20, university_share=0.3, scanner_share=0.02):
+        self.seed = seed
+        self.start = int(pd.Timestamp(start).timestamp())
+        self.span = days * 86400
+        self.scanner_share = scanner_share
+        rng = np.random.default_rng(seed)
+
+        # Population des sources : IP publiques aléatoires et IP universitaires
+        n_university = int(n_sources * university_share)
+        bases = np.array([_network_base(a) for a, _ in UNIVERSITY_NETWORKS], dtype=np.int64)
+        sizes = np.array([1 << (32 - p) for _, p in UNIVERSITY_NETWORKS], dtype=np.int64)
+        nets = rng.integers(0, len(bases), n_university)
+        university = bases[nets] + rng.integers(1, sizes[nets] - 1)
+        public = rng.integers(1 << 24, 223 << 24, n_sources - n_university)
+        self.sources = rng.permutation(np.concatenate([university, public])).astype(np.uint32)
+        self.source_weights = self._zipf_weights(n_sources, 1.1)
+
+        self.servers = rng.integers(1 << 24, 223 << 24, n_servers).astype(np.uint32)
+        self.server_weights = self._zipf_weights(n_servers, 1.2)
+        self.scanners = rng.integers(1 << 24, 223 << 24, n_scanners).astype(np.uint32)
+
+        weights = np.array([w for _, _, w in SERVICES], dtype=float)
+        self.service_weights = weights / weights.sum()
+
+    @staticmethod
+    def _zipf_weights(n, exponent):
+        weights = 1.0 / np.arange(1, n + 1) ** exponent
+        return weights / weights.sum()
+
+    def events(self, n, chunk_index=0, n_chunks=1):
+        """
+        Génère un lot de `n` événements (colonnes typées, non triés).
+        Le lot `chunk_index` couvre la tranche correspondante de la période (sur `n_chunks` tranches),
+        avec une graine qui lui est propre.
+        """
+        rng = np.random.default_rng([self.seed, chunk_index])
+        t0 = self.start + self.span * chunk_index // n_chunks
+        span = max(self.span // n_chunks, 1)
+        ts = t0 + rng.integers(0, span, n)
+
+        service = rng.choice(len(SERVICES), n, p=self.service_weights)
+        portdst = np.array([p for p, _, _ in SERVICES])[service]
+        proto = np.array([t for _, t, _ in SERVICES])[service]
+        ipsrc = self.sources[rng.choice(len(self.sources), n, p=self.source_weights)]
+        ipdst = self.servers[rng.choice(len(self.servers), n, p=self.server_weights)]
+
+        # Les services d'administration sont plus souvent rejetés
+        deny_rate = np.where(np.isin(portdst, [22, 23, 3389, 3306, 21, 445]), 0.6, 0.08)
+        deny = rng.random(n) < deny_rate
+
+        # Scanners : balayage de ports (vertical) ou d'hôtes (horizontal) par rafales
+        scan = rng.random(n) < self.scanner_share
+        n_scan = int(scan.sum())
+        scanner = rng.integers(0, len(self.scanners), n_scan)
+        ipsrc[scan] = self.scanners[scanner]
+        vertical = scanner % 2 == 0
+        burst_start = t0 + (scanner * 7919 % max(span // 3600, 1)) * 3600
+        ts[scan] = burst_start + rng.integers(0, min(1800, span), n_scan)
+        portdst[scan] = np.where(vertical, rng.integers(1, 1024, n_scan), 445)
+        ipdst[scan] = np.where(vertical, self.servers[scanner % len(self.servers)],
+                               rng.integers(1 << 24, 223 << 24, n_scan).astype(np.uint32))
+        proto[scan] = "TCP"
+        deny[scan] = rng.random(n_scan) < 0.9
+
+        idregle = np.where(deny, 900 + service, 1 + service)
+        idregle[scan] = np.where(deny[scan], 999, idregle[scan])
+
+        interface = rng.integers(0, len(INTERFACES), n)
+        return pd.DataFrame({
+            "ts": ts,
+            "ipsrc": ipsrc,
+            "ipdst": ipdst,
+            "proto": proto,
+            "portsrc": rng.integers(1024, 65536, n),
+            "portdst": portdst,
+            "idregle": idregle,
+            "action": np.where(deny, "DENY", "PERMIT"),
+            "interfaceint": np.array(INTERFACES)[interface],
+            "interfaceout": np.array(INTERFACES)[(interface + 1 + rng.integers(0, 3, n)) % len(INTERFACES)],
+        })
+
+    def documents(self, n):
+        """
+        Événements sous la forme indexée par Logstash (champs texte, plus `@timestamp`),
+        triés par date.
+        """
+        events = self.events(n).sort_values("ts", kind="stable", ignore_index=True)
+        timestamps = pd.to_datetime(events["ts"], unit="s")
+        return pd.DataFrame({
+            "@timestamp": timestamps,
+            "timestamp": timestamps.dt.strftime("%Y-%m-%d %H:%M:%S"),
+            "ipsrc": uint32_to_ip(events["ipsrc"].to_numpy()),
+            "ipdst": uint32_to_ip(events["ipdst"].to_numpy()),
+            "proto": events["proto"],
+            "portsrc": events["portsrc"].astype(str),
+            "portdst": events["portdst"].astype(str),
+            "idregle": events["idregle"].astype(str),
+            "action": events["action"],
+            "interfaceint": events["interfaceint"],
+            "interfaceout": events["interfaceout"],
+        })
+
+    def lines(self, n, chunk_size=CHUNK_SIZE):
+        """Produit les lignes de log par blocs de `chunk_size` (chaque lot est trié par date)."""
+        n_chunks = -(-n // chunk_size)
+        for index, offset in enumerate(range(0, n, chunk_size)):
+            events = self.events(min(chunk_size, n - offset), chunk_index=index, n_chunks=n_chunks)
+            events = events.sort_values("ts", kind="stable", ignore_index=True)
+            timestamps = pd.to_datetime(events["ts"], unit="s").dt.strftime("%Y-%m-%d %H:%M:%S")
+            columns = [
+                timestamps,
+                pd.Series(uint32_to_ip(events["ipsrc"].to_numpy())),
+                pd.Series(uint32_to_ip(events["ipdst"].to_numpy())),
+                events["proto"],
+                events["portsrc"].astype(str),
+                events["portdst"].astype(str),
+                events["idregle"].astype(str),
+                events["action"],
+                events["interfaceint"],
+                events["interfaceout"],
+            ]
+            yield columns[0].str.cat(columns[1:], sep="\t") + "\r\n"
+
+    def write(self, path, n, chunk_size=CHUNK_SIZE):
+        """Écrit `n` lignes de log dans `path`."""
+        with open(path, "w", newline="") as f:
+            for chunk in self.lines(n, chunk_size):
+                f.writelines(chunk.tolist())
+        print(f"✅ {n:,} lignes écrites dans {path}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Génère des logs de pare-feu synthétiques.")
+    parser.add_argument("--lines", type=int, default=1_000_000, help="Nombre de lignes (1M à 100M)")
+    parser.add_argument("--output", default="log_clear.log", help="Fichier de sortie")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--days", type=int, default=30, help="Période couverte (jours)")
+    args = parser.parse_args()
+    SyntheticLogGenerator(seed=args.seed, days=args.days).write(args.output, args.lines)
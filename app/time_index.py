@@ -0,0 +1,122 @@
+"""
+Index temporel d'un jeu d'événements trié par horodatage.
+
+Les horodatages sont convertis une fois en secondes epoch (int64) ; l'index conserve, pour chaque
+partition horaire, le décalage de sa première ligne. Une plage de dates se résout en tranche
+`slice(i, j)` (`window` : partition puis recherche dichotomique dans la partition), applicable sans copie avec
+`df.iloc[...]`. Les regroupements par heure ou par jour réutilisent les bornes des partitions.
+"""
+import numpy as np
+import pandas as pd
+
+PARTITION_SECONDS = 3600
+DAY_SECONDS = 86400
+
+
+def to_epoch(timestamps):
+    """Secondes epoch (int64) d'une colonne d'horodatages (texte ou datetime)."""
+    values = pd.to_datetime(pd.Series(timestamps), errors="coerce")
+    return values.to_numpy(dtype="datetime64[s]").astype(np.int64)
+
+
+def sort_by_time(df, column="timestamp"):
+    """
+    DataFrame trié par horodatage (tri stable, index renuméroté) et son index temporel.
+    Les lignes sans horodatage valide, qu'aucun filtre de dates ne retient, sont écartées.
+    """
+    epoch = to_epoch(df[column])
+    valid = epoch != np.iinfo(np.int64).min  # NaT
+    order = np.flatnonzero(valid)[np.argsort(epoch[valid], kind="stable")]
+    if len(order) != len(df) or (np.diff(order) < 0).any():
+        df = df.iloc[order].reset_index(drop=True)
+    return df, TimeIndex(epoch[order])
+
+
+class TimeIndex:
+    """Horodatages triés (secondes epoch) et décalages des partitions horaires."""
+
+    def __init__(self, epoch, partition_seconds=PARTITION_SECONDS):
+        self.epoch = np.asarray(epoch, dtype=np.int64)
+        if len(self.epoch) > 1 and (np.diff(self.epoch) < 0).any():
+            raise ValueError("Les horodatages doivent être triés (voir sort_by_time).")
+        self.partition_seconds = partition_seconds
+        if len(self.epoch):
+            self.origin = int(self.epoch[0] // partition_seconds * partition_seconds)
+            n_partitions = int((self.epoch[-1] - self.origin) // partition_seconds) + 1
+        else:
+            self.origin, n_partitions = 0, 0
+        bounds = self.origin + partition_seconds * np.arange(n_partitions + 1, dtype=np.int64)
+        self.offsets = np.searchsorted(self.epoch, bounds)  # Première ligne de chaque partition
+
+    def __len__(self):
+        return len(self.epoch)
+
+    @classmethod
+    def from_series(cls, timestamps, partition_seconds=PARTITION_SECONDS):
+        """Index d'une colonne d'horodatages déjà triée."""
+        return cls(to_epoch(timestamps), partition_seconds)
+
+    @property
+    def start(self):
+        return pd.Timestamp(self.epoch[0], unit="s") if len(self.epoch) else None
+
+    @property
+    def end(self):
+        return pd.Timestamp(self.epoch[-1], unit="s") if len(self.epoch) else None
+
+    def _position(self, seconds, side):
+        """Position d'insertion de `seconds` : partition, puis recherche dans la partition seule."""
+        p = (seconds - self.origin) // self.partition_seconds
+        if p < 0:
+            return 0
+        if p >= len(self.offsets) - 1:
+            return len(self.epoch)
+        lo, hi = self.offsets[p], self.offsets[p + 1]
+        return int(lo + np.searchsorted(self.epoch[lo:hi], seconds, side=side))
+
+    def window(self, start=None, end=None):
+        """Tranche des lignes entre `start` et `end` (bornes incluses, None = non bornée)."""
+        i = 0 if start is None else self._position(pd.Timestamp(start).value // 10**9, "left")
+        j = len(self.epoch) if end is None else self._position(pd.Timestamp(end).value // 10**9, "right")
+        return slice(i, max(i, j))
+
+    def boundaries(self, rows=slice(None), seconds=DAY_SECONDS):
+        """
+        Bornes des périodes de `seconds` (heure, jour...) couvrant les lignes `rows`.
+
+        Returns:
+            tuple: (débuts des périodes non vides en pd.DatetimeIndex, décalages relatifs à `rows.start`
+            de leur première ligne, au format de `np.add.reduceat`).
+        """
+        i, j, _ = rows.indices(len(self.epoch))
+        if i >= j:
+            return pd.DatetimeIndex([]), np.zeros(0, dtype=np.int64)
+        first = self.epoch[i] // seconds * seconds
+        periods = first + seconds * np.arange((self.epoch[j - 1] - first) // seconds + 1, dtype=np.int64)
+        if seconds % self.partition_seconds == 0:
+            # Périodes multiples de la partition : bornes lues dans les décalages des partitions
+            p = np.clip((periods - self.origin) // self.partition_seconds, 0, len(self.offsets) - 1)
+            starts = np.clip(self.offsets[p], i, j)
+        else:
+            starts = np.searchsorted(self.epoch[i:j], periods) + i
+        non_empty = np.r_[starts[1:], j] > starts
+        return pd.to_datetime(periods[non_empty], unit="s"), starts[non_empty] - i
+
+    def counts(self, rows=slice(None), seconds=DAY_SECONDS, by=None):
+        """
+        Nombre de lignes par période, éventuellement ventilé par les valeurs de `by` (alignée sur les lignes).
+
+        Returns:
+            pd.DataFrame: Une ligne par période non vide, une colonne par valeur de `by` (ou `count`).
+        """
+        periods, starts = self.boundaries(rows, seconds)
+        if not len(periods):
+            return pd.DataFrame(index=periods)
+        if by is None:
+            i, j, _ = rows.indices(len(self.epoch))
+            return pd.DataFrame({"count": np.diff(np.r_[starts, j - i])}, index=periods)
+        codes, uniques = pd.factorize(np.asarray(by)[rows])
+        columns = {}
+        for k, value in enumerate(uniques):
+            columns[value] = np.add.reduceat((codes == k).astype(np.int64), starts)
+        return pd.DataFrame(columns, index=periods)
@@ -1,15 +1,155 @@
-from elasticsearch import Elasticsearch
+import contextlib
+import itertools
+import os
+import threading
+import time
+from datetime import datetime
+import numpy as np
 import pandas as pd
 import traceback  # Pour afficher les erreurs détaillées
 
-# Connexion à Elasticsearch (modifie l'URL si nécessaire)
-# es = Elasticsearch("http://localhost:9200")
-es = Elasticsearch("http://elasticsearch:9200")
+from metrics import InstrumentedElasticsearch, timed
 
-INDEX_NAME = "application-logs"
+# Connexion à Elasticsearch (modifie l'URL si nécessaire, ex. ES_URL=http://localhost:9200)
+ES_URL = os.environ.get("ES_URL", "http://elasticsearch:9200")
+_es = None
+_es_lock = threading.Lock()
+
+
+def get_es():
+    """
+    Client Elasticsearch partagé, construit au premier appel (et non à l'import du module) :
+    les pages qui n'interrogent pas Elasticsearch ne paient ni l'import du client ni sa construction.
+    """
+    global _es
+    if _es is None:
+        with _es_lock:
+            if _es is None:
+                from elasticsearch import Elasticsearch
+                _es = InstrumentedElasticsearch(Elasticsearch(ES_URL))
+    return _es
+
+
+def set_es(client):
+    """Remplace le client partagé (substitut en mémoire pour les benchmarks et tests de charge)."""
+    global _es, _partitions
+    _es = client
+    _partitions = (0.0, None)
+
+INDEX_NAME = "application-logs"  # Alias des index journaliers (ou index unique avant migration)
+PARTITION_FORMAT = "%Y.%m.%d"  # Index journaliers : application-logs-AAAA.MM.JJ (jour UTC de @timestamp)
+PARTITIONS_TTL = 60  # Secondes entre deux relectures de la liste des index derrière l'alias
 BATCH_SIZE = 1000  # Nombre d'éléments par batch
+PIT_KEEP_ALIVE = "2m"  # Durée de vie d'un point in time entre deux pages de `iter_events`
+
+_partitions = (0.0, None)
+_partitions_lock = threading.Lock()
+
+
+def partition_name(day):
+    """Nom de l'index journalier d'une date."""
+    return f"{INDEX_NAME}-{pd.Timestamp(day):{PARTITION_FORMAT}}"
+
+
+def _utc_day(value):
+    timestamp = pd.Timestamp(value)
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp.normalize()
+
+
+def list_partitions():
+    """
+    Index journaliers derrière l'alias `INDEX_NAME` (jour -> nom, triés), relus au plus toutes les
+    `PARTITIONS_TTL` secondes. None si `INDEX_NAME` est un index unique (non migré) ou injoignable.
+    """
+    global _partitions
+    loaded_at, partitions = _partitions
+    if time.monotonic() - loaded_at < PARTITIONS_TTL:
+        return partitions
+    with _partitions_lock:
+        try:
+            response = get_es().indices.get_alias(name=INDEX_NAME)
+            names = list(getattr(response, "body", response))
+            days = {pd.Timestamp(datetime.strptime(name[len(INDEX_NAME) + 1:], PARTITION_FORMAT)): name for name in names}
+            partitions = dict(sorted(days.items())) or None
+        except Exception:
+            partitions = None  # Pas d'alias (index unique) ou nom hors format : pas de routage
+        _partitions = (time.monotonic(), partitions)
+    return partitions
+
+
+NO_INDEX = None  # Plage sans index journalier : aucune recherche à lancer (voir `index_for_range`)
+
+
+def index_for_range(start=None, end=None):
+    """
+    Index à interroger pour des événements entre `start` et `end` (bornes incluses, None = non bornée).
+
+    Seuls les index journaliers qui recoupent la plage sont retenus ; un mois entièrement couvert est
+    désigné par un motif (`application-logs-2024.01.*`) pour garder l'URL courte. L'alias est renvoyé
+    si la plage couvre tous les index, ou si l'index n'est pas partitionné. `NO_INDEX` est renvoyé si
+    aucun index ne recoupe la plage (jour sans logs, début après la fin) : l'appelant ne lance alors
+    aucune recherche et construit un résultat vide.
+    """
+    partitions = list_partitions()
+    if not partitions or (start is None and end is None):
+        return INDEX_NAME
+    first = _utc_day(start) if start is not None else min(partitions)
+    last = _utc_day(end) if end is not None else max(partitions)
+    selected = [day for day in partitions if first <= day <= last]
+    if len(selected) == len(partitions):
+        return INDEX_NAME
+    if not selected:
+        return NO_INDEX
+    names = []
+    for month_start, days in itertools.groupby(selected, key=lambda day: day.replace(day=1)):
+        if first <= month_start and month_start + pd.offsets.MonthEnd(0) <= last:
+            names.append(f"{INDEX_NAME}-{month_start:%Y.%m}.*")
+        else:
+            names.extend(partitions[day] for day in days)
+    return ",".join(names)
  
 
+IP_LOG_FIELDS = ["interfaceint", "idregle", "ipsrc", "ipdst", "timestamp", "action", "proto", "portdst", "portsrc"]
+COMPARE_MAX_IPS = 20  # Nombre maximal d'IP comparées côte à côte
+COMPARE_WORKERS = int(os.environ.get("COMPARE_WORKERS", COMPARE_MAX_IPS))  # Paginations simultanées (une par IP)
+
+
+def _ip_query(ips, start=None, end=None):
+    """Filtre sur une ou plusieurs IP source, borné dans le temps si `start` / `end` sont donnés."""
+    clauses = [{"terms": {"ipsrc.keyword": list(ips)}}]
+    if start is not None or end is not None:
+        bounds = {"gte": _utc_day(start).isoformat()} if start is not None else {}
+        if end is not None:
+            bounds["lt"] = (_utc_day(end) + pd.Timedelta(days=1)).isoformat()
+        clauses.append({"range": {"@timestamp": bounds}})
+    return {"bool": {"filter": clauses}}
+
+
+def _fetch_ip_logs(ip, start=None, end=None):
+    """Pagination `search_after` des logs d'une IP source (liste des `_source`)."""
+    query = {
+        "query": _ip_query([ip], start, end),
+        "_source": IP_LOG_FIELDS,  # Champs à récupérer
+        "size": 10000,
+        "sort": [{"@timestamp": {"order": "asc"}}]  # Tri par timestamp pour la pagination
+    }
+    index = index_for_range(start, end) if start is not None or end is not None else INDEX_NAME
+    data = []
+    if index is NO_INDEX:
+        return data
+    while True:
+        result = get_es().search(index=index, body=query)
+        hits = result["hits"]["hits"]
+        if not hits:
+            return data
+        data.extend(hit["_source"] for hit in hits)
+        # Mettre à jour la clé de pagination
+        query["search_after"] = hits[-1]["sort"]
+
+
+@timed("utils.get_one_ip_logs")
 def get_one_ip_logs(ip):
     """
     Récupère les logs pour une adresse IP source donnée en utilisant la pagination avec `search_after`.
@@ -21,48 +161,136 @@ def get_one_ip_logs(ip):
     Returns:
         pd.DataFrame: Un DataFrame contenant les logs correspondants à l'IP avec les champs spécifiés.
     """
-    query = {
-        "query": {
-            "term": {"ipsrc.keyword": ip}  # Filtre par IP source
-        },
-        "_source": ["interfaceint", "idregle", "ipsrc", "ipdst", "timestamp", "action", "proto", "portdst", "portsrc"],  # Champs à récupérer
-        "size": 10000,
-        "sort": [{"@timestamp": {"order": "asc"}}]  # Tri par timestamp pour la pagination
-    }
+    try:
+        df = pd.DataFrame(_fetch_ip_logs(ip))
+        print(f"✅ Extraction terminée : {len(df)} résultats récupérés pour l'IP {ip}.")
+        return df
 
-    after_key = None
-    data = []
+    except Exception as e:
+        print(f"❌ Erreur lors de la requête Elasticsearch: {e}")
+        traceback.print_exc()
+        return pd.DataFrame()  # Retourne un DataFrame vide en cas d'erreur
+
+
+@timed("utils.get_ips_logs")
+def get_ips_logs(ips, start=None, end=None, max_workers=COMPARE_WORKERS):
+    """
+    Logs bruts de plusieurs IP source, récupérés en parallèle (une pagination `search_after` par IP) :
+    la durée est celle de l'IP la plus active, et non la somme des IP.
+
+    Args:
+        ips (list): IP source à récupérer.
+        start, end (date, optional): Jours (inclus) de la période ; seuls leurs index sont interrogés.
+        max_workers (int): Nombre de paginations simultanées.
+
+    Returns:
+        pd.DataFrame: Les logs de toutes les IP, indexés par (IP_Source, rang) dans l'ordre de `ips` :
+        `df.loc[ip]` renvoie les logs d'une IP, triés par timestamp.
+    """
+    from concurrent.futures import ThreadPoolExecutor
+
+    ips = list(dict.fromkeys(ips))
+
+    def fetch(ip):
+        # Étape propre au thread : les requêtes restent rattachées à la comparaison dans les métriques
+        with timed("utils.get_ips_logs.ip"):
+            return pd.DataFrame(_fetch_ip_logs(ip, start, end), columns=IP_LOG_FIELDS)
 
     try:
-        while True:
-            if after_key:
-                query["search_after"] = after_key
+        with ThreadPoolExecutor(max_workers=max(1, min(max_workers, len(ips)))) as pool:
+            frames = list(pool.map(fetch, ips))
+        if not frames:
+            return pd.DataFrame(columns=IP_LOG_FIELDS)
+        df = pd.concat(frames, keys=ips, names=["IP_Source", "rang"])
+        df["timestamp"] = pd.to_datetime(df["timestamp"])
+        print(f"✅ Extraction terminée : {len(df)} résultats récupérés pour {len(ips)} IP.")
+        return df
 
-            result = es.search(index=INDEX_NAME, body=query)
-            hits = result["hits"]["hits"]
+    except Exception as e:
+        print(f"❌ Erreur lors de la requête Elasticsearch: {e}")
+        traceback.print_exc()
+        return pd.DataFrame(columns=IP_LOG_FIELDS)
 
-            if not hits:
-                break
 
-            for hit in hits:
-                data.append(hit["_source"])
+def _bucket_keys(agg):
+    return ", ".join(f"{bucket['key']} ({bucket['doc_count']})" for bucket in agg["buckets"])
 
-            # Mettre à jour la clé de pagination
-            after_key = hits[-1]["sort"]
 
-        df = pd.DataFrame(data)
-        print(f"✅ Extraction terminée : {len(df)} résultats récupérés pour l'IP {ip}.")
+@timed("utils.compare_ips")
+def compare_ips(ips, start=None, end=None, top=5):
+    """
+    Agrégats de plusieurs IP source en une seule requête : filtre `terms` sur les IP, un groupe
+    par IP et ses sous-agrégations (actions, apparitions, cardinalités, ports et protocoles principaux).
+
+    Args:
+        ips (list): IP source à comparer.
+        start, end (date, optional): Jours (inclus) de la période.
+        top (int): Nombre de ports destination et de protocoles détaillés par IP.
+
+    Returns:
+        pd.DataFrame: Une ligne par IP, dans l'ordre de `ips` (totaux nuls pour une IP sans événement).
+    """
+    ips = list(dict.fromkeys(ips))
+    columns = ["IP_Source", "COUNT", "PERMIT", "DENY", "Part_DENY", "Premier", "Dernier",
+               "Nb_IP_Dest", "Nb_Port_Dest", "Nb_Regles", "Top_Ports_Dest", "Protocoles"]
+    if not ips:
+        return pd.DataFrame(columns=columns)
+    query = {
+        "size": 0,
+        "query": _ip_query(ips, start, end),
+        "aggs": {
+            "by_ip": {
+                "terms": {"field": "ipsrc.keyword", "size": len(ips)},
+                "aggs": {
+                    "permit": {"filter": {"term": {"action.keyword": "PERMIT"}}},
+                    "deny": {"filter": {"term": {"action.keyword": "DENY"}}},
+                    "premier": {"min": {"field": "@timestamp"}},
+                    "dernier": {"max": {"field": "@timestamp"}},
+                    "nb_ip_dest": {"cardinality": {"field": "ipdst.keyword"}},
+                    "nb_port_dest": {"cardinality": {"field": "portdst.keyword"}},
+                    "nb_regles": {"cardinality": {"field": "idregle.keyword"}},
+                    "top_ports_dest": {"terms": {"field": "portdst.keyword", "size": top}},
+                    "protocoles": {"terms": {"field": "proto.keyword", "size": top}},
+                },
+            }
+        }
+    }
+    index = index_for_range(start, end) if start is not None or end is not None else INDEX_NAME
+
+    try:
+        buckets = [] if index is NO_INDEX else get_es().search(index=index, body=query)["aggregations"]["by_ip"]["buckets"]
+        rows = {}
+        for bucket in buckets:
+            rows[bucket["key"]] = {
+                "COUNT": bucket["doc_count"],
+                "PERMIT": bucket["permit"]["doc_count"],
+                "DENY": bucket["deny"]["doc_count"],
+                "Premier": pd.to_datetime(bucket["premier"]["value"], unit="ms"),
+                "Dernier": pd.to_datetime(bucket["dernier"]["value"], unit="ms"),
+                "Nb_IP_Dest": bucket["nb_ip_dest"]["value"],
+                "Nb_Port_Dest": bucket["nb_port_dest"]["value"],
+                "Nb_Regles": bucket["nb_regles"]["value"],
+                "Top_Ports_Dest": _bucket_keys(bucket["top_ports_dest"]),
+                "Protocoles": _bucket_keys(bucket["protocoles"]),
+            }
+        df = pd.DataFrame([{"IP_Source": ip, **rows.get(ip, {})} for ip in ips], columns=columns)
+        for column in ["COUNT", "PERMIT", "DENY", "Nb_IP_Dest", "Nb_Port_Dest", "Nb_Regles"]:
+            df[column] = df[column].fillna(0).astype(int)
+        df[["Top_Ports_Dest", "Protocoles"]] = df[["Top_Ports_Dest", "Protocoles"]].fillna("")
+        df["Part_DENY"] = df["DENY"] / df["COUNT"].clip(lower=1)
+        print(f"✅ Extraction terminée : agrégats de {len(rows)} / {len(ips)} IP récupérés.")
         return df
 
     except Exception as e:
         print(f"❌ Erreur lors de la requête Elasticsearch: {e}")
         traceback.print_exc()
-        return pd.DataFrame()  # Retourne un DataFrame vide en cas d'erreur
+        return pd.DataFrame(columns=columns)
     
 
 
 
 
+@timed("utils.permit_deny_by_ip")
 def permit_deny_by_ip():
     """Récupère le nombre de PERMIT et DENY par IP source en paginant avec composite."""
     query = {
@@ -120,7 +348,7 @@ def permit_deny_by_ip():
             if after_key:
                 query["aggs"]["group_by_ip"]["composite"]["after"] = after_key
 
-            result = es.search(index=INDEX_NAME, body=query)
+            result = get_es().search(index=INDEX_NAME, body=query)
             buckets = result["aggregations"]["group_by_ip"]["buckets"]
 
             if not buckets:
@@ -160,3 +388,233 @@ def permit_deny_by_ip():
 # # df_permit_deny.to_csv("resultats_permit_deny.csv", index=False)
 
 # df_permit_deny.head()
+
+
+EVENT_FIELDS = ["timestamp", "ipsrc", "ipdst", "proto", "portsrc", "portdst", "idregle", "action", "interfaceint", "interfaceout"]
+
+
+def _iter_hits(query, fields, batch_size, index, max_docs=None):
+    """
+    Pagine les hits d'une requête par `@timestamp` croissant dans un point in time : le départage
+    `_shard_doc` rend la clé `search_after` unique, aucun événement de même horodatage n'est sauté.
+    """
+    if index is NO_INDEX:
+        return
+    es = get_es()
+    pit_id = es.open_point_in_time(index=index, keep_alive=PIT_KEEP_ALIVE)["id"]
+    body = {
+        "query": query,
+        "_source": fields,
+        "size": batch_size,
+        "sort": [{"@timestamp": {"order": "asc"}}, {"_shard_doc": {"order": "asc"}}],
+    }
+    total = 0
+    try:
+        while True:
+            body["pit"] = {"id": pit_id, "keep_alive": PIT_KEEP_ALIVE}
+            result = es.search(body=body)
+            pit_id = result.get("pit_id", pit_id)
+            hits = result["hits"]["hits"]
+
+            if not hits:
+                break
+
+            yield hits
+
+            total += len(hits)
+            if max_docs and total >= max_docs:
+                break
+
+            body["search_after"] = hits[-1]["sort"]
+    finally:
+        es.close_point_in_time(id=pit_id)
+
+
+def iter_events(since=None, fields=None, batch_size=10000, max_docs=None):
+    """
+    Parcourt les événements bruts par lots en paginant avec `search_after` (voir `_iter_hits`).
+    Permet d'alimenter les traitements incrémentaux sans charger tout l'index en mémoire.
+
+    Args:
+        since (str | None): Horodatage ISO ; seuls les événements strictement postérieurs sont renvoyés.
+        fields (list | None): Champs à récupérer (par défaut `EVENT_FIELDS`).
+        batch_size (int): Nombre de documents par requête.
+        max_docs (int | None): Nombre maximal de documents à parcourir.
+
+    Yields:
+        pd.DataFrame: Un lot d'événements, trié par timestamp croissant.
+    """
+    query = {"range": {"@timestamp": {"gt": since}}} if since else {"match_all": {}}
+    for hits in _iter_hits(query, fields or EVENT_FIELDS, batch_size, index_for_range(since), max_docs):
+        yield pd.DataFrame([hit["_source"] for hit in hits])
+
+
+class EventCursor:
+    """
+    Position d'une lecture incrémentale : `@timestamp` (millisecondes epoch) du dernier événement
+    intégré et identifiants des événements intégrés à cet instant. La reprise se fait à partir de cet
+    horodatage inclus : les événements arrivés plus tard dans la même milliseconde sont lus, ceux
+    déjà intégrés sont écartés.
+    """
+
+    def __init__(self):
+        self.ts_ms = None
+        self.seen = set()
+
+    def fresh(self, ts_ms, keys):
+        """Masque des hits (horodatages et identifiants d'un lot trié) non encore intégrés."""
+        if self.ts_ms is None:
+            return np.ones(len(ts_ms), dtype=bool)
+        fresh = ts_ms > self.ts_ms
+        tied = np.flatnonzero(ts_ms == self.ts_ms)
+        fresh[tied] = [key not in self.seen for key in keys[tied]]
+        return fresh
+
+    def advance(self, ts_ms, keys):
+        """Avance la position après un lot trié entièrement lu."""
+        if not len(ts_ms):
+            return
+        last = int(ts_ms[-1])
+        if last != self.ts_ms:
+            self.ts_ms, self.seen = last, set()
+        self.seen.update(keys[ts_ms == last])
+
+
+_catch_up_locks_guard = threading.Lock()
+
+
+class EventConsumer:
+    """
+    Base des accumulateurs alimentés au fil des nouveaux événements : `FIELDS` (champs lus) et
+    `update(events)` (événements typés, voir `events.to_event_columns`) ; la position de lecture et
+    la reprise depuis Elasticsearch sont communes (voir `catch_up`).
+    """
+
+    FIELDS = EVENT_FIELDS
+
+    @property
+    def cursor(self):
+        if getattr(self, "_cursor", None) is None:
+            self._cursor = EventCursor()
+        return self._cursor
+
+    @property
+    def catch_up_lock(self):
+        # Propre à chaque accumulateur : deux groupes sans accumulateur commun ne s'attendent pas
+        with _catch_up_locks_guard:
+            if getattr(self, "_catch_up_lock", None) is None:
+                self._catch_up_lock = threading.Lock()
+        return self._catch_up_lock
+
+    def update_from_es(self, batch_size=10000):
+        """Intègre les événements arrivés depuis la dernière lecture."""
+        catch_up(self, batch_size=batch_size)
+        return self
+
+
+CATCH_UP_INTERVAL = int(os.environ.get("CATCH_UP_INTERVAL", 300))  # Secondes entre deux lectures en arrière-plan
+
+
+def catch_up(*consumers, batch_size=10000, on_batch=None):
+    """
+    Intègre dans chaque accumulateur (`EventConsumer`) les événements qu'il n'a pas encore lus, en une
+    seule lecture de l'index pour tous : depuis la position la plus ancienne, chaque lot n'est transmis
+    qu'aux accumulateurs qui ne l'ont pas encore intégré. Les lectures d'un même accumulateur sont
+    sérialisées (verrous pris dans un ordre fixe), si bien que deux lectures concurrentes n'intègrent
+    jamais deux fois le même lot ; les groupes sans accumulateur commun se lisent en parallèle.
+    `on_batch(n)` reçoit après chaque lot le nombre de nouveaux événements (suivi de l'avancement).
+    """
+    from events import to_event_columns
+
+    with contextlib.ExitStack() as locks:
+        for consumer in sorted(set(consumers), key=id):
+            locks.enter_context(consumer.catch_up_lock)
+        positions = [consumer.cursor.ts_ms for consumer in consumers]
+        since = None
+        if consumers and None not in positions:
+            since = pd.Timestamp(min(positions), unit="ms").isoformat(timespec="milliseconds")
+        query = {"range": {"@timestamp": {"gte": since}}} if since else {"match_all": {}}
+        fields = sorted(set().union(*(consumer.FIELDS for consumer in consumers)))
+
+        for hits in _iter_hits(query, fields, batch_size, index_for_range(since)):
+            ts_ms = np.array([hit["sort"][0] for hit in hits], dtype=np.int64)
+            keys = np.array([f"{hit['_index']}/{hit['_id']}" for hit in hits], dtype=object)
+            batch = pd.DataFrame([hit["_source"] for hit in hits])
+            events = None  # Conversion partagée par les accumulateurs qui prennent tout le lot
+            new = np.zeros(len(hits), dtype=bool)  # Hits intégrés par au moins un accumulateur
+            for consumer in consumers:
+                fresh = consumer.cursor.fresh(ts_ms, keys)
+                new |= fresh
+                if fresh.all():
+                    events = to_event_columns(batch) if events is None else events
+                    consumer.update(events)
+                elif fresh.any():
+                    consumer.update(to_event_columns(batch[fresh].reset_index(drop=True)))
+                consumer.cursor.advance(ts_ms, keys)
+            if on_batch is not None:
+                on_batch(int(new.sum()))
+
+
+class BackgroundCatchUp:
+    """
+    Alimente un groupe d'accumulateurs dans un thread du serveur : tout l'historique au premier
+    démarrage, puis les événements arrivés toutes les `interval` secondes (voir `catch_up`). Les pages
+    lisent l'état déjà construit sans attendre et affichent l'avancement (`status`) ; `after` est
+    appelé après chaque lecture complète (fusion des compteurs, etc.).
+    """
+
+    def __init__(self, name, consumers, interval=CATCH_UP_INTERVAL, after=None):
+        self.name = name
+        self.consumers = list(consumers)
+        self.interval = interval
+        self.after = after
+        self.version = 0  # Lots intégrés depuis le démarrage : clé de cache des lectures des pages
+        self.events = 0
+        self.ready = False  # Historique entièrement lu au moins une fois
+        self.updated = None
+        self.error = None
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """Lance le thread de lecture (une seule fois)."""
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name=f"catch_up.{self.name}", daemon=True)
+                self._thread.start()
+        return self
+
+    def _on_batch(self, n_events):
+        if n_events:
+            self.events += n_events
+            self.version += 1
+
+    def _run(self):
+        while True:
+            try:
+                with timed(f"{self.name}.catch_up"):
+                    catch_up(*self.consumers, on_batch=self._on_batch)
+                    if self.after is not None:
+                        self.after()
+                self.ready, self.updated, self.error = True, time.time(), None
+            except Exception as e:
+                self.error = f"{type(e).__name__}: {e}"
+                print(f"❌ Lecture des nouveaux logs ({self.name}) : {self.error}")
+                traceback.print_exc()
+            time.sleep(self.interval)
+
+    def status(self):
+        """Avancement : lecture complète ou non, événements intégrés, position la plus ancienne du groupe."""
+        positions = [consumer.cursor.ts_ms for consumer in self.consumers]
+        position = None if None in positions else pd.Timestamp(min(positions), unit="ms")
+        return {"ready": self.ready, "events": self.events, "position": position,
+                "updated": self.updated, "error": self.error}
+
+    def describe(self):
+        """Avancement en une phrase, pour l'affichage dans les pages."""
+        status = self.status()
+        position = "—" if status["position"] is None else f"{status['position']:%d/%m/%Y %H:%M}"
+        if not status["ready"]:
+            return (f"⏳ Construction en arrière-plan : {status['events']:,} événements lus (jusqu'au "
+                    f"{position}). Les résultats ci-dessous sont partiels.")
+        return f"🔄 À jour au {position} (relecture toutes les {self.interval // 60} min)."
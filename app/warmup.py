@@ -0,0 +1,72 @@
+"""
+Démarrage à froid : précompilation et préchargement des modules lourds.
+
+- Au démarrage du conteneur (`python warmup.py`, avant `streamlit run`) : compilation en bytecode des
+  modules de l'application (le dossier est monté en volume, la compilation de l'image ne suffit pas)
+  et premier import des dépendances lourdes, qui écrit leurs `.pyc` s'ils manquent.
+- Dans le serveur (`start()`, appelé par `app.py`) : import en arrière-plan, après le premier affichage,
+  des modules dont les autres pages auront besoin (scikit-learn, st_aggrid...).
+"""
+import compileall
+import importlib
+import os
+import threading
+import time
+
+import metrics
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# Dans l'ordre : d'abord ce que la page d'accueil utilise, puis les autres pages
+HEAVY_MODULES = [
+    "elasticsearch",
+    "plotly.express",
+    "st_aggrid",
+    "sklearn.cluster",
+    "sklearn.ensemble",
+    "sklearn.metrics",
+    "explore_data",
+    "model",
+]
+
+_started = False
+_lock = threading.Lock()
+
+
+def warm_modules(modules=HEAVY_MODULES):
+    """Importe les modules un par un et enregistre le coût de chacun."""
+    timings = {}
+    for name in modules:
+        start = time.perf_counter()
+        try:
+            importlib.import_module(name)
+        except ImportError as e:
+            print(f"⚠️ Préchargement impossible de {name} : {e}")
+            continue
+        timings[name] = time.perf_counter() - start
+        metrics.record("warmup", name, timings[name])
+    return timings
+
+
+def start(modules=HEAVY_MODULES):
+    """Lance le préchargement en arrière-plan (une seule fois par processus serveur)."""
+    global _started
+    with _lock:
+        if _started:
+            return
+        _started = True
+    threading.Thread(target=warm_modules, args=(modules,), name="warmup", daemon=True).start()
+
+
+def compile_app(path=APP_DIR):
+    """Compile en bytecode les modules de l'application."""
+    return compileall.compile_dir(path, quiet=1, maxlevels=0)
+
+
+if __name__ == "__main__":
+    start_time = time.perf_counter()
+    compile_app()
+    timings = warm_modules()
+    total = time.perf_counter() - start_time
+    print(f"✅ Préchargement terminé en {total:.1f} s : "
+          + ", ".join(f"{name} {seconds:.2f} s" for name, seconds in timings.items()))